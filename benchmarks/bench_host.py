@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Time plugin refreshes started from scratch against the same refreshes forked by the resident
+# plugin host (swiftbar.host). Each run starts the plugin as xbar/SwiftBar would, with a new python3
+# process; with the host up that process only forwards the request and relays the output.
+#
+# The plugins run with HOME pointed at a temporary directory, so the host's socket and the plugins'
+# configuration stay out of the real ~/.config/SwiftBar.
+#
+# Run it with: python3 benchmarks/bench_host.py [plugin ...]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGINS = ['gdanko-system-Uptime.2s.py', 'gdanko-system-SwapUsage.2s.py', 'gdanko-system-DiskUsage.5s.py']
+
+def time_runs(plugin: str=None, runs: int=None, env: dict=None) -> float:
+    """
+    Run the plugin runs times and return the median wall time in seconds.
+    """
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(REPO, plugin)], cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+def start_host(env: dict=None, socket_path: str=None) -> subprocess.Popen:
+    """
+    Start the host and wait for its socket to appear.
+    """
+    host = subprocess.Popen([sys.executable, '-m', 'swiftbar.host'], cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(socket_path):
+        if host.poll() is not None or time.monotonic() > deadline:
+            host.kill()
+            print('The plugin host did not start', file=sys.stderr)
+            sys.exit(1)
+        time.sleep(0.05)
+    return host
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare cold plugin runs with runs forked by the resident plugin host.')
+    parser.add_argument('plugins', help='Plugin files in the repository to run', nargs='*', default=PLUGINS)
+    parser.add_argument('-r', '--runs', help='Runs per plugin and mode; the median is reported', type=int, required=False, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home)
+        socket_path = os.path.join(home, '.config', 'SwiftBar', 'swiftbar-host.sock')
+        cold = {plugin: time_runs(plugin, args.runs, env) for plugin in args.plugins}
+        host = start_host(env, socket_path)
+        try:
+            # The host runs a plugin's module-level code on its first request, so leave that out of the timings
+            for plugin in args.plugins:
+                time_runs(plugin, 1, env)
+            warm = {plugin: time_runs(plugin, args.runs, env) for plugin in args.plugins}
+        finally:
+            host.terminate()
+            host.wait()
+
+    print(f'{"plugin":36} {"cold":>10} {"host":>10}')
+    for plugin in args.plugins:
+        print(f'{plugin:36} {cold[plugin] * 1000:7.1f} ms {warm[plugin] * 1000:7.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Time how long a plugin takes to produce 1000 menu items when it collects the menu's lines and writes
+# them once (Plugin.render_menu) against printing every item as it goes, as the print_* methods used to.
+# The output goes to a pipe, as it does under xbar and SwiftBar.
+#
+# Run it with: python3 benchmarks/bench_menu.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import OrderedDict
+from swiftbar.plugin import Plugin
+import argparse
+import io
+import threading
+import time
+
+class CountingPipe(io.FileIO):
+    """
+    The write end of a pipe that counts the write() calls reaching it, one per system call.
+    """
+    writes = 0
+
+    def write(self, data) -> int:
+        self.writes += 1
+        return super().write(data)
+
+def open_pipe() -> tuple:
+    """
+    Return a text stream writing to a pipe, buffered like a piped stdout, its raw end, and the thread draining it.
+    """
+    read_fd, write_fd = os.pipe()
+    def drain():
+        with os.fdopen(read_fd, 'rb') as fh:
+            while fh.read(65536):
+                pass
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    raw = CountingPipe(write_fd, 'w')
+    return io.TextIOWrapper(io.BufferedWriter(raw)), raw, thread
+
+def legacy_print_menu_item(plugin: Plugin=None, text: str=None, out=None, **params) -> None:
+    """
+    The old print_menu_item(): sanitize, format and print each item straight away.
+    """
+    params = plugin._sanitize_params(**params)
+    if not 'font' in params:
+        params['font'] = plugin.font_family
+    if not 'size' in params:
+        params['size'] = plugin.font_size
+    if 'cmd' in params and type(params['cmd']) == list and len(params['cmd']) > 0:
+        params['bash'] = f'"{params["cmd"][0]}"'
+        for i, arg in enumerate(params['cmd'][1:]):
+            params[f'param{i + 1}'] = f'"{arg}"'
+        params.pop('cmd')
+    params_str = ' '.join(f'{k}={v}' for k, v in params.items())
+    print(f'{text} | {params_str}', file=out)
+
+def legacy_print_ordered_dict(plugin: Plugin=None, data: OrderedDict=None, indent: int=0, out=None, **params) -> None:
+    """
+    The old print_ordered_dict(), which also repeated the params string in each item's text.
+    """
+    indent_str = indent * '-'
+    longest = plugin.find_longest(data)
+    params['trim'] = False
+    for k, v in data.items():
+        params_str = ' '.join(f'{k}={v}' for k, v in params.items())
+        legacy_print_menu_item(plugin, f'{indent_str}{k.ljust(longest)}  {v} | {params_str}', out=out, **params)
+
+def print_before(plugin: Plugin=None, items: int=None, data: OrderedDict=None, out=None) -> None:
+    legacy_print_menu_item(plugin, 'Title', out=out)
+    for i in range(items // 2):
+        legacy_print_menu_item(plugin, f'--Item {i}', out=out, cmd=['kill', '-9', str(i)], terminal=False, refresh=True)
+    legacy_print_ordered_dict(plugin, data, indent=2, out=out)
+    out.flush()
+
+def print_after(plugin: Plugin=None, items: int=None, data: OrderedDict=None, out=None) -> None:
+    plugin.print_menu_item('Title')
+    for i in range(items // 2):
+        plugin.print_menu_item(f'--Item {i}', cmd=['kill', '-9', str(i)], terminal=False, refresh=True)
+    plugin.print_ordered_dict(data, justify='left', indent=2)
+    plugin.render_menu(out=out)
+
+def best_of(repeat: int=None, raw: CountingPipe=None, functions: list=None, *args) -> list:
+    """
+    Run the functions in turn repeat times, so a busy moment on the machine hits them all alike, and return
+    the fastest run of each along with how many writes it made.
+    """
+    results = [(float('inf'), 0)] * len(functions)
+    for _ in range(repeat):
+        for i, function in enumerate(functions):
+            raw.writes = 0
+            started = time.perf_counter()
+            function(*args)
+            results[i] = min(results[i][0], time.perf_counter() - started), raw.writes
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare writing the menu once with printing every item.')
+    parser.add_argument('-n', '--items', help='Menu items per run, half of them commands and half an ordered dict', type=int, required=False, default=1000)
+    parser.add_argument('-r', '--repeat', help='Runs; the fastest is reported', type=int, required=False, default=20)
+    args = parser.parse_args()
+
+    plugin = Plugin()
+    data = OrderedDict((f'key{i}', i) for i in range(args.items // 2))
+    out, raw, thread = open_pipe()
+    scale = 1000 / args.items * 1000
+    print('Per 1000 items, with the same params sanitizing on both sides')
+    print(f'{"invoker":10} {"before":>12} {"writes":>7} {"after":>12} {"writes":>7}')
+    for invoker in ['SwiftBar', 'xbar']:
+        plugin.invoked_by = invoker
+        (before, before_writes), (after, after_writes) = best_of(args.repeat, raw, [print_before, print_after], plugin, args.items, data, out)
+        print(f'{invoker:10} {before * scale:9.2f} ms {before_writes:7} {after * scale:9.2f} ms {after_writes:7}')
+    out.close()
+    thread.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Time how long it takes to sanitize one menu item's params with the precompiled schemas in
+# swiftbar.params (TypedDict.from_params) against the per-call validation they replaced, for each
+# invoker and with debugging on and off.
+#
+# Run it with: python3 benchmarks/bench_params.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar.params import ParamsSwiftBar, ParamsXbar
+from typing import get_args, get_origin, Any, Dict
+import argparse
+import re
+import timeit
+
+# A typical print_menu_item() call: a command with arguments plus a few display settings
+PARAMS = {
+    'cmd': ['kill', '-9', '12345'],
+    'emojize': True,
+    'length': 125,
+    'symbolize': False,
+    'terminal': False,
+    'trim': False,
+    'sfimage': 'xmark.circle',
+    'disabled': False,
+}
+
+class LegacyTypedDict:
+    """
+    The TypedDict every menu item used to go through: each assignment matches the key against a regular
+    expression and introspects the expected type with get_origin() and get_args().
+    """
+    def __init__(self, schema: Dict[str, Any]=None) -> None:
+        self._schema = schema
+        self._data = {}
+
+    def __setitem__(self, key: str=None, value: Any=None) -> None:
+        if re.match(r'^param[\d+]', key):
+            self._data[key] = value
+            return
+        if key not in self._schema:
+            raise KeyError(f'Key "{key}" is not allowed.')
+        expected_type = self._schema[key]
+        if not self._check_exact_type(value, expected_type):
+            raise TypeError(f'Value for "{key}" must be of type {str(expected_type)}')
+        self._data[key] = value
+
+    def _check_exact_type(self, value, expected_type) -> bool:
+        origin = get_origin(expected_type) or expected_type
+        expected_args = get_args(expected_type)
+        if not isinstance(value, origin):
+            return False
+        if expected_args:
+            if isinstance(value, list):
+                return all(isinstance(item, expected_args[0]) for item in value)
+            elif isinstance(value, dict):
+                key_type, val_type = expected_args
+                return all(isinstance(k, key_type) and isinstance(v, val_type) for k, v in value.items())
+        return True
+
+def legacy_sanitize(params_class: type=None, params: Dict[str, Any]=None) -> LegacyTypedDict:
+    """
+    The old Plugin._sanitize_params(): build the schema dict afresh, as the old constructors did, and assign key by key.
+    """
+    sanitized = LegacyTypedDict(dict(params_class._schema))
+    for k, v in params.items():
+        try:
+            sanitized[k] = v
+        except KeyError:
+            pass
+    return sanitized
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare precompiled params validation with the old per-call validation.')
+    parser.add_argument('-n', '--number', help='Items per timing run', type=int, required=False, default=20000)
+    parser.add_argument('-r', '--repeat', help='Timing runs; the fastest is reported', type=int, required=False, default=5)
+    args = parser.parse_args()
+
+    print(f'{"invoker":10} {"debug":6} {"before":>12} {"after":>12} {"speedup":>8}')
+    for invoker, params_class in [('SwiftBar', ParamsSwiftBar), ('xbar', ParamsXbar)]:
+        for debug in [False, True]:
+            before = min(timeit.repeat(lambda: legacy_sanitize(params_class, PARAMS), number=args.number, repeat=args.repeat))
+            after = min(timeit.repeat(lambda: params_class.from_params(PARAMS, enforce_typing=debug), number=args.number, repeat=args.repeat))
+            print(f'{invoker:10} {str(debug):6} {before / args.number * 1e6:9.2f} us {after / args.number * 1e6:9.2f} us {before / after:7.1f}x')
+
+if __name__ == '__main__':
+    main()
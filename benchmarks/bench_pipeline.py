@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Time util.execute_command(), which starts pipeline stages directly and handles trailing head/tail
+# stages in-process, against the old version, which ran every stage through its own shell one after
+# another. On Linux it also counts the processes each call creates, from the last pid in /proc/loadavg.
+#
+# Run it with: python3 benchmarks/bench_pipeline.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import util
+from typing import Any, Optional, Union
+import argparse
+import re
+import subprocess
+import time
+
+COMMANDS = [
+    '/bin/ps -o command -p 1 | tail -n+2',
+    'ps -ax -o pid,user,comm | tail -n+2',
+    'uname -s',
+]
+
+def legacy_execute_command(command: str=None, input: Optional[Any]=None):
+    """
+    The old util.execute_command(): split on "|" and run each stage with shell=True, feeding it the previous stage's output.
+    """
+    for command in re.split(r'\s*\|\s*', command):
+        p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate(input=input.encode('utf-8') if input else None)
+        stdout = stdout.decode('utf-8').strip()
+        stderr = stderr.decode('utf-8').strip()
+        if stdout:
+            input = stdout
+    return p.returncode, stdout, stderr
+
+def get_last_pid() -> Union[int, None]:
+    try:
+        with open('/proc/loadavg', 'r') as fh:
+            return int(fh.read().split()[-1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def measure(execute=None, command: str=None, runs: int=None) -> tuple:
+    """
+    Return the mean time per call in seconds and processes created per call, or None where they can't be counted.
+    """
+    first_pid = get_last_pid()
+    started = time.perf_counter()
+    for _ in range(runs):
+        execute(command)
+    elapsed = (time.perf_counter() - started) / runs
+    last_pid = get_last_pid()
+    forks = (last_pid - first_pid) / runs if first_pid is not None and last_pid is not None and last_pid >= first_pid else None
+    return elapsed, forks
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare the shell-free execute_command() with the old per-stage shell pipeline.')
+    parser.add_argument('-r', '--runs', help='Calls per command and version', type=int, required=False, default=50)
+    args = parser.parse_args()
+
+    format_forks = lambda forks: f'{forks:5.1f}' if forks is not None else '  n/a'
+    print(f'{"command":40} {"before":>9} {"forks":>5} {"after":>9} {"forks":>5}')
+    for command in COMMANDS:
+        before, before_forks = measure(legacy_execute_command, command, args.runs)
+        after, after_forks = measure(util.execute_command, command, args.runs)
+        print(f'{command:40} {before * 1000:6.2f} ms {format_forks(before_forks)} {after * 1000:6.2f} ms {format_forks(after_forks)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Count the TLS handshakes and time a plugin-sized batch of requests through swiftbar.request when
+# connections are kept alive in request.pool, against opening a new connection with a new SSL context
+# for every request as swiftbar_request() used to. The requests go to a local HTTPS stand-in with a
+# throwaway certificate made by the openssl command line tool, so there's no network round trip: the
+# savings on a real host are larger.
+#
+# Run it with: python3 benchmarks/bench_pool.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from swiftbar import request
+import argparse
+import socket
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        body = b'{"path": "%s"}' % self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Counts the connections it accepts; each one costs the client a TLS handshake.
+    """
+    daemon_threads = True
+    handshakes = 0
+
+    def get_request(self) -> tuple:
+        conn, address = super().get_request()
+        self.handshakes += 1
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, address
+
+def make_certificate(directory: str=None) -> tuple:
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    try:
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+             '-addext', 'subjectAltName=DNS:localhost', '-keyout', key, '-out', cert],
+            capture_output=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        print('openssl is needed to make a certificate for the local HTTPS server', file=sys.stderr)
+        sys.exit(1)
+    return cert, key
+
+def run_batch(server: StandInServer=None, requests: int=None, cert: str=None, keep_alive: bool=True) -> tuple:
+    """
+    Make one plugin run's worth of requests, starting from an empty pool as a new plugin process would.
+    Returns the handshakes and the seconds it took.
+    """
+    host = f'localhost:{server.server_address[1]}'
+    request.pool.clear()
+    request.pool.ssl_context = ssl.create_default_context(cafile=cert)
+    first = server.handshakes
+    started = time.perf_counter()
+    for i in range(requests):
+        if not keep_alive:
+            request.pool.clear()
+            request.pool.ssl_context = ssl.create_default_context(cafile=cert)
+        response, _, _ = request.swiftbar_request(host=host, path=f'/quote/{i}', return_type='json', cache=False)
+        assert response.status == 200
+    return server.handshakes - first, time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare keep-alive connections from request.pool with a new connection per request.')
+    parser.add_argument('-n', '--requests', help='Requests per plugin run', type=int, required=False, default=7)
+    parser.add_argument('-r', '--runs', help='Plugin runs per mode; the median time is reported', type=int, required=False, default=9)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            print(f'{args.requests} requests per run, median of {args.runs} runs')
+            print(f'{"mode":24} {"handshakes":>10} {"time":>10}')
+            for label, keep_alive in [('new connection each', False), ('keep-alive pool', True)]:
+                results = [run_batch(server, args.requests, cert, keep_alive) for _ in range(args.runs)]
+                handshakes = statistics.median(handshakes for handshakes, _ in results)
+                elapsed = statistics.median(elapsed for _, elapsed in results)
+                print(f'{label:24} {handshakes:10.0f} {elapsed * 1000:7.1f} ms')
+        finally:
+            request.pool.clear()
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    main()
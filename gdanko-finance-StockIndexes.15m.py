@@ -7,6 +7,7 @@
 # <xbar.desc>Show info about the DOW, NASDAQ, S&P indexes</xbar.desc>
 # <xbar.dependencies>python</xbar.dependencies>
 # <xbar.abouturl>https://github.com/gdanko/xbar-plugins/blob/main/gdanko-finance-StockIndexes.15m.py</xbar.abouturl>
+# <xbar.var>string(INDEXES="Dow=^DJI,Nasdaq=^IXIC,S&P500=^GSPC"): A comma-delimited list of indexes, each a symbol or label=symbol</xbar.var>
 
 # <swiftbar.hideAbout>true</swiftbar.hideAbout>
 # <swiftbar.hideRunInTerminal>true</swiftbar.hideRunInTerminal>
@@ -14,41 +15,128 @@
 # <swiftbar.hideDisablePlugin>true</swiftbar.hideDisablePlugin>
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 
+from collections import OrderedDict
 from swiftbar import util, yfinance
 from swiftbar.plugin import Plugin
+from typing import Dict
+import re
+import time
+
+INDEX_SETS = [
+    'Dow=^DJI,Nasdaq=^IXIC,S&P500=^GSPC',
+    'Dow=^DJI,Nasdaq=^IXIC,S&P500=^GSPC,Russell2000=^RUT',
+    'Dow=^DJI,Nasdaq=^IXIC,S&P500=^GSPC,VIX=^VIX',
+    'FTSE100=^FTSE,DAX=^GDAXI,CAC40=^FCHI',
+    'Nikkei225=^N225,HangSeng=^HSI,ASX200=^AXJO',
+]
+
+def valid_indexes(indexes: str=None) -> bool:
+    """
+    Return True if indexes is a non-empty comma-delimited list of symbols or label=symbol pairs.
+    """
+    if not isinstance(indexes, str):
+        return False
+    index_map = get_index_map(indexes)
+    return len(index_map) > 0 and all(re.match(r'^[\^A-Za-z0-9.\-]+$', symbol) for symbol in index_map.values())
+
+def get_index_map(indexes: str=None) -> Dict[str, str]:
+    index_map = {}
+    for entry in re.split(r'\s*,\s*', indexes.strip()):
+        if entry:
+            label, _, symbol = entry.rpartition('=')
+            index_map[label.strip() or symbol.strip()] = symbol.strip()
+    return index_map
 
 def main() -> None:
     plugin = Plugin()
+    plugin.defaults_dict['INDEXES'] = {
+        'default_value': INDEX_SETS[0],
+        'valid_values': INDEX_SETS,
+        'validator': valid_indexes,
+        'type': str,
+        'setting_configuration': {
+            'default': None,
+            'flag': '--indexes',
+            'title': 'Indexes',
+        },
+    }
+    plugin.defaults_dict['TREND_ENABLED'] = {
+        'default_value': True,
+        'valid_values': [True, False],
+        'type': bool,
+        'setting_configuration': {
+            'default': False,
+            'flag': '--trend',
+            'title': 'the "Trend" menus',
+        },
+    }
     plugin.setup()
+    plugin.enable_http_cache()
+    plugin.enable_circuit_breaker()
 
     plugin_output = []
-    cookie, crumb = yfinance.get_cookie_and_crumb()
-    if cookie and crumb:
-        symbol_map = {
-            'Dow': '^DJI',
-            'Nasdaq': '^IXIC',
-            'S&P500': '^GSPC',
-        }
-        for key, value in symbol_map.items():
-            index_data = yfinance.get_chart(cookie=cookie, crumb=crumb, ticker=value)
+    index_map = get_index_map(plugin.configuration['INDEXES'])
+    symbols = list(index_map.values())
+    calendar = yfinance.open_market_calendar(cache_dir=plugin.config_dir)
+    stores = {symbol: yfinance.open_price_store(plugin, symbol) for symbol in symbols} if plugin.configuration['TREND_ENABLED'] else {}
+
+    # Outside trading hours prices can't change, so show what we fetched last time
+    snapshot = plugin.read_state('snapshot')
+    if snapshot and snapshot['symbols'] == symbols and not calendar.needs_refresh(snapshot['exchanges'], snapshot['fetched']):
+        prices = snapshot['prices']
+    else:
+        snapshot = None
+        prices = {}
+        cookie, crumb = yfinance.get_cookie_and_crumb(cache_dir=plugin.config_dir)
+        if not (cookie and crumb):
+            plugin.print_menu_title('Stock Indexes: Error')
+            plugin.print_menu_item('Failed to get a Yahoo! Finance crumb')
+            plugin.render_footer()
+            return
+
+        sparks = yfinance.get_sparks(cookie=cookie, crumb=crumb, symbols=symbols)
+        exchanges = set()
+        for symbol, index_data in sparks.items():
             if index_data:
-                meta = index_data['chart']['result'][0]['meta']
-                price = meta['regularMarketPrice']
-                last = meta['chartPreviousClose']
+                meta = index_data['meta']
+                prices[symbol] = [meta['regularMarketPrice'], meta['chartPreviousClose']]
+                exchanges.add(meta.get('exchangeName'))
+                calendar.learn_chart(meta)
+        calendar.save()
+        if stores:
+            yfinance.update_price_stores(cookie=cookie, crumb=crumb, stores=stores)
+        if len(prices) == len(symbols) and None not in exchanges:
+            plugin.write_state('snapshot', {'symbols': symbols, 'exchanges': sorted(exchanges), 'fetched': time.time(), 'prices': prices})
 
-                if price > last:
-                    arrow = u'\u2191'
-                    pct_change = f'{util.pad_float((price - last) / last * 100)}%'
-                else:
-                    arrow = u'\u2193'
-                    pct_change = f'{util.pad_float((last - price) / last * 100)}%'
+    for key, value in index_map.items():
+        if value in prices:
+            price, last = prices[value]
 
-                plugin_output.append(f'{key} {arrow} {pct_change}')
-        plugin.print_menu_title('; '.join(plugin_output))
+            if price > last:
+                arrow = u'\u2191'
+                pct_change = f'{util.pad_float((price - last) / last * 100)}%'
+            else:
+                arrow = u'\u2193'
+                pct_change = f'{util.pad_float((last - price) / last * 100)}%'
 
-    else:
-        plugin.print_menu_title('Stock Indexes: Error')
-        plugin.print_menu_item('Failed to get a Yahoo! Finance crumb')
+            plugin_output.append(f'{key} {arrow} {pct_change}')
+    plugin.print_menu_title('; '.join(plugin_output))
+    if snapshot:
+        plugin.print_menu_item(f'Market closed, prices as of {util.get_timestamp(snapshot["fetched"], "%Y-%m-%d %k:%M")}')
+
+    for key, value in index_map.items():
+        stats = yfinance.get_price_stats(stores[value]) if value in stores else None
+        if stats:
+            trend = OrderedDict()
+            trend['Day Range'] = f'{stats.day_low:,.2f} - {stats.day_high:,.2f}'
+            if stats.vwap is not None:
+                trend['VWAP'] = f'{stats.vwap:,.2f}'
+            for window, average in stats.moving_averages.items():
+                trend[f'Moving Average ({window} x {yfinance.PRICE_BAR_INTERVAL})'] = f'{average:,.2f}'
+            trend['Recent High'] = f'{stats.high:,.2f}'
+            trend['From Recent High'] = f'{util.pad_float(stats.from_high)}%'
+            plugin.print_menu_item(key)
+            plugin.print_ordered_dict(trend, justify='left', indent=2)
     plugin.render_footer()
 
 if __name__ == '__main__':
@@ -25,6 +25,26 @@ from collections import OrderedDict
 from swiftbar import util, yfinance
 from swiftbar.plugin import Plugin
 import re
+import time
+
+# The quote fields kept in the snapshot shown while the market is closed
+SNAPSHOT_FIELDS = ['exchange', 'regularMarketPreviousClose', 'regularMarketPrice']
+
+# The quoteSummary modules each submenu draws on
+SUBMENU_MODULES = {
+    'COMPANY_INFO_ENABLED': ['assetProfile', 'quoteType'],
+    'COMPANY_OFFICERS_ENABLED': ['assetProfile'],
+    'KEY_STATS_ENABLED': ['defaultKeyStatistics', 'financialData', 'summaryDetail'],
+    'RATIOS_AND_PROFIABILITY_ENABLED': ['assetProfile', 'defaultKeyStatistics', 'financialData', 'summaryDetail'],
+    'EVENTS_ENABLED': ['defaultKeyStatistics', 'quoteType'],
+}
+
+def has_prices(quote: dict=None) -> bool:
+    """
+    Determine if a quote has the price and previous close the menu bar needs. Yahoo! leaves them out, or sends
+    null, for some delisted and thinly traded symbols.
+    """
+    return bool(quote) and quote.get('regularMarketPrice') is not None and bool(quote.get('regularMarketPreviousClose'))
 
 def main() -> None:
     plugin = Plugin()
@@ -82,26 +102,74 @@ def main() -> None:
         },
     }
     plugin.setup()
+    plugin.enable_http_cache()
+    plugin.enable_circuit_breaker()
 
     plugin_output = []
-    info_dict = {}
+    symbols = re.split(r'\s*,\s*', plugin.configuration['SYMBOLS'])
+    calendar = yfinance.open_market_calendar(cache_dir=plugin.config_dir)
 
-    cookie, crumb = yfinance.get_cookie_and_crumb()
-    if cookie and crumb:
-        for symbol in re.split(r'\s*,\s*', plugin.configuration['SYMBOLS']):
-            company_data = yfinance.get_quote_summary(
-                cookie=cookie,
-                crumb=crumb,
-                modules=['financialData', 'quoteType', 'defaultKeyStatistics', 'assetProfile', 'summaryDetail'],
-                symbol=symbol,
-            )
-            if company_data:
-                info_dict[symbol] = company_data
-    
-        if len(info_dict) > 0:
-            for symbol, info in info_dict.items():
-                price = info['currentPrice']
-                last = info['previousClose']
+    # Outside trading hours prices can't change, so show what we fetched last time
+    snapshot = plugin.read_state('snapshot')
+    market_closed = bool(snapshot and snapshot['symbols'] == symbols and not calendar.needs_refresh(snapshot['exchanges'], snapshot['fetched']))
+
+    # A closed market is rendered from the snapshot, which doesn't need a crumb
+    cookie, crumb = (None, None) if market_closed else yfinance.get_cookie_and_crumb(cache_dir=plugin.config_dir)
+    if market_closed or (cookie and crumb):
+        if market_closed:
+            quotes = snapshot['quotes']
+        else:
+            quotes = yfinance.get_quotes(cookie=cookie, crumb=crumb, symbols=symbols)
+            quotes = {symbol: quote for symbol, quote in quotes.items() if quote}
+            complete = len(quotes) == len(symbols)
+            # Quotes don't say when their exchange trades, so learn that from a spark of one symbol per new exchange
+            unknown = {}
+            for symbol, quote in quotes.items():
+                calendar.learn_quote(quote)
+                if quote.get('exchange') and not calendar.has_session(quote['exchange']):
+                    unknown.setdefault(quote['exchange'], symbol)
+            if unknown:
+                for spark in yfinance.get_sparks(cookie=cookie, crumb=crumb, symbols=list(unknown.values())).values():
+                    if spark:
+                        calendar.learn_chart(spark['meta'])
+            calendar.save()
+            # A quote without prices is shown as unavailable and kept out of the snapshot, so it isn't replayed all weekend
+            quotes = {symbol: {field: quote.get(field) for field in SNAPSHOT_FIELDS} for symbol, quote in quotes.items() if has_prices(quote)}
+            if complete and quotes and all(quote['exchange'] for quote in quotes.values()):
+                plugin.write_state('snapshot', {
+                    'symbols': symbols,
+                    'exchanges': sorted({quote['exchange'] for quote in quotes.values()}),
+                    'fetched': time.time(),
+                    'quotes': quotes,
+                })
+
+        # Only ask for the quoteSummary modules the enabled submenus will show
+        modules = sorted({module for setting, setting_modules in SUBMENU_MODULES.items() if plugin.configuration[setting] for module in setting_modules})
+        quote_summaries = {}
+        if modules and quotes:
+            # Nothing in them changes while the market is closed either, so any cached summary will do
+            if market_closed:
+                quote_summaries = yfinance.get_cached_quote_summaries(symbols=list(quotes), modules=modules, cache_dir=plugin.config_dir, max_age=float('inf'))
+            missing = [symbol for symbol in quotes if symbol not in quote_summaries]
+            if missing and not cookie:
+                cookie, crumb = yfinance.get_cookie_and_crumb(cache_dir=plugin.config_dir)
+            if missing and cookie and crumb:
+                quote_summaries.update(yfinance.get_quote_summaries(
+                    cookie=cookie,
+                    crumb=crumb,
+                    modules=modules,
+                    symbols=missing,
+                    cache_dir=plugin.config_dir,
+                ))
+
+        if len(quotes) > 0:
+            for symbol in symbols:
+                quote = quotes.get(symbol)
+                if not has_prices(quote):
+                    plugin_output.append(f'{symbol} N/A')
+                    continue
+                price = quote['regularMarketPrice']
+                last = quote['regularMarketPreviousClose']
                 if price > last:
                     arrow = u'\u2191'
                     change_amount = f'+{util.pad_float((price - last))}'
@@ -113,9 +181,10 @@ def main() -> None:
                 plugin_output.append(f'{symbol} {util.pad_float(price)} {arrow} {change_amount} ({pct_change}%)')
 
             plugin.print_menu_title('; '.join(plugin_output))
-            for i in range (len(re.split(r'\s*,\s*', plugin.configuration['SYMBOLS']))):
-                symbol = re.split(r'\s*,\s*', plugin.configuration['SYMBOLS'])[i]
-                symbol_info = info_dict[symbol]
+            if market_closed:
+                plugin.print_menu_item(f'Market closed, prices as of {util.get_timestamp(snapshot["fetched"], "%Y-%m-%d %k:%M")}')
+            for symbol in quotes:
+                symbol_info = quote_summaries.get(symbol) or {}
 
                 company_info = OrderedDict()
                 if 'longName' in symbol_info:
@@ -132,9 +201,9 @@ def main() -> None:
                     company_info['FT Employees'] = util.add_commas(symbol_info['fullTimeEmployees'])
                 if 'phone' in symbol_info:
                     company_info['Phone'] = symbol_info['phone']
-                
+
+                company_officers = {}
                 if 'companyOfficers' in symbol_info and len(symbol_info['companyOfficers']) > 0:
-                    company_officers = {}
                     for entry in symbol_info['companyOfficers']:
                         company_officers[entry['name']] = OrderedDict()
                         if 'title' in entry:
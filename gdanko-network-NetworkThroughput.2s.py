@@ -4,10 +4,10 @@
 # <xbar.version>v0.6.2</xbar.version>
 # <xbar.author>Gary Danko</xbar.author>
 # <xbar.author.github>gdanko</xbar.author.github>
-# <xbar.desc>Show the current network throughput for a given interface</xbar.desc>
+# <xbar.desc>Show the current network throughput for all interfaces or a given one</xbar.desc>
 # <xbar.dependencies>python</xbar.dependencies>
 # <xbar.abouturl>https://github.com/gdanko/xbar-plugins/blob/master/gdanko-network-NetworkThroughput.2s.py</xbar.abouturl>
-# <xbar.var>string(INTERFACE=en0): The network interface to measure.</xbar.var>
+# <xbar.var>string(INTERFACE=all): The network interface to show in the title, or all of them.</xbar.var>
 # <xbar.var>string(VERBOSE=false): Show more verbose detail.</xbar.var>
 
 # <swiftbar.hideAbout>true</swiftbar.hideAbout>
@@ -15,24 +15,37 @@
 # <swiftbar.hideLastUpdated>true</swiftbar.hideLastUpdated>
 # <swiftbar.hideDisablePlugin>true</swiftbar.hideDisablePlugin>
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
-# <swiftbar.environment>[INTERFACE=en0, VERBOSE=false]</swiftbar.environment>
+# <swiftbar.environment>[INTERFACE=all, VERBOSE=false]</swiftbar.environment>
+
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
 
 from collections import OrderedDict
-from swiftbar import util
+from swiftbar import history, images, metrics, util
+from swiftbar.history import RingBuffer
+from swiftbar.metrics import IoCounters
 from swiftbar.plugin import Plugin
-from typing import NamedTuple, Union
+from typing import Dict, List, NamedTuple, Tuple, Union
 import re
 import time
 
-class IoCounters(NamedTuple):
-    interface: str
-    bytes_sent: int
-    bytes_recv: int
-    packets_sent: int
-    packets_recv: int
-    errin: int
-    errout: int
-    collisions: int
+# Rates averaged over longer than this aren't "current" any more
+SNAPSHOT_MAX_AGE = 30
+# How long to trust the cached public IP when nothing about the local network has changed
+PUBLIC_IP_MAX_AGE = 300
+PUBLIC_IP_TIMEOUT = 2
+# How often a streaming run reruns ifconfig
+INTERFACE_DATA_MAX_AGE = 30
+# Enough 2 second samples to cover the longest history window with room to spare
+HISTORY_CAPACITY = 512
+HISTORY_WINDOWS = (60, 300, 900)
+
+class ThroughputSample(NamedTuple):
+    counters: Dict[str, IoCounters]
+    timestamp: float
+    throughput: Dict[str, IoCounters]
 
 class InterfaceData(NamedTuple):
     interface: str
@@ -41,55 +54,142 @@ class InterfaceData(NamedTuple):
     inet: str
     inet6: str
 
-def get_data(interface: str=None) -> Union[IoCounters, None]:
-    returncode, stdout, stderr = util.execute_command(f'netstat -bid -I {interface}')
-    if returncode == 0 and stdout:
-        match = re.search(f'^({interface}\s+.*)', stdout, re.MULTILINE)
-        if match:
-            bits = re.split('\s+', match.group(1))
-            return IoCounters(
-                interface    = interface,
-                bytes_sent   = int(bits[9]),
-                bytes_recv   = int(bits[6]),
-                packets_sent = int(bits[7]),
-                packets_recv = int(bits[4]),
-                errin        = int(bits[5]),
-                errout       = int(bits[8]),
-                collisions   = int(bits[10]),
-            )
-        else:
-            # We need to handle this here
-            return None
-    else:
-        # DO SOMETHING HERE
-        print('oops! interface not found!')
-        exit(1)
-
-def get_interface_data(interface: str=None) -> InterfaceData:
-    flags, mac, inet, inet6 = None, None, None, None
-    command = f'ifconfig {interface}'
-    returncode, stdout, _ = util.execute_command(command)
-    if returncode == 0 and stdout:
-        match = re.findall(r'flags=\d+\<([A-Z0-9,]+)\>', stdout, re.MULTILINE)
-        if match:
-            flags = match[0]
-        match = re.findall(r'^\s+ether ([a-z0-9:]+)$', stdout, re.MULTILINE)
-        if match:
-            mac = match[0]
-        match = re.findall(r'inet\s+(\d+\.\d+\.\d+\.\d+)', stdout, re.MULTILINE)
-        if match:
-            inet = match[0]
-        match = re.findall(r'inet6\s+([a-z0-9:]+)', stdout, re.MULTILINE)
-        if match:
-            inet6 = match[0]
-    return InterfaceData(interface=interface, flags=flags, mac=mac, inet=inet, inet6=inet6)
-
-def get_public_ip() -> Union[str, None]:
-    _, stdout, _ = util.execute_command('curl https://ifconfig.io')
-    return stdout if stdout else None
- 
+def is_loopback(interface: str=None) -> bool:
+    return interface.startswith('lo')
+
+def get_active_interfaces(sample: ThroughputSample=None) -> List[str]:
+    # Skip loopback and interfaces that have never passed traffic
+    return [
+        interface for interface in sorted(sample.throughput)
+        if not is_loopback(interface) and (sample.counters[interface].bytes_recv or sample.counters[interface].bytes_sent)
+    ]
+
+def get_data() -> ThroughputSample:
+    # One sample covers every interface
+    return ThroughputSample(counters=metrics.get_backend().net_io_counters(), timestamp=time.monotonic(), throughput=None)
+
+def get_throughput(previous: Union[ThroughputSample, None]=None, current: Union[ThroughputSample, None]=None, min_window: float=0.0) -> ThroughputSample:
+    # Without a previous sample we have to take two, a second apart
+    if previous is None:
+        previous = get_data()
+        min_window = 1.0
+    if current is None:
+        time.sleep(max(0.0, min_window - (time.monotonic() - previous.timestamp)))
+        current = get_data()
+    elapsed = current.timestamp - previous.timestamp
+    # Interfaces that appeared since the previous sample get a rate on the next one
+    throughput = {
+        interface: metrics.io_counters_rate(previous.counters[interface], counters, elapsed)
+        for interface, counters in current.counters.items() if interface in previous.counters
+    }
+    return current._replace(throughput=throughput)
+
+def load_snapshot(plugin: Plugin=None) -> Union[ThroughputSample, None]:
+    snapshot = plugin.read_state('counters', max_age=SNAPSHOT_MAX_AGE)
+    try:
+        counters = {interface: IoCounters(*values) for interface, values in snapshot['counters'].items()}
+        timestamp = float(snapshot['timestamp'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    # A monotonic timestamp from the future means the machine has rebooted since
+    if timestamp >= time.monotonic():
+        return None
+    return ThroughputSample(counters=counters, timestamp=timestamp, throughput=None)
+
+def save_snapshot(plugin: Plugin=None, sample: ThroughputSample=None) -> ThroughputSample:
+    plugin.write_state('counters', {'timestamp': sample.timestamp, 'counters': {interface: list(counters) for interface, counters in sample.counters.items()}})
+    return sample
+
+def get_interface_data(stdout: str=None) -> Dict[str, InterfaceData]:
+    # "ifconfig" with no arguments lists every interface, each block starting with "<name>: flags="
+    interface_data: Dict[str, InterfaceData] = {}
+    for block in re.split(r'\n(?=\S)', stdout or ''):
+        match = re.match(r'^([A-Za-z0-9_.\-]+):\s+flags=', block)
+        if not match:
+            continue
+        flags, mac, inet, inet6 = None, None, None, None
+        found = re.findall(r'flags=\d+\<([A-Z0-9,]+)\>', block, re.MULTILINE)
+        if found:
+            flags = found[0]
+        found = re.findall(r'^\s+ether ([a-z0-9:]+)$', block, re.MULTILINE)
+        if found:
+            mac = found[0]
+        found = re.findall(r'inet\s+(\d+\.\d+\.\d+\.\d+)', block, re.MULTILINE)
+        if found:
+            inet = found[0]
+        found = re.findall(r'inet6\s+([a-z0-9:]+)', block, re.MULTILINE)
+        if found:
+            inet6 = found[0]
+        interface_data[match.group(1)] = InterfaceData(interface=match.group(1), flags=flags, mac=mac, inet=inet, inet6=inet6)
+    return interface_data
+
+def record_history(plugin: Plugin=None, histories: Dict[str, RingBuffer]=None, sample: ThroughputSample=None) -> ThroughputSample:
+    # Each append only rewrites one record, however long the history is
+    now = time.time()
+    for interface in get_active_interfaces(sample):
+        if interface not in histories:
+            histories[interface] = plugin.open_history(interface, width=3, capacity=HISTORY_CAPACITY)
+        rate = sample.throughput[interface]
+        histories[interface].append((now, rate.bytes_recv, rate.bytes_sent))
+    return sample
+
+def get_history_output(ring: RingBuffer=None) -> Tuple[OrderedDict, str]:
+    rx, tx = history.summarize(reversed(ring), now=time.time(), columns=(1, 2), windows=HISTORY_WINDOWS)
+    history_output = OrderedDict()
+    for window in HISTORY_WINDOWS:
+        history_output[f'{window // 60}m Average'] = f'{util.process_bytes(rx.averages[window])} RX / {util.process_bytes(tx.averages[window])} TX'
+    history_output['95th Percentile'] = f'{util.process_bytes(rx.p95)} RX / {util.process_bytes(tx.p95)} TX'
+    history_output['Peak'] = f'{util.process_bytes(rx.peak)} RX / {util.process_bytes(tx.peak)} TX'
+    return history_output, images.sparkline([bytes_recv + bytes_sent for bytes_recv, bytes_sent in zip(rx.values, tx.values)])
+
+def get_network_fingerprint(interface_data: Dict[str, InterfaceData]=None) -> List[str]:
+    # If neither the local addresses nor the default route changed, neither did the public IP
+    addresses = sorted(f'{name}={data.inet}' for name, data in interface_data.items() if data.inet and not is_loopback(name))
+    return [f'route={util.get_default_route_address()}'] + addresses
+
+def get_public_ip(plugin: Plugin=None, fingerprint: List[str]=None) -> Union[str, None]:
+    cached = plugin.read_state('public_ip')
+    try:
+        same_network = cached['fingerprint'] == fingerprint
+        age = time.time() - float(cached['checked'])
+    except (KeyError, TypeError, ValueError):
+        cached, same_network, age = None, False, None
+    if same_network and 0 <= age <= PUBLIC_IP_MAX_AGE:
+        return cached['address']
+
+    public_ip = util.get_public_ip(timeout=PUBLIC_IP_TIMEOUT)
+    if public_ip is None:
+        # Offline or the lookup failed. An expired address is still right if the network hasn't changed.
+        return cached['address'] if same_network else None
+    plugin.write_state('public_ip', {'address': public_ip, 'fingerprint': fingerprint, 'checked': time.time()})
+    return public_ip
+
+def get_interface_output(interface_data: Union[InterfaceData, None]=None, rates: Union[IoCounters, None]=None, counters: Union[IoCounters, None]=None, verbose: bool=False) -> OrderedDict:
+    interface_output = OrderedDict()
+    if interface_data:
+        if interface_data.flags:
+            interface_output['Flags'] = interface_data.flags
+        if interface_data.mac:
+            interface_output['Hardware Address'] = interface_data.mac
+        if interface_data.inet:
+            interface_output['IPv4 Address'] = interface_data.inet
+        if interface_data.inet6:
+            interface_output['IPv6 Address'] = interface_data.inet6
+    if verbose:
+        if rates:
+            interface_output['Inbound Errors/sec'] = rates.errin
+            interface_output['Outbound Errors/sec'] = rates.errout
+            interface_output['Collisions/sec'] = rates.collisions
+        if counters:
+            interface_output['Inbound Errors (total)'] = counters.errin
+            interface_output['Outbound Errors (total)'] = counters.errout
+            interface_output['Collisions (total)'] = counters.collisions
+    return interface_output
+
 def main() -> None:
     plugin = Plugin()
+    # The first sample doubles as the list of interfaces, so there's no need to ask networksetup
+    startup_sample = get_data()
     plugin.defaults_dict['VERBOSE'] = {
         'default_value': False,
         'valid_values': [True, False],
@@ -101,8 +201,8 @@ def main() -> None:
         },
     }
     plugin.defaults_dict['INTERFACE'] = {
-        'default_value': 'en0',
-        'valid_values': util.find_valid_network_interfaces(),
+        'default_value': 'all',
+        'valid_values': ['all'] + sorted(startup_sample.counters),
         'type': str,
         'setting_configuration': {
             'default': None,
@@ -112,50 +212,73 @@ def main() -> None:
     }
     plugin.setup()
 
-    interface_data = get_interface_data(plugin.configuration['INTERFACE'])
-    public_ip = get_public_ip()
-    first_sample = get_data(interface=plugin.configuration['INTERFACE'])
-    time.sleep(1)
-    second_sample = get_data(interface=plugin.configuration['INTERFACE'])
-
-    network_throughput = IoCounters(
-        interface    = plugin.configuration['INTERFACE'],
-        bytes_sent   = second_sample.bytes_sent - first_sample.bytes_sent,
-        bytes_recv   = second_sample.bytes_recv - first_sample.bytes_recv,
-        packets_sent = second_sample.packets_sent - first_sample.packets_sent,
-        packets_recv = second_sample.packets_recv - first_sample.packets_recv,
-        errin        = second_sample.errin - first_sample.errin,
-        errout       = second_sample.errout - first_sample.errout,
-        collisions   = second_sample.collisions - first_sample.collisions,
+    # Measure against the counters the last run saved. If there aren't any, look up the
+    # interface details and public IP while the one second window runs.
+    selected = plugin.configuration['INTERFACE']
+    snapshot = load_snapshot(plugin)
+    details = {'interface_data': {}, 'public_ip': None, 'checked': None}
+
+    # Per-interface history, opened the first time an interface shows traffic
+    histories: Dict[str, RingBuffer] = {}
+
+    def refresh_details() -> None:
+        # A stream keeps sampling, so rerun ifconfig, and with it the public IP's TTL and network
+        # change checks, every INTERFACE_DATA_MAX_AGE seconds rather than forking on every tick
+        now = time.monotonic()
+        if details['checked'] is not None and now - details['checked'] < INTERFACE_DATA_MAX_AGE:
+            return
+        returncode, stdout, _ = util.execute_command(['ifconfig'], timeout=5)
+        details['interface_data'] = get_interface_data(stdout) if returncode == 0 else {}
+        details['public_ip'] = get_public_ip(plugin, get_network_fingerprint(details['interface_data']))
+        details['checked'] = now
+
+    def sample(previous: Union[ThroughputSample, None]) -> ThroughputSample:
+        refresh_details()
+        if previous is not None:
+            current = get_throughput(previous=previous)
+        elif snapshot is not None:
+            current = get_throughput(previous=snapshot, current=startup_sample)
+        else:
+            current = get_throughput(previous=startup_sample, min_window=1.0)
+        return record_history(plugin, histories, save_snapshot(plugin, current))
+
+    def render(sample: ThroughputSample) -> None:
+        interface_data, public_ip = details['interface_data'], details['public_ip']
+        if selected == 'all':
+            rates = [rate for interface, rate in sample.throughput.items() if not is_loopback(interface)]
+            bytes_recv = sum(rate.bytes_recv for rate in rates)
+            bytes_sent = sum(rate.bytes_sent for rate in rates)
+            plugin.print_menu_title(f'Network {util.process_bytes(bytes_recv)} RX / {util.process_bytes(bytes_sent)} TX')
+        else:
+            rate = sample.throughput.get(selected)
+            plugin.print_menu_title(f'{selected} {util.process_bytes(rate.bytes_recv if rate else 0)} RX / {util.process_bytes(rate.bytes_sent if rate else 0)} TX')
+
+        top_output = OrderedDict()
+        if selected != 'all':
+            top_output = get_interface_output(interface_data.get(selected), sample.throughput.get(selected), sample.counters.get(selected), plugin.configuration['VERBOSE'])
+        if public_ip:
+            top_output['Public IP'] = public_ip
+        if top_output:
+            plugin.print_ordered_dict(top_output, justify='left')
+
+        shown = get_active_interfaces(sample)
+        if shown:
+            if top_output:
+                plugin.print_menu_separator()
+            for interface in shown:
+                rate = sample.throughput[interface]
+                plugin.print_menu_item(f'{interface} {util.process_bytes(rate.bytes_recv)} RX / {util.process_bytes(rate.bytes_sent)} TX')
+                interface_output = get_interface_output(interface_data.get(interface), rate, sample.counters[interface], plugin.configuration['VERBOSE'])
+                history_output, sparkline = get_history_output(histories[interface])
+                interface_output.update(history_output)
+                plugin.print_ordered_dict(interface_output, justify='left', indent=2)
+                plugin.print_menu_item(f'--Last {HISTORY_WINDOWS[-1] // 60} Minutes', image=sparkline)
+
+    plugin.run(
+        sample=sample,
+        render=render,
+        interval=2,
     )
-    plugin.print_menu_title(f'{network_throughput.interface} {util.process_bytes(network_throughput.bytes_recv)} RX / {util.process_bytes(network_throughput.bytes_sent)} TX')
-    interface_output = OrderedDict()
-    if interface_data.flags:
-        interface_output['Flags'] = interface_data.flags
-    if interface_data.mac:
-        interface_output['Hardware Address'] = interface_data.mac
-    if interface_data.inet:
-        interface_output['IPv4 Address'] = interface_data.inet
-    if interface_data.inet6:
-        interface_output['IPv6 Address'] = interface_data.inet6
-    if public_ip:
-        interface_output['Public IP'] = public_ip
-    if plugin.configuration['VERBOSE']:
-        if network_throughput.errin is not None:
-            interface_output['Inbound Errors/sec'] = network_throughput.errin
-        if network_throughput.errout is not None:
-            interface_output['Outbound Errors/sec'] = network_throughput.errout
-        if network_throughput.collisions is not None:
-            interface_output['Collisions/sec'] = network_throughput.collisions
-        if second_sample.errin is not None:
-            interface_output['Inbound Errors (total)'] = second_sample.errin
-        if second_sample.errout is not None:
-            interface_output['Outbound Errors (total)'] = second_sample.errout
-        if second_sample.collisions is not None:
-            interface_output['Collisions (total)'] = second_sample.collisions
-
-    plugin.print_ordered_dict(interface_output, justify='left')
-    plugin.render_footer()
 
 if __name__ == '__main__':
     main()
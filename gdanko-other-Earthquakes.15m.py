@@ -27,8 +27,8 @@ import datetime
 import re
 import time
 
-def get_quake_data(radius: int=0, magnitude: int=0, unit: str='m', limit: int=0) -> Tuple[Union[str, None], Dict[str, Any], Union[str, None]]:
-    geodata = util.geolocate_me()
+def get_quake_data(radius: int=0, magnitude: int=0, unit: str='m', limit: int=0, cache_dir: str=None) -> Tuple[Union[str, None], Dict[str, Any], Union[str, None]]:
+    geodata = util.geolocate_me(cache_dir=cache_dir)
     if not geodata:
         return None, {}, 'Failed to geolocate'
    
@@ -108,13 +108,16 @@ def main() -> None:
         },
     }
     plugin.setup()
+    plugin.enable_http_cache()
+    plugin.enable_circuit_breaker()
 
     time_format = '%a, %B %-d, %Y %H:%M:%S'
     location, quake_data, err = get_quake_data(
         radius=plugin.configuration['MAXIMUM_RADIUS'],
         magnitude=plugin.configuration['MINIMUM_MAGNITUDE'],
         unit=plugin.configuration['UNIT'],
-        limit=plugin.configuration['LIMIT']
+        limit=plugin.configuration['LIMIT'],
+        cache_dir=plugin.config_dir,
     )
     if quake_data:
         if 'features' in quake_data and type (quake_data['features']) == list:
@@ -51,14 +51,10 @@ def process_actions(plugin: Plugin=None) -> None:
             )
             plugin.print_menu_separator()
 
-def refresh_token() -> Tuple[Union[str, None], Union[str, None]]:
-    _, stdout, stderr = util.execute_command('security find-generic-password -w -s rsatoken | stoken --stdin')
-    if stderr:
-        return None, stderr
-    return stdout, None
+TOKEN_COMMAND = 'security find-generic-password -w -s rsatoken | stoken --stdin'
 
-def get_item(key: str=None) -> Tuple[Union[str, None], Union[str, None]]:
-    _, stdout, stderr = util.execute_command(f'security find-generic-password -w -s {key}')
+def refresh_token() -> Tuple[Union[str, None], Union[str, None]]:
+    _, stdout, stderr = util.execute_command(TOKEN_COMMAND)
     if stderr:
         return None, stderr
     return stdout, None
@@ -75,14 +71,14 @@ def get_data() -> Tuple[Dict[str, str], List[str]]:
     if not stoken:
         return ['stoken not installed - brew install stoken'], None
 
-    output['token'], error = refresh_token()
-    if error:
-        errors.append(error)
-    
+    # The token and the keychain lookups don't depend on each other, so fetch them all at once
+    commands = {'token': TOKEN_COMMAND}
     for key in ['rsatoken-pin', 'snad', 'snc.bssh.ldap_pass']:
-        output[key], error =  get_item(key)
-        if error:
-            errors.append(f'Failed to retrieve "{key}": {error}')
+        commands[key] = ['security', 'find-generic-password', '-w', '-s', key]
+    for key, (_, stdout, stderr) in util.execute_commands(commands, timeout=10).items():
+        output[key] = None if stderr else stdout
+        if stderr:
+            errors.append(stderr if key == 'token' else f'Failed to retrieve "{key}": {stderr}')
     return output, errors
 
 def pbcopy(text: str=None) -> None:
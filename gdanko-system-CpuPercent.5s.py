@@ -19,12 +19,22 @@
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 # <swiftbar.environment>[EXTENDED_DETAILS_ENABLED=true, CLICK_TO_KILL=false, KILL_SIGNAL=SIGQUIT, MAX_CONSUMERS=30]</swiftbar.environment>
 
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
+
 from collections import namedtuple
-from swiftbar import util
+from swiftbar import metrics, util
 from swiftbar.plugin import Plugin
-from typing import Any, Dict, List, NamedTuple
-import pkg_resources
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
 import re
+import time
+
+# A snapshot older than this is too stale to be a fair "current" reading
+SNAPSHOT_MAX_AGE = 30
+# How long to sample for when there's no usable snapshot
+FALLBACK_WINDOW = 0.25
 
 class CpuTimes(NamedTuple):
     cpu: str
@@ -40,6 +50,12 @@ class CpuTimes(NamedTuple):
     # guest: float
     # guestnice: float
 
+class CpuSample(NamedTuple):
+    times: List[metrics.CpuTimes]
+    timestamp: float
+    window: float
+    percent: List[CpuTimes]
+
 class CpuConsumer(NamedTuple):
     Command: str
     CpuUsage: float
@@ -113,6 +129,27 @@ def combine_stats(cpu_time_stats: List=None, cpu_type: str=None) -> CpuTimes:
         user=(user / len(cpu_time_stats)),
     )
 
+def load_snapshot(plugin: Plugin=None, max_age: float=None) -> Union[Tuple[List[metrics.CpuTimes], float], None]:
+    snapshot = plugin.read_state('cpu_times', max_age=max_age)
+    try:
+        times = [metrics.CpuTimes(*row) for row in snapshot['times']]
+        timestamp = float(snapshot['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    # A monotonic timestamp from the future means the machine has rebooted since
+    if timestamp >= time.monotonic():
+        return None
+    return times, timestamp
+
+def save_snapshot(plugin: Plugin=None, times: List[metrics.CpuTimes]=None, timestamp: float=None) -> None:
+    plugin.write_state('cpu_times', {'timestamp': timestamp, 'times': [list(cpu) for cpu in times]})
+
+def is_continuation(before: List[metrics.CpuTimes]=None, after: List[metrics.CpuTimes]=None) -> bool:
+    # The counters only ever go up, so anything else means they were reset
+    if len(before) != len(after):
+        return False
+    return all(b.user <= a.user and b.nice <= a.nice and b.system <= a.system and b.idle <= a.idle for b, a in zip(before, after))
+
 def get_top_cpu_usage() -> List[CpuConsumer]:
     cpu_info: List[CpuConsumer] = []
     command = f'ps -axm -o %cpu,pid,user,comm | tail -n+2'
@@ -191,65 +228,92 @@ def main() -> None:
     #     del plugin.configuration['KILL_SIGNAL']
     #     del plugin.configuration['MAX_CONSUMERS'] 
 
-    required = {'psutil'}
-    installed = {pkg.key for pkg in pkg_resources.working_set}
-    missing = required - installed
-    if len(missing) == 0:
-        from psutil import cpu_freq, cpu_times_percent
+    backend = metrics.get_backend()
+    first_times = backend.cpu_times()
+    first_timestamp = time.monotonic()
+    if first_times:
         command_length = 125
-        cpu_type = util.get_sysctl('machdep.cpu.brand_string')
-        cpu_family = get_cpu_family_strings().get(int(util.get_sysctl('hw.cpufamily')), int(util.get_sysctl('hw.cpufamily')))
-        max_cpu_freq = cpu_freq().max if cpu_freq().max is not None else None
-        individual_cpu_pct = []
-        combined_cpu_pct = []
-
-        individual_cpu_percent = cpu_times_percent(interval=1.0, percpu=True)
-
-        for i, cpu_instance in enumerate(individual_cpu_percent):
-            individual_cpu_pct.append(CpuTimes(cpu=i, cpu_type=cpu_type, user=cpu_instance.user, system=cpu_instance.system, nice=cpu_instance.nice, idle=cpu_instance.idle))
-        combined_cpu_pct.append(combine_stats(individual_cpu_pct, cpu_type))
-
-        plugin.print_menu_title(f'CPU: user {util.pad_float(combined_cpu_pct[0].user)}%, sys {util.pad_float(combined_cpu_pct[0].system)}%, idle {util.pad_float(combined_cpu_pct[0].idle)}%')
-        if plugin.configuration['EXTENDED_DETAILS_ENABLED']:
-            if cpu_type is not None:
-                processor = cpu_type
-                if cpu_family:
-                    processor = processor + f' ({cpu_family})'
-                if max_cpu_freq:
-                    processor = processor + f' @ {util.pad_float(max_cpu_freq / 1000)} GHz'
-                plugin.print_menu_item(f'Processor: {processor}')
+        sysctls = backend.sysctls(['machdep.cpu.brand_string', 'hw.cpufamily'])
+        cpu_type = sysctls['machdep.cpu.brand_string']
+        cpu_family = get_cpu_family_strings().get(sysctls['hw.cpufamily'], sysctls['hw.cpufamily'])
+        try:
+            from psutil import cpu_freq
+            max_cpu_freq = cpu_freq().max if cpu_freq() and cpu_freq().max else None
+        except ImportError:
+            max_cpu_freq = None
+
+        def sample(previous: Union[CpuSample, None]) -> CpuSample:
+            # The counters are cumulative, so we measure against the last run's snapshot and
+            # only wait for fresh activity when there isn't a usable one
+            if previous is not None:
+                before, started = previous.times, previous.timestamp
+                times = backend.cpu_times()
+            else:
+                snapshot = load_snapshot(plugin, max_age=SNAPSHOT_MAX_AGE)
+                times = first_times
+                if snapshot and is_continuation(snapshot[0], times):
+                    before, started = snapshot
+                else:
+                    before, started = first_times, first_timestamp
+                    time.sleep(max(0.0, FALLBACK_WINDOW - (time.monotonic() - first_timestamp)))
+                    times = backend.cpu_times()
+            timestamp = time.monotonic()
+            save_snapshot(plugin, times, timestamp)
+
+            individual_cpu_pct = []
+            for cpu_instance in metrics.cpu_times_percent(before, times):
+                individual_cpu_pct.append(CpuTimes(cpu=cpu_instance.cpu, cpu_type=cpu_type, user=cpu_instance.user, system=cpu_instance.system, nice=cpu_instance.nice, idle=cpu_instance.idle))
+            return CpuSample(times=times, timestamp=timestamp, window=timestamp - started, percent=individual_cpu_pct)
+
+        def render(cpu_sample: CpuSample) -> None:
+            individual_cpu_pct = cpu_sample.percent
+            combined_cpu_pct = []
+            combined_cpu_pct.append(combine_stats(individual_cpu_pct, cpu_type))
+
+            plugin.print_menu_title(f'CPU: user {util.pad_float(combined_cpu_pct[0].user)}%, sys {util.pad_float(combined_cpu_pct[0].system)}%, idle {util.pad_float(combined_cpu_pct[0].idle)}%')
+            if plugin.configuration['EXTENDED_DETAILS_ENABLED']:
+                if cpu_type is not None:
+                    processor = cpu_type
+                    if cpu_family:
+                        processor = processor + f' ({cpu_family})'
+                    if max_cpu_freq:
+                        processor = processor + f' @ {util.pad_float(max_cpu_freq / 1000)} GHz'
+                    plugin.print_menu_item(f'Processor: {processor}')
+                plugin.print_menu_item(f'Sampling window: {util.pad_float(cpu_sample.window)}s')
                 
-            for cpu in individual_cpu_pct:
-                plugin.print_menu_item(f'Core {str(cpu.cpu)}: user {cpu.user}%, sys {cpu.system}%, idle {cpu.idle}%')
-
-        if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
-            top_cpu_consumers = get_top_cpu_usage()
-            if len(top_cpu_consumers) > 0:
-                plugin.print_menu_separator()
-                if len(top_cpu_consumers) > plugin.configuration['MAX_CONSUMERS']:
-                    top_cpu_consumers = top_cpu_consumers[0:plugin.configuration['MAX_CONSUMERS']]
-                plugin.print_menu_item(
-                    f'Top {len(top_cpu_consumers)} CPU Consumers',
-                )
-                for consumer in top_cpu_consumers:
-                    padding_width = 6
-                    icon = util.get_process_icon(consumer.User, plugin.configuration['CLICK_TO_KILL'])
-                    cpu_usage = f'{str(consumer.CpuUsage)}%'
-                    cmd = ['kill', f'-{util.get_signal_map()[plugin.configuration["KILL_SIGNAL"]]}', consumer.Pid] if plugin.configuration['CLICK_TO_KILL'] else []
+                for cpu in individual_cpu_pct:
+                    plugin.print_menu_item(f'Core {str(cpu.cpu)}: user {cpu.user}%, sys {cpu.system}%, idle {cpu.idle}%')
+
+            if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
+                top_cpu_consumers = get_top_cpu_usage()
+                if len(top_cpu_consumers) > 0:
+                    plugin.print_menu_separator()
+                    if len(top_cpu_consumers) > plugin.configuration['MAX_CONSUMERS']:
+                        top_cpu_consumers = top_cpu_consumers[0:plugin.configuration['MAX_CONSUMERS']]
                     plugin.print_menu_item(
-                        f'--{icon}{cpu_usage.rjust(padding_width)} - {consumer.Command}',
-                        cmd=cmd,
-                        emojize=True,
-                        length=command_length,
-                        symbolize=False,
-                        terminal=False,
-                        trim=False,
+                        f'Top {len(top_cpu_consumers)} CPU Consumers',
                     )
+                    for consumer in top_cpu_consumers:
+                        padding_width = 6
+                        icon = util.get_process_icon(consumer.User, plugin.configuration['CLICK_TO_KILL'])
+                        cpu_usage = f'{str(consumer.CpuUsage)}%'
+                        cmd = ['kill', f'-{util.get_signal_map()[plugin.configuration["KILL_SIGNAL"]]}', consumer.Pid] if plugin.configuration['CLICK_TO_KILL'] else []
+                        plugin.print_menu_item(
+                            f'--{icon}{cpu_usage.rjust(padding_width)} - {consumer.Command}',
+                            cmd=cmd,
+                            emojize=True,
+                            length=command_length,
+                            symbolize=False,
+                            terminal=False,
+                            trim=False,
+                        )
+
+        plugin.run(sample=sample, render=render, interval=5)
     else:
         plugin.print_menu_title('CPU: Error')
         plugin.print_menu_separator()
-        plugin.print_menu_item(f'Please install the following packages via pip: {", ".join(missing)}')
-    plugin.render_footer()
+        plugin.print_menu_item(f'Unable to read CPU times with the {backend.name} metrics backend; try "pip install psutil"')
+        plugin.render_footer()
 
 if __name__ == '__main__':
     main()
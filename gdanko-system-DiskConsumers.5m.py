@@ -29,7 +29,7 @@ class DiskConsumer(NamedTuple):
 
 def get_consumers(path: str=None) -> List[DiskConsumer]:
     consumers: List[DiskConsumer] = []
-    command = f'find {path} -depth 1 -exec du -sk {{}} \;'
+    command = ['find', os.path.expanduser(path), '-depth', '1', '-exec', 'du', '-sk', '{}', ';']
     _, stdout, _ = util.execute_command(command)
     if stdout:
         lines = stdout.strip().split('\n')
@@ -19,14 +19,19 @@
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 # <swiftbar.environment>[DEBUG_ENABLED=false, EXTENDED_DETAILS_ENABLED=true, MOUNTPOINT=/, UNIT=auto]</swiftbar.environment>
 
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
+
 from collections import OrderedDict
 from swiftbar.plugin import Plugin
-from swiftbar import util
+from swiftbar import metrics, util
 import shutil
 
 def main() -> None:
     plugin = Plugin(disable_brew=True)
-    partitions = util.find_partitions()
+    partitions = metrics.get_backend().partitions()
     plugin.defaults_dict['EXTENDED_DETAILS_ENABLED'] = {
         'default_value': True,
         'valid_values': [True, False],
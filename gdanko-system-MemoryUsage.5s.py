@@ -20,37 +20,26 @@
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 # <swiftbar.environment>[EXTENDED_DETAILS_ENABLED=true, CLICK_TO_KILL=false, KILL_SIGNAL=SIGQUIT, MAX_CONSUMERS=30]</swiftbar.environment, UNIT=auto>
 
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
+
 from collections import namedtuple, OrderedDict
-from swiftbar import util
+from swiftbar import metrics, util
 from swiftbar.plugin import Plugin
 from typing import Any, Dict, List, NamedTuple, Tuple, Union
 import json
 import re
 
-class SystemMemory(NamedTuple):
-    total: int
-    available: int
-    percent: float
-    used: int
-    free: int
-    active: int
-    inactive: int
-    wired: int
-    speculative: int
-
 class MemoryConsumer(NamedTuple):
     Command: str
     Bytes: int
     Pid: int
     User: str
 
-def get_memory_pressure_value(pagesize: int=0, pattern: str=None, string: str=None) -> Union[int, None]:
-    match = re.search(pattern, string)
-    return int(match.group(1)) * pagesize if match else None
-
-def get_memory_details() -> Tuple[str, ...]:
-    command = f'system_profiler SPMemoryDataType -json'
-    returncode, stdout, _ = util.execute_command(command)
+def get_memory_details(result: Tuple[int, str, str]=None) -> Tuple[str, ...]:
+    returncode, stdout, stderr = result or util.execute_command('system_profiler SPMemoryDataType -json')
     if returncode == 0:
         try:
             json_data = json.loads(stdout)
@@ -59,59 +48,7 @@ def get_memory_details() -> Tuple[str, ...]:
         except Exception as e:
             return '', '', e
     else:
-        return '', '', e
-
-def virtual_memory() -> SystemMemory:
-    # https://github.com/giampaolo/psutil/blob/master/psutil/_psosx.py
-    round_ = 1
-    returncode, stdout, _ = util.execute_command('memory_pressure')
-    if returncode == 0:
-        memory_pressure = stdout
-    else:
-        return None
-    
-    memory_pressure_output = {}
-    memory_pressure_map = {
-        'total': r'(\d+) pages with a page size of',
-        'free': r'Pages free:\s+(\d+)',
-        'active': r'Pages active:\s+(\d+)',
-        'inactive': r'Pages inactive:\s+(\d+)',
-        'wired': r'Pages wired down:\s+(\d+)',
-        'speculative': r'Pages speculative:\s+(\d+)',
-    }
-    pagesize = get_memory_pressure_value(1, r'page size of\s+(\d+)', memory_pressure)
-    if not pagesize:
-        return None
-
-    for key, pattern in memory_pressure_map.items():
-        result = get_memory_pressure_value(pagesize, pattern, memory_pressure)
-        if result:
-            memory_pressure_output[key] = result
-        else:
-            return None
-    
-    memory_pressure_output['free'] -= memory_pressure_output['speculative']
-    memory_pressure_output['available'] = memory_pressure_output['inactive'] + memory_pressure_output['free']
-    memory_pressure_output['used'] = memory_pressure_output['active'] + memory_pressure_output['wired']
-
-    try:
-        percent =  (float(memory_pressure_output['used']) / memory_pressure_output['total']) * 100
-    except ZeroDivisionError:
-        percent = 0.0
-    else:
-        if round_ is not None:
-            percent = round(percent, round_)
-
-    return SystemMemory(
-        total=memory_pressure_output['total'],
-        available=memory_pressure_output['available'],
-        percent=percent, used=memory_pressure_output['used'],
-        free=memory_pressure_output['free'],
-        active=memory_pressure_output['active'],
-        inactive=memory_pressure_output['inactive'],
-        wired=memory_pressure_output['wired'],
-        speculative=memory_pressure_output['speculative'],
-    )
+        return '', '', stderr or f'system_profiler exited with {returncode}'
 
 def get_top_memory_usage() -> List[MemoryConsumer]:
     memory_info: List[MemoryConsumer] = []
@@ -201,57 +138,70 @@ def main() -> None:
     #     del plugin.configuration['MAX_CONSUMERS'] 
     
     command_length = 125
-    memory_type, memory_brand, err = get_memory_details()
-    mem = virtual_memory()
-    if mem:
-        used = util.format_number(mem.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.used, plugin.configuration['UNIT'])
-        total = util.format_number(mem.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.total, plugin.configuration['UNIT'])
-        plugin.print_menu_title(f'Memory: {used} / {total}')
-        if plugin.configuration['EXTENDED_DETAILS_ENABLED']:
-            memory_output = OrderedDict()
-            if not err:
-                memory_output['Memory'] = f'{memory_brand} {memory_type}'
-            memory_output['Total'] = util.format_number(mem.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.total, plugin.configuration['UNIT'])
-            memory_output['Available'] = util.format_number(mem.available) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.available, plugin.configuration['UNIT'])
-            memory_output['Used'] = util.format_number(mem.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.used, plugin.configuration['UNIT'])
-            memory_output['Free'] = util.format_number(mem.free) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.free, plugin.configuration['UNIT'])
-            memory_output['Active'] = util.format_number(mem.active) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.active, plugin.configuration['UNIT'])
-            memory_output['Inactive'] = util.format_number(mem.inactive) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.inactive, plugin.configuration['UNIT'])
-            memory_output['Wired'] = util.format_number(mem.wired) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.wired, plugin.configuration['UNIT'])
-            memory_output['Speculative'] = util.format_number(mem.speculative) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.speculative, plugin.configuration['UNIT'])
-            plugin.print_ordered_dict(memory_output, justify='left')
-
-        if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
-            top_memory_consumers = get_top_memory_usage()
-            if len(top_memory_consumers) > 0:
-                plugin.print_menu_separator()
-                if len(top_memory_consumers) > plugin.configuration['MAX_CONSUMERS']:
-                    top_memory_consumers = top_memory_consumers[0:plugin.configuration['MAX_CONSUMERS']]
-                plugin.print_menu_item(
-                    f'Top {len(top_memory_consumers)} Memory Consumers',
-                )
-                consumer_total = 0
-                for consumer in top_memory_consumers:
-                    consumer_total += consumer.Bytes
-                    padding_width = 12
-                    icon = util.get_process_icon(consumer.User, plugin.configuration['CLICK_TO_KILL'])
-                    cmd = ['kill', f'-{util.get_signal_map()[plugin.configuration["KILL_SIGNAL"]]}', consumer.Pid] if plugin.configuration["CLICK_TO_KILL"] else []
+    backend = metrics.get_backend()
+    commands = {'details': 'system_profiler SPMemoryDataType -json'}
+    if isinstance(backend, metrics.SubprocessBackend):
+        # memory_pressure is nearly as slow as system_profiler, so run them together
+        commands['memory_pressure'] = 'memory_pressure'
+    results = util.execute_commands(commands, timeout=10)
+    memory_type, memory_brand, err = get_memory_details(results['details'])
+    first_sample = iter([metrics.parse_memory_pressure(results['memory_pressure'][1])] if 'memory_pressure' in results else [])
+
+    def render(mem: Union[metrics.SystemMemory, None]) -> None:
+        if mem:
+            used = util.format_number(mem.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.used, plugin.configuration['UNIT'])
+            total = util.format_number(mem.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.total, plugin.configuration['UNIT'])
+            plugin.print_menu_title(f'Memory: {used} / {total}')
+            if plugin.configuration['EXTENDED_DETAILS_ENABLED']:
+                memory_output = OrderedDict()
+                if not err:
+                    memory_output['Memory'] = f'{memory_brand} {memory_type}'
+                memory_output['Total'] = util.format_number(mem.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.total, plugin.configuration['UNIT'])
+                memory_output['Available'] = util.format_number(mem.available) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.available, plugin.configuration['UNIT'])
+                memory_output['Used'] = util.format_number(mem.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.used, plugin.configuration['UNIT'])
+                memory_output['Free'] = util.format_number(mem.free) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.free, plugin.configuration['UNIT'])
+                memory_output['Active'] = util.format_number(mem.active) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.active, plugin.configuration['UNIT'])
+                memory_output['Inactive'] = util.format_number(mem.inactive) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.inactive, plugin.configuration['UNIT'])
+                memory_output['Wired'] = util.format_number(mem.wired) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.wired, plugin.configuration['UNIT'])
+                memory_output['Speculative'] = util.format_number(mem.speculative) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(mem.speculative, plugin.configuration['UNIT'])
+                plugin.print_ordered_dict(memory_output, justify='left')
+
+            if 'TOP_CONSUMERS_ENABLED' in plugin.configuration and plugin.configuration['TOP_CONSUMERS_ENABLED']:
+                top_memory_consumers = get_top_memory_usage()
+                if len(top_memory_consumers) > 0:
+                    plugin.print_menu_separator()
+                    if len(top_memory_consumers) > plugin.configuration['MAX_CONSUMERS']:
+                        top_memory_consumers = top_memory_consumers[0:plugin.configuration['MAX_CONSUMERS']]
                     plugin.print_menu_item(
-                        f'--{icon}{util.format_number(consumer.Bytes).rjust(padding_width)} - {consumer.Command}',
-                        cmd=cmd,
-                        emojize=True,
-                        length=command_length,
-                        refresh=True,
-                        symbolize=False,
-                        terminal=False,
-                        trim=False,
+                        f'Top {len(top_memory_consumers)} Memory Consumers',
                     )
-                plugin.print_menu_item(f'--Total: {util.format_number(consumer_total)}')
-    else:
-        plugin.print_menu_item('Memory: Unknown')
-        plugin.print_menu_separator()
-        plugin.print_menu_item('Failed to parse vm_stat')
-    plugin.render_footer()
+                    consumer_total = 0
+                    for consumer in top_memory_consumers:
+                        consumer_total += consumer.Bytes
+                        padding_width = 12
+                        icon = util.get_process_icon(consumer.User, plugin.configuration['CLICK_TO_KILL'])
+                        cmd = ['kill', f'-{util.get_signal_map()[plugin.configuration["KILL_SIGNAL"]]}', consumer.Pid] if plugin.configuration["CLICK_TO_KILL"] else []
+                        plugin.print_menu_item(
+                            f'--{icon}{util.format_number(consumer.Bytes).rjust(padding_width)} - {consumer.Command}',
+                            cmd=cmd,
+                            emojize=True,
+                            length=command_length,
+                            refresh=True,
+                            symbolize=False,
+                            terminal=False,
+                            trim=False,
+                        )
+                    plugin.print_menu_item(f'--Total: {util.format_number(consumer_total)}')
+        else:
+            plugin.print_menu_item('Memory: Unknown')
+            plugin.print_menu_separator()
+            plugin.print_menu_item('Failed to parse vm_stat')
+
+    plugin.run(
+        sample=lambda previous: next(first_sample, None) or backend.virtual_memory(),
+        render=render,
+        interval=5,
+    )
 
 if __name__ == '__main__':
     main()
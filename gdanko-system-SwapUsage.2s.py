@@ -16,26 +16,14 @@
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 # <swiftbar.environment>[UNIT=auto]</swiftbar.environment>
 
-from swiftbar import util
-from swiftbar.plugin import Plugin
-from typing import NamedTuple, Union
-import re
-
-class SwapUsage(NamedTuple):
-    total: int
-    free: int
-    used: int
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
 
-def get_swap_usage() -> Union[SwapUsage, None]:
-    output = util.get_sysctl('vm.swapusage')
-    if output:
-        match = re.search(r'^total = (\d+\.\d+)M\s+used = (\d+\.\d+)M\s+free = (\d+\.\d+)M\s+', output)
-        if match:
-            total = int(float(match.group(1))) * 1024 * 1024
-            used = int(float(match.group(2))) * 1024 * 1024
-            free = int(float(match.group(3))) * 1024 * 1024
-            return SwapUsage(total=total, free=free, used=used)
-    return None
+from swiftbar import metrics, util
+from swiftbar.plugin import Plugin
+from typing import Union
 
 def main() -> None:
     plugin = Plugin()
@@ -51,15 +39,20 @@ def main() -> None:
     }
     plugin.setup()
 
-    swap = get_swap_usage()
-    if swap:
-        used = util.format_number(swap.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(swap.used, plugin.configuration['UNIT'])
-        total = util.format_number(swap.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(swap.total, plugin.configuration['UNIT'])
-        plugin.print_menu_title(f'Swap: {used} / {total}')
-    else:
-        plugin.print_menu_title('Swap: Failed')
-        plugin.print_menu_item('Failed to gather swap information')
-    plugin.render_footer()
+    def render(swap: Union[metrics.SwapUsage, None]) -> None:
+        if swap:
+            used = util.format_number(swap.used) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(swap.used, plugin.configuration['UNIT'])
+            total = util.format_number(swap.total) if plugin.configuration['UNIT'] == 'auto' else util.byte_converter(swap.total, plugin.configuration['UNIT'])
+            plugin.print_menu_title(f'Swap: {used} / {total}')
+        else:
+            plugin.print_menu_title('Swap: Failed')
+            plugin.print_menu_item('Failed to gather swap information')
+
+    plugin.run(
+        sample=lambda previous: metrics.get_backend().swap_usage(),
+        render=render,
+        interval=2,
+    )
 
 if __name__ == '__main__':
     main()
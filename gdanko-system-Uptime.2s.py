@@ -15,11 +15,15 @@
 # <swiftbar.hideSwiftBar>false</swiftbar.hideSwiftBar>
 # <swiftbar.environment>[]</swiftbar.environment>
 
-from swiftbar import util
+if __name__ == '__main__':
+    # Hand off to the resident plugin host (swiftbar.host) if it's running
+    from swiftbar import host
+    host.forward()
+
+from swiftbar import metrics
 from swiftbar.plugin import Plugin
-from typing import NamedTuple, Union
+from typing import NamedTuple, Tuple, Union
 import datetime
-import re
 import time
 
 class Duration(NamedTuple):
@@ -39,19 +43,8 @@ def get_duration(seconds: int=0) -> Union[Duration, None]:
     except:
         return None
 
-def get_boot_time() -> Union[int, None]:
-    returncode, stdout, _ = util.execute_command('sysctl -n kern.boottime')
-    if returncode != 0:
-        return None
-    pattern = re.compile(r'sec = ([0-9]{10,13})')
-    match = re.search(pattern, stdout)
-    if match:
-        timestamp = int(match.group(1))
-        return timestamp
-    return None
-
 def get_duration_tuple() -> Union[int, Duration, None]:
-    boot_time = get_boot_time()
+    boot_time = metrics.get_backend().boot_time()
     if boot_time:
         return boot_time, get_duration(int(time.time()) - boot_time)
     else:
@@ -61,18 +54,24 @@ def main() -> None:
     plugin = Plugin()
     plugin.setup()
 
-    boot_time, duration_tuple = get_duration_tuple()
-    if duration_tuple:
-        uptime = []
-        if duration_tuple.days > 0:
-            uptime.append(f'{duration_tuple.days} {"day" if duration_tuple.days == 1 else "days"}')
-        uptime.append(f'{str(duration_tuple.hours).zfill(2)}:{str(duration_tuple.minutes).zfill(2)}')
-        plugin.print_menu_title(f'up {" ".join(uptime)}', display_update_time=False)
-        plugin.print_menu_item(f'Last boot: {datetime.datetime.fromtimestamp(boot_time).strftime("%Y-%m-%d %H:%M:%S")}')
-    else:
-        plugin.print_menu_item('Uptime: N/A')
-        plugin.print_menu_item('Failed to determine boot time')
-    plugin.render_footer()
+    def render(sample: Tuple[Union[int, None], Union[Duration, None]]) -> None:
+        boot_time, duration_tuple = sample
+        if duration_tuple:
+            uptime = []
+            if duration_tuple.days > 0:
+                uptime.append(f'{duration_tuple.days} {"day" if duration_tuple.days == 1 else "days"}')
+            uptime.append(f'{str(duration_tuple.hours).zfill(2)}:{str(duration_tuple.minutes).zfill(2)}')
+            plugin.print_menu_title(f'up {" ".join(uptime)}', display_update_time=False)
+            plugin.print_menu_item(f'Last boot: {datetime.datetime.fromtimestamp(boot_time).strftime("%Y-%m-%d %H:%M:%S")}')
+        else:
+            plugin.print_menu_item('Uptime: N/A')
+            plugin.print_menu_item('Failed to determine boot time')
+
+    plugin.run(
+        sample=lambda previous: get_duration_tuple(),
+        render=render,
+        interval=2,
+    )
 
 if __name__ == '__main__':
     main()
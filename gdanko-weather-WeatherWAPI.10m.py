@@ -85,12 +85,14 @@ def main() -> None:
         },
     }
     plugin.setup()
+    plugin.enable_http_cache()
+    plugin.enable_circuit_breaker()
 
     location = None
     if plugin.configuration['LOCATION']:
         location = plugin.configuration['LOCATION']
     else:
-        geodata = util.geolocate_me()
+        geodata = util.geolocate_me(cache_dir=plugin.config_dir)
         if geodata:
             location = f'{geodata.City}, {geodata.Region}, {geodata.Country}'
         else:
@@ -101,28 +103,37 @@ def main() -> None:
     if plugin.configuration['API_KEY'] == '':
         plugin.error_messages.append('Missing API key')
     else:
-        response, weather_data, err = request.swiftbar_request(
-            host='api.weatherapi.com',
-            path='/v1/current.json',
-            query={'key': plugin.configuration['API_KEY'], 'q': location, 'aqi': 'yes'},
-            return_type = 'json',
-            encode_query=True,
-        )
-        if response.status != 200:
+        # current.json and forecast.json don't depend on each other, so fetch them together
+        results = request.gather({
+            'current': {
+                'host': 'api.weatherapi.com',
+                'path': '/v1/current.json',
+                'query': {'key': plugin.configuration['API_KEY'], 'q': location, 'aqi': 'yes'},
+                'return_type': 'json',
+                'encode_query': True,
+            },
+            'forecast': {
+                'host': 'api.weatherapi.com',
+                'path': '/v1/forecast.json',
+                'query': {'key': plugin.configuration['API_KEY'], 'q': location, 'days': 8, 'aqi': 'yes', 'alerts': 'yes'},
+                'return_type': 'json',
+                'encode_query': True,
+            },
+        })
+        response, weather_data, err = results['current']
+        if response is None:
+            plugin.error_messages.append(f'Failed to fetch weather data: {err}')
+        elif response.status != 200:
             error_message = f'A non-200 {response.status} response code was received'
             if weather_data:
                 if 'error' in weather_data and 'message' in weather_data['error']:
                     error_message = weather_data['error']['message']
             plugin.error_messages.append(f'Failed to fetch weather data: {error_message}')
 
-        response, forecast_data, err = request.swiftbar_request(
-            host='api.weatherapi.com',
-            path='/v1/forecast.json',
-            query={'key': plugin.configuration['API_KEY'], 'q': location, 'days': 8, 'aqi': 'yes', 'alerts': 'yes'},
-            return_type = 'json',
-            encode_query=True,
-        )
-        if response.status != 200:
+        response, forecast_data, err = results['forecast']
+        if response is None:
+            plugin.error_messages.append(f'Failed to fetch forecast data: {err}')
+        elif response.status != 200:
             error_message = f'A non-200 {response.status} response code was received'
             if forecast_data:
                 if 'error' in forecast_data and 'message' in forecast_data['error']:
@@ -0,0 +1,224 @@
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+import math
+import os
+import struct
+
+# Header: magic, record width (in doubles), capacity (in records), index of the next slot, records stored
+_HEADER = struct.Struct('<4sIIII')
+_MAGIC = b'SBRB'
+_ITEM_SIZE = array('d').itemsize
+
+class HistoryStats(NamedTuple):
+    averages: Dict[int, float]
+    p95: float
+    peak: float
+    values: List[float]
+
+class RingBuffer:
+    """
+    A fixed-size history of float records kept in a file. The file never grows: appending
+    overwrites the oldest record in place and only rewrites that record and the header.
+    """
+    def __init__(self, path: str=None, width: int=1, capacity: int=512) -> None:
+        self.path = path
+        self.width = width
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        self.data = array('d', bytes(_ITEM_SIZE * width * capacity))
+        # Whether the file on disk matches what's in memory and can be patched in place
+        self.synced = False
+        self._load()
+
+    def _load(self) -> None:
+        """
+        Read the whole buffer in one go. A missing file, or one written with a different
+        shape, starts an empty history.
+        """
+        try:
+            with open(self.path, 'rb') as fh:
+                header = fh.read(_HEADER.size)
+                magic, width, capacity, head, count = _HEADER.unpack(header)
+                if magic != _MAGIC or width != self.width or capacity != self.capacity or head >= capacity or count > capacity:
+                    return
+                data = array('d')
+                data.fromfile(fh, width * capacity)
+        except (OSError, EOFError, struct.error):
+            return
+        self.data, self.head, self.count = data, head, count
+        self.synced = True
+
+    def _write_header(self, fh) -> None:
+        fh.seek(0)
+        fh.write(_HEADER.pack(_MAGIC, self.width, self.capacity, self.head, self.count))
+
+    def append(self, record: Iterable[float]=None) -> None:
+        """
+        Add a record, dropping the oldest one if the buffer is full.
+        """
+        record = array('d', record)
+        if len(record) != self.width:
+            raise ValueError(f'Expected a record of {self.width} values, got {len(record)}')
+        slot = self.head
+        offset = slot * self.width
+        self.data[offset:offset + self.width] = record
+        self.head = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        if not self.synced:
+            self._save()
+            return
+        try:
+            with open(self.path, 'r+b') as fh:
+                fh.seek(_HEADER.size + offset * _ITEM_SIZE)
+                record.tofile(fh)
+                self._write_header(fh)
+        except FileNotFoundError:
+            self._save()
+        except OSError:
+            pass
+
+    def extend(self, records: Iterable[Iterable[float]]=None) -> None:
+        """
+        Add several records, oldest first, opening the file once for all of them rather than once per record.
+        """
+        records = [array('d', record) for record in records]
+        for record in records:
+            if len(record) != self.width:
+                raise ValueError(f'Expected a record of {self.width} values, got {len(record)}')
+        if not records:
+            return
+        # Only the newest capacity records survive, so the rest needn't be written at all
+        records = records[-self.capacity:]
+        first = self.head
+        for record in records:
+            offset = self.head * self.width
+            self.data[offset:offset + self.width] = record
+            self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + len(records), self.capacity)
+        if not self.synced:
+            self._save()
+            return
+        try:
+            with open(self.path, 'r+b') as fh:
+                # The records fill consecutive slots, so they go out in at most two runs: up to the end of the file and from its start
+                run = min(len(records), self.capacity - first)
+                fh.seek(_HEADER.size + first * self.width * _ITEM_SIZE)
+                self.data[first * self.width:(first + run) * self.width].tofile(fh)
+                if run < len(records):
+                    fh.seek(_HEADER.size)
+                    self.data[:(len(records) - run) * self.width].tofile(fh)
+                self._write_header(fh)
+        except FileNotFoundError:
+            self._save()
+        except OSError:
+            pass
+
+    def _save(self) -> None:
+        """
+        Write out the whole buffer. Only needed the first time, after that append() and extend() patch it in place.
+        """
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as fh:
+                self._write_header(fh)
+                self.data.tofile(fh)
+            os.replace(temp_path, self.path)
+            self.synced = True
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Tuple[float, ...]]:
+        """
+        Yield records from oldest to newest.
+        """
+        return self._records(reverse=False)
+
+    def __reversed__(self) -> Iterator[Tuple[float, ...]]:
+        """
+        Yield records from newest to oldest.
+        """
+        return self._records(reverse=True)
+
+    def last(self) -> Union[Tuple[float, ...], None]:
+        """
+        Return the newest record, or None if there isn't one.
+        """
+        return next(self._records(reverse=True), None)
+
+    def columns(self) -> List[array]:
+        """
+        Return each field of the stored records as an array, oldest first. Columns are cut out of the
+        buffer with strided slices rather than record by record.
+        """
+        start = (self.head - self.count) % self.capacity * self.width
+        end = start + self.count * self.width
+        if end <= len(self.data):
+            ordered = self.data[start:end]
+        else:
+            ordered = self.data[start:] + self.data[:end - len(self.data)]
+        return [ordered[column::self.width] for column in range(self.width)]
+
+    def _records(self, reverse: bool=False) -> Iterator[Tuple[float, ...]]:
+        start = (self.head - self.count) % self.capacity
+        order = range(self.count - 1, -1, -1) if reverse else range(self.count)
+        for i in order:
+            offset = ((start + i) % self.capacity) * self.width
+            yield tuple(self.data[offset:offset + self.width])
+
+def percentile(values: List[float]=None, percent: float=None) -> float:
+    """
+    Return the given percentile of the values using the nearest-rank method.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def moving_average(values: array=None, window: int=None) -> array:
+    """
+    Return the mean of every window consecutive values, worked out from prefix sums so each one costs the same
+    however long the window is. The result is window - 1 shorter than values.
+    """
+    if window <= 0 or len(values) < window:
+        return array('d')
+    sums = array('d', accumulate(values, initial=0.0))
+    return array('d', [(high - low) / window for high, low in zip(sums[window:], sums)])
+
+def summarize(records: Iterable[Tuple[float, ...]]=None, now: float=None, columns: Tuple[int, ...]=(1,), windows: Tuple[int, ...]=(60, 300, 900)) -> List[HistoryStats]:
+    """
+    Compute the average of each column over each window (in seconds), plus the p95, peak, and values
+    over the longest window, in one pass over records given newest first. The first column of every
+    record is its timestamp.
+    """
+    longest = max(windows)
+    sums = [{window: 0.0 for window in windows} for _ in columns]
+    counts = {window: 0 for window in windows}
+    values = [[] for _ in columns]
+    for record in records:
+        age = now - record[0]
+        if age > longest:
+            break
+        for window in windows:
+            if age <= window:
+                counts[window] += 1
+        for i, column in enumerate(columns):
+            value = record[column]
+            values[i].append(value)
+            for window in windows:
+                if age <= window:
+                    sums[i][window] += value
+    return [
+        HistoryStats(
+            averages = {window: sums[i][window] / counts[window] if counts[window] else 0.0 for window in windows},
+            p95 = percentile(values[i], 95),
+            peak = max(values[i], default=0.0),
+            values = values[i][::-1],
+        )
+        for i in range(len(columns))
+    ]
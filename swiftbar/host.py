@@ -0,0 +1,256 @@
+# A resident plugin host. The host keeps the swiftbar package and each plugin's imports loaded and
+# forks a child to run a plugin's main() whenever a plugin script asks it to. Plugin scripts call
+# forward() before importing anything else; if the host isn't running they carry on in-process.
+#
+# Start it with: python3 -m swiftbar.host
+
+# This module is imported by every hosted plugin before anything else, so it sticks to the cheapest
+# standard library imports and avoids typing.
+import json
+import os
+import signal
+import socket
+import sys
+
+# How long to wait for the host to start answering when the plugin's file name carries no refresh interval
+REPLY_TIMEOUT = 5.0
+# Units SwiftBar accepts in a plugin's file name, as in name.5s.py; ms has to be tried before s
+INTERVAL_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Separates the plugin's output from the exit status the child sends after it; menus never contain a NUL
+STATUS_MARKER = b'\0'
+
+def get_socket_path() -> str:
+    """
+    Return the path to the host's Unix socket, which lives in the SwiftBar configuration directory.
+    """
+    return os.path.join(os.path.expanduser('~'), '.config', 'SwiftBar', 'swiftbar-host.sock')
+
+def get_refresh_interval(path: str=None) -> float:
+    """
+    Return the refresh interval in seconds that SwiftBar reads from a plugin's file name, or None if it has none.
+    """
+    parts = os.path.basename(path).split('.')
+    if len(parts) < 3:
+        return None
+    for unit, seconds in INTERVAL_UNITS.items():
+        if parts[-2].endswith(unit) and parts[-2][:-len(unit)].isdigit():
+            return int(parts[-2][:-len(unit)]) * seconds
+    return None
+
+def forward(socket_path: str=None, timeout: float=0.5, reply_timeout: float=None) -> None:
+    """
+    Ask the host to run this plugin and relay its output. Exits the process if the host handled
+    the request, otherwise returns so the plugin can run in-process. That includes a host that
+    says nothing for reply_timeout seconds, which defaults to the plugin's refresh interval.
+    """
+    request = {
+        'plugin': os.path.abspath(sys.argv[0]),
+        'argv': sys.argv[1:],
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+        'ppid': os.getppid(),
+    }
+    if reply_timeout is None:
+        reply_timeout = get_refresh_interval(request['plugin']) or REPLY_TIMEOUT
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        conn.connect(socket_path or get_socket_path())
+        conn.settimeout(reply_timeout)
+        conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        conn.shutdown(socket.SHUT_WR)
+    except OSError:
+        return
+
+    received = 0
+    status = None
+    with conn:
+        while True:
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                break
+            if not chunk:
+                break
+            if received == 0:
+                # A streamable plugin only writes when its menu changes, so once the host has answered
+                # a quiet socket is no sign of trouble
+                conn.settimeout(None)
+            received += len(chunk)
+            if status is None and STATUS_MARKER in chunk:
+                chunk, status = chunk.split(STATUS_MARKER, 1)
+            elif status is not None:
+                status, chunk = status + chunk, b''
+            if chunk:
+                # Flush as we go so streamable plugins get their frames through
+                sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+    # If the host died or stalled before producing anything, run the plugin ourselves. Closing the
+    # socket has already cut off the child it forked, should that still be running.
+    if received == 0:
+        return
+    # Exit as the plugin did; a child that never sent its status was killed or crashed
+    try:
+        os._exit(int(status))
+    except (TypeError, ValueError):
+        os._exit(1)
+
+class PluginHost:
+    def __init__(self, socket_path: str=None) -> None:
+        self.socket_path = socket_path or get_socket_path()
+        self.server = None
+        self.namespaces = {}
+
+    def _warm_up(self) -> None:
+        """
+        Import the swiftbar package and the modules most plugins use so forked children get them for free.
+        """
+        import importlib
+        for module in ['argparse', 'datetime', 'dateutil.parser', 'swiftbar.plugin', 'swiftbar.request', 'swiftbar.util']:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    def _load_plugin(self, path: str=None) -> dict:
+        """
+        Execute a plugin's module-level code once, keeping its namespace until the file changes.
+        """
+        mtime = os.stat(path).st_mtime
+        cached = self.namespaces.get(path)
+        if cached and cached['__swiftbar_mtime__'] == mtime:
+            return cached
+        with open(path, 'r') as fh:
+            code = compile(fh.read(), path, 'exec')
+        namespace = {'__name__': '__swiftbar_host__', '__file__': path, '__swiftbar_mtime__': mtime}
+        plugin_dir = os.path.dirname(os.path.realpath(path))
+        if plugin_dir not in sys.path:
+            sys.path.insert(0, plugin_dir)
+        exec(code, namespace)
+        self.namespaces[path] = namespace
+        return namespace
+
+    def _run_plugin(self, conn: socket.socket=None, request: dict=None, namespace: dict=None) -> None:
+        """
+        Runs in the forked child. Recreate the plugin's environment, point stdout at the socket, and call main().
+        """
+        from swiftbar import plugin
+        import traceback
+
+        returncode = 0
+        try:
+            self.server.close()
+            os.dup2(conn.fileno(), sys.stdout.fileno())
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            sys.argv = [request['plugin']] + request['argv']
+            plugin.set_invoker_pid(request['ppid'])
+            namespace['main']()
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            try:
+                sys.stdout.flush()
+                os.write(sys.stdout.fileno(), STATUS_MARKER + str(returncode).encode('ascii'))
+            except (OSError, ValueError):
+                pass
+            os._exit(returncode)
+
+    def _handle(self, conn: socket.socket=None) -> None:
+        """
+        Read a request from a plugin client and fork a child to serve it.
+        """
+        with conn.makefile('rb') as fh:
+            request = json.loads(fh.readline())
+
+        namespace = self._load_plugin(request['plugin'])
+        if 'main' not in namespace:
+            raise ValueError(f'{request["plugin"]} has no main() function')
+
+        # Resolve the invoker once in the parent so children don't have to fork ps
+        from swiftbar import plugin
+        plugin.get_invoker(request['ppid'])
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() == 0:
+            self._run_plugin(conn, request, namespace)
+
+    def _reap(self) -> None:
+        """
+        Collect any children that have finished.
+        """
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0] != 0:
+                pass
+        except ChildProcessError:
+            pass
+
+    def _claim_socket(self) -> bool:
+        """
+        Remove a stale socket left behind by a dead host. Returns False if another host is listening.
+        """
+        if not os.path.exists(self.socket_path):
+            return True
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+            return False
+        except OSError:
+            os.unlink(self.socket_path)
+            return True
+        finally:
+            probe.close()
+
+    def serve(self) -> None:
+        """
+        Listen on the Unix socket and serve plugin requests until interrupted.
+        """
+        if not self._claim_socket():
+            print(f'A plugin host is already listening on {self.socket_path}', file=sys.stderr)
+            sys.exit(1)
+
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self._warm_up()
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)
+        try:
+            self.server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self.server.listen(16)
+        try:
+            while True:
+                try:
+                    conn, _ = self.server.accept()
+                except InterruptedError:
+                    continue
+                with conn:
+                    try:
+                        self._handle(conn)
+                    except Exception:
+                        import traceback
+                        traceback.print_exc()
+                self._reap()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+def main(args: list=None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description='Keep the swiftbar package loaded and run plugins on request.')
+    parser.add_argument('--socket', help='Path to the Unix socket', required=False, default=get_socket_path())
+    parsed = parser.parse_args(args)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    PluginHost(socket_path=parsed.socket).serve()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
+import hashlib
+import http.client
+import json
+import os
+import time
+
+# Heuristic freshness for responses with Last-Modified but no explicit lifetime is capped at this
+MAX_HEURISTIC_LIFETIME = 86400
+
+class CacheEntry(NamedTuple):
+    url: str
+    status: int
+    reason: str
+    headers: List[Tuple[str, str]]
+    vary: Dict[str, Union[str, None]]
+    stored: float
+    fresh_until: float
+    body: bytes
+
+    @property
+    def etag(self) -> Union[str, None]:
+        return _get_header(self.headers, 'ETag')
+
+    @property
+    def last_modified(self) -> Union[str, None]:
+        return _get_header(self.headers, 'Last-Modified')
+
+    def is_fresh(self, now: float=None) -> bool:
+        return (now or time.time()) < self.fresh_until
+
+class CachedResponse:
+    """
+    Stands in for http.client.HTTPResponse when a response comes from the cache.
+    """
+    def __init__(self, entry: CacheEntry=None) -> None:
+        self.status = entry.status
+        self.reason = entry.reason
+        self.headers = http.client.HTTPMessage()
+        for name, value in entry.headers:
+            self.headers[name] = value
+        self.msg = self.headers
+        self.will_close = False
+        self.from_cache = True
+
+    def getheader(self, name: str=None, default: Any=None) -> Any:
+        return self.headers.get(name, default)
+
+    def getheaders(self) -> List[Tuple[str, str]]:
+        return list(self.headers.items())
+
+def _get_header(headers: List[Tuple[str, str]]=None, name: str=None) -> Union[str, None]:
+    name = name.lower()
+    return next((value for key, value in headers if key.lower() == name), None)
+
+def _strip_body_headers(headers: List[Tuple[str, str]]=None) -> List[Tuple[str, str]]:
+    # Bodies are stored decoded, so the headers describing how they were sent no longer apply
+    return [(name, value) for name, value in headers if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+
+def parse_cache_control(value: str=None) -> Dict[str, Union[str, None]]:
+    """
+    Parse a Cache-Control header into a dict of lowercase directive -> argument (or None).
+    """
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+def _parse_date(value: str=None) -> Union[float, None]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def freshness_lifetime(headers: List[Tuple[str, str]]=None) -> Union[float, None]:
+    """
+    Work out how many seconds a response may be served without revalidation, following RFC 9111. Returns
+    None if it must not be stored at all.
+    """
+    directives = parse_cache_control(_get_header(headers, 'Cache-Control'))
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+    date = _parse_date(_get_header(headers, 'Date')) or time.time()
+    # This is a private cache, so s-maxage doesn't apply
+    if 'max-age' in directives:
+        try:
+            lifetime = float(directives['max-age'])
+        except (TypeError, ValueError):
+            lifetime = 0.0
+    else:
+        expires = _get_header(headers, 'Expires')
+        last_modified = _parse_date(_get_header(headers, 'Last-Modified'))
+        if expires is not None:
+            expires = _parse_date(expires)
+            lifetime = expires - date if expires else 0.0
+        elif last_modified:
+            # The usual heuristic: a tenth of the time since the resource last changed
+            lifetime = min((date - last_modified) / 10, MAX_HEURISTIC_LIFETIME)
+        else:
+            lifetime = 0.0
+    try:
+        age = float(_get_header(headers, 'Age') or 0)
+    except ValueError:
+        age = 0.0
+    return max(0.0, lifetime - age)
+
+class HttpCache:
+    """
+    A private HTTP cache kept in a directory, one file per URL. Fresh entries are served without touching
+    the network, stale ones are revalidated with If-None-Match/If-Modified-Since, and the least recently
+    used entries are removed once the directory grows past max_size bytes.
+    """
+    def __init__(self, path: str=None, max_size: int=10 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stale = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_file(self, url: str=None) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + '.cache')
+
+    def get(self, url: str=None, request_headers: Dict[str, Any]=None) -> Union[CacheEntry, None]:
+        """
+        Return the entry for a URL, fresh or not, if the request would get the same response.
+        """
+        path = self._entry_file(url)
+        try:
+            with open(path, 'rb') as fh:
+                meta = json.loads(fh.readline())
+                body = fh.read()
+            entry = CacheEntry(
+                url = meta['url'],
+                status = meta['status'],
+                reason = meta['reason'],
+                headers = [tuple(header) for header in meta['headers']],
+                vary = meta['vary'],
+                stored = meta['stored'],
+                fresh_until = meta['fresh_until'],
+                body = body,
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if entry.url != url or entry.vary != _vary_values(entry.headers, request_headers):
+            return None
+        # Bump the modification time so eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def conditional_headers(self, entry: CacheEntry=None) -> Dict[str, str]:
+        """
+        Return the headers that turn a request into a revalidation of the entry.
+        """
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url: str=None, request_headers: Dict[str, Any]=None, response: Any=None, body: bytes=None) -> None:
+        """
+        Save a response if HTTP allows it and it would ever be useful: it's fresh for a while or can be revalidated.
+        """
+        headers = list(response.getheaders())
+        if response.status != 200 or _get_header(headers, 'Set-Cookie') is not None or (_get_header(headers, 'Vary') or '').strip() == '*':
+            return
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None or (lifetime == 0 and not _get_header(headers, 'ETag') and not _get_header(headers, 'Last-Modified')):
+            return
+        if len(body) > self.max_size:
+            return
+        now = time.time()
+        self._write(CacheEntry(
+            url = url,
+            status = response.status,
+            reason = response.reason,
+            headers = _strip_body_headers(headers),
+            vary = _vary_values(headers, request_headers),
+            stored = now,
+            fresh_until = now + lifetime,
+            body = body,
+        ))
+        self._evict()
+
+    def update(self, entry: CacheEntry=None, response: Any=None) -> CacheEntry:
+        """
+        Fold a 304 Not Modified response into the entry it revalidated and save it.
+        """
+        replaced = {name.lower() for name, _ in response.getheaders()}
+        headers = _strip_body_headers([(name, value) for name, value in entry.headers if name.lower() not in replaced] + list(response.getheaders()))
+        lifetime = freshness_lifetime(headers) or 0.0
+        now = time.time()
+        entry = entry._replace(headers=headers, stored=now, fresh_until=now + lifetime)
+        self._write(entry)
+        return entry
+
+    def _write(self, entry: CacheEntry=None) -> None:
+        path = self._entry_file(entry.url)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        meta = entry._asdict()
+        del meta['body']
+        try:
+            with open(temp_path, 'wb') as fh:
+                fh.write(json.dumps(meta).encode('utf-8') + b'\n')
+                fh.write(entry.body)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in max_size.
+        """
+        entries = []
+        try:
+            with os.scandir(self.path) as it:
+                for dirent in it:
+                    if dirent.name.endswith('.cache'):
+                        stat = dirent.stat()
+                        entries.append((stat.st_mtime, stat.st_size, dirent.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+def _vary_values(headers: List[Tuple[str, str]]=None, request_headers: Dict[str, Any]=None) -> Dict[str, Union[str, None]]:
+    """
+    Pick the request headers named by the response's Vary header; a cached response only matches requests that agree on them.
+    """
+    lowered = {name.lower(): str(value) for name, value in (request_headers or {}).items()}
+    names = [name.strip().lower() for name in (_get_header(headers, 'Vary') or '').split(',') if name.strip()]
+    return {name: lowered.get(name) for name in names}
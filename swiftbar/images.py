@@ -1,3 +1,47 @@
+from typing import List
+import base64
+import struct
+import zlib
+
+def _png(width: int=None, height: int=None, rows: List[bytes]=None) -> str:
+    """
+    Encode rows of 8-bit gray+alpha pixels as a PNG data URL.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    # Each row starts with filter type 0 (none)
+    raw = b''.join(b'\x00' + row for row in rows)
+    png = b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 4, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw, 9)),
+        chunk(b'IEND', b''),
+    ])
+    return 'data:image/png;base64,' + base64.b64encode(png).decode()
+
+def sparkline(values: List[float]=None, width: int=60, height: int=16) -> str:
+    """
+    Draw the values, oldest first, as a bar chart scaled to the largest value. When there are more
+    values than columns, each column shows the average of its share of the values.
+    """
+    values = values or []
+    columns = []
+    if len(values) > width:
+        for column in range(width):
+            bucket = values[column * len(values) // width:(column + 1) * len(values) // width]
+            columns.append(sum(bucket) / len(bucket))
+    else:
+        columns = [0.0] * (width - len(values)) + list(values)
+    peak = max(columns, default=0.0)
+    heights = [max(1, round(value / peak * height)) if peak > 0 and value > 0 else 0 for value in columns]
+
+    images = []
+    for gray in (0, 255):
+        pixel, blank = bytes([gray, 255]), bytes([gray, 0])
+        rows = [b''.join(pixel if bar >= height - y else blank for bar in heights) for y in range(height)]
+        images.append(_png(width, height, rows))
+    return ','.join(images)
+
 # 20x20 seems to be the best
 def memory_icon() -> str:
     dark = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAABQAAAAUCAYAAACNiR0NAAAAAXNSR0IArs4c6QAAAaxJREFUOE+tlCFPA0EQhb/ZXgjBo0tAEbA1qHMYfkSx1OIQvaL4A6D5HagKDKkiaetIigRNCCHHDTt32/Y4yjUlnWTF3W7evDdvZoQ1h6wZj2WAMbgYtq7zxO69Q5b1ATsLoxbQ4ZJMsu6GcvCJJZehQ3sZJKsA7oG7AN0F3QGawCAAtIBnhAnKk+d8mX+XYhFDk9NCGKBVHoKgqHFVWircoxwvAxxDDnVQa5gwNuzquxLDKIY0RugIvKhy6IsfhzPHjuiT0hcYKWw7uMkKk3KjypKt0N0gylgaw8Rr7Fak9/L/MBbYN/lOmRlVBjQD7NwCb5AzzJMAbWgAX3Y3BRwBW96UU9icwMekyvA3oCPxdTKG7aD5FlwPsiRIDoAYWBXQJaDdwg/mkguGIYRSH9qb/XAxZV2qYRTFpKmZcObPa5D8pynACGEbdTcwn55FfbiutpnpegjsBtNsSvB+Klx8cZSWII+KHtU2dgNOvuA8fyTsoNIE/Tl6hQF+pLkC7pZNSunejMrMFOtJIzwstc3q24aI2E+FGVOsL+iEifjf+qqd5T8uly3YlTG/ARZKixVnlGH6AAAAAElFTkSuQmCC'
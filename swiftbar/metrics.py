@@ -0,0 +1,881 @@
+from swiftbar import util
+from swiftbar.util import Mountpoint
+from typing import Dict, List, NamedTuple, Type, Union
+import os
+import re
+import sys
+import time
+
+class SystemMemory(NamedTuple):
+    total: int
+    available: int
+    percent: float
+    used: int
+    free: int
+    active: int
+    inactive: int
+    wired: int
+    speculative: int
+
+class SwapUsage(NamedTuple):
+    total: int
+    free: int
+    used: int
+
+class IoCounters(NamedTuple):
+    interface: str
+    bytes_sent: int
+    bytes_recv: int
+    packets_sent: int
+    packets_recv: int
+    errin: int
+    errout: int
+    collisions: int
+
+class CpuTimes(NamedTuple):
+    cpu: int
+    user: float
+    nice: float
+    system: float
+    idle: float
+
+def make_system_memory(total: int=0, free: int=0, active: int=0, inactive: int=0, wired: int=0, speculative: int=0) -> SystemMemory:
+    """
+    Build a SystemMemory from raw byte counts the way psutil does on macOS. free should still include speculative pages.
+    """
+    # https://github.com/giampaolo/psutil/blob/master/psutil/_psosx.py
+    free -= speculative
+    available = inactive + free
+    used = active + wired
+    try:
+        percent = round((float(used) / total) * 100, 1)
+    except ZeroDivisionError:
+        percent = 0.0
+    return SystemMemory(
+        total=total,
+        available=available,
+        percent=percent,
+        used=used,
+        free=free,
+        active=active,
+        inactive=inactive,
+        wired=wired,
+        speculative=speculative,
+    )
+
+def parse_memory_pressure(output: str=None) -> Union[SystemMemory, None]:
+    """
+    Parse the output of memory_pressure into a SystemMemory.
+    """
+    match = re.search(r'page size of\s+(\d+)', output)
+    if not match:
+        return None
+    pagesize = int(match.group(1))
+
+    memory_pressure_map = {
+        'total': r'(\d+) pages with a page size of',
+        'free': r'Pages free:\s+(\d+)',
+        'active': r'Pages active:\s+(\d+)',
+        'inactive': r'Pages inactive:\s+(\d+)',
+        'wired': r'Pages wired down:\s+(\d+)',
+        'speculative': r'Pages speculative:\s+(\d+)',
+    }
+    values = {}
+    for key, pattern in memory_pressure_map.items():
+        match = re.search(pattern, output)
+        if not match:
+            return None
+        values[key] = int(match.group(1)) * pagesize
+    return make_system_memory(**values)
+
+def parse_swapusage(value: str=None) -> Union[SwapUsage, None]:
+    """
+    Parse the vm.swapusage sysctl string into a SwapUsage.
+    """
+    match = re.search(r'^total = (\d+\.\d+)M\s+used = (\d+\.\d+)M\s+free = (\d+\.\d+)M\s+', value or '')
+    if match:
+        total = int(float(match.group(1))) * 1024 * 1024
+        used = int(float(match.group(2))) * 1024 * 1024
+        free = int(float(match.group(3))) * 1024 * 1024
+        return SwapUsage(total=total, free=free, used=used)
+    return None
+
+def parse_netstat(output: str=None) -> Dict[str, IoCounters]:
+    """
+    Parse the output of "netstat -bi" (optionally with -d and -I) into a dict of interface -> IoCounters. Only the
+    <Link#N> rows carry the full counters. The columns are located from the right because the address column is
+    blank for interfaces without a hardware address.
+    """
+    lines = output.splitlines()
+    if not lines:
+        return {}
+    header = lines[0].split()
+    if 'Ipkts' not in header:
+        return {}
+    # Offsets from the end of the row
+    columns = {name: index - len(header) for index, name in enumerate(header)}
+
+    counters: Dict[str, IoCounters] = {}
+    for line in lines[1:]:
+        bits = line.split()
+        if len(bits) < 3 or not bits[2].startswith('<Link#'):
+            continue
+        # netstat marks interfaces that are down with a trailing "*"
+        name = bits[0].rstrip('*')
+        if name in counters:
+            continue
+        try:
+            counters[name] = IoCounters(
+                interface    = name,
+                bytes_sent   = int(bits[columns['Obytes']]),
+                bytes_recv   = int(bits[columns['Ibytes']]),
+                packets_sent = int(bits[columns['Opkts']]),
+                packets_recv = int(bits[columns['Ipkts']]),
+                errin        = int(bits[columns['Ierrs']]),
+                errout       = int(bits[columns['Oerrs']]),
+                collisions   = int(bits[columns['Coll']]),
+            )
+        except (IndexError, KeyError, ValueError):
+            continue
+    return counters
+
+def cpu_times_percent(previous: List[CpuTimes]=None, current: List[CpuTimes]=None) -> List[CpuTimes]:
+    """
+    Turn two cumulative per-CPU samples into per-CPU percentages over the time between them.
+    """
+    percentages: List[CpuTimes] = []
+    for before, after in zip(previous, current):
+        deltas = [max(getattr(after, field) - getattr(before, field), 0) for field in ('user', 'nice', 'system', 'idle')]
+        total = sum(deltas)
+        if total <= 0:
+            percentages.append(CpuTimes(cpu=after.cpu, user=0.0, nice=0.0, system=0.0, idle=100.0))
+            continue
+        user, nice, system, idle = [round(delta / total * 100, 1) for delta in deltas]
+        percentages.append(CpuTimes(cpu=after.cpu, user=user, nice=nice, system=system, idle=idle))
+    return percentages
+
+def counter_delta(before: int=0, after: int=0) -> int:
+    """
+    Return how much a cumulative counter grew. If it went backwards, either a 32-bit counter wrapped (it was
+    high and is now low) or the interface was reset, in which case everything it has counted since is new.
+    """
+    if after >= before:
+        return after - before
+    if before < 2 ** 32 and before - after > 2 ** 31:
+        return after + 2 ** 32 - before
+    return after
+
+def io_counters_rate(before: IoCounters=None, after: IoCounters=None, elapsed: float=1.0) -> IoCounters:
+    """
+    Turn two IoCounters samples taken elapsed seconds apart into per-second rates.
+    """
+    elapsed = max(elapsed, 0.001)
+    return IoCounters(
+        interface    = after.interface,
+        bytes_sent   = int(counter_delta(before.bytes_sent, after.bytes_sent) / elapsed),
+        bytes_recv   = int(counter_delta(before.bytes_recv, after.bytes_recv) / elapsed),
+        packets_sent = int(counter_delta(before.packets_sent, after.packets_sent) / elapsed),
+        packets_recv = int(counter_delta(before.packets_recv, after.packets_recv) / elapsed),
+        errin        = int(counter_delta(before.errin, after.errin) / elapsed),
+        errout       = int(counter_delta(before.errout, after.errout) / elapsed),
+        collisions   = int(counter_delta(before.collisions, after.collisions) / elapsed),
+    )
+
+def parse_boottime(value: str=None) -> Union[int, None]:
+    """
+    Pull the seconds out of the kern.boottime sysctl string.
+    """
+    match = re.search(r'sec = ([0-9]{10,13})', value or '')
+    return int(match.group(1)) if match else None
+
+class MetricsBackend:
+    """
+    The interface every metrics backend implements. Methods return None, or an empty container, when
+    a value isn't available.
+    """
+    name = 'base'
+
+    def sysctls(self, keys: List[str]=None) -> Dict[str, Union[int, str, None]]:
+        """
+        Return a dict of sysctl key -> value for scalar (integer or string) keys.
+        """
+        raise NotImplementedError
+
+    def virtual_memory(self) -> Union[SystemMemory, None]:
+        """
+        Return system memory usage.
+        """
+        raise NotImplementedError
+
+    def swap_usage(self) -> Union[SwapUsage, None]:
+        """
+        Return swap usage.
+        """
+        raise NotImplementedError
+
+    def net_io_counters(self, interface: str=None) -> Dict[str, IoCounters]:
+        """
+        Return a dict of interface -> IoCounters, for every interface or just the one given.
+        """
+        raise NotImplementedError
+
+    def partitions(self) -> List[Mountpoint]:
+        """
+        Return the mounted /dev/disk partitions.
+        """
+        raise NotImplementedError
+
+    def boot_time(self) -> Union[int, None]:
+        """
+        Return the boot time as a UNIX timestamp.
+        """
+        raise NotImplementedError
+
+    def cpu_times(self) -> List[CpuTimes]:
+        """
+        Return the cumulative seconds each CPU has spent in each state. The default uses psutil when it's installed.
+        """
+        try:
+            import psutil
+        except ImportError:
+            return []
+        return [CpuTimes(cpu=i, user=times.user, nice=times.nice, system=times.system, idle=times.idle) for i, times in enumerate(psutil.cpu_times(percpu=True))]
+
+class SubprocessBackend(MetricsBackend):
+    """
+    Run the command line tools and parse their output. Works anywhere the tools exist.
+    """
+    name = 'subprocess'
+
+    def sysctls(self, keys: List[str]=None) -> Dict[str, Union[int, str, None]]:
+        return util.get_sysctls(keys)
+
+    def virtual_memory(self) -> Union[SystemMemory, None]:
+        returncode, stdout, _ = util.execute_command('memory_pressure')
+        return parse_memory_pressure(stdout) if returncode == 0 else None
+
+    def swap_usage(self) -> Union[SwapUsage, None]:
+        return parse_swapusage(util.get_sysctl('vm.swapusage'))
+
+    def net_io_counters(self, interface: str=None) -> Dict[str, IoCounters]:
+        command = ['netstat', '-bid'] + (['-I', interface] if interface else [])
+        returncode, stdout, _ = util.execute_command(command)
+        return parse_netstat(stdout) if returncode == 0 else {}
+
+    def partitions(self) -> List[Mountpoint]:
+        return util.find_partitions()
+
+    def boot_time(self) -> Union[int, None]:
+        return parse_boottime(util.get_sysctl('kern.boottime'))
+
+class ProcBackend(MetricsBackend):
+    """
+    Read Linux's /proc, so the plugins can run and be profiled on Linux hosts.
+    """
+    name = 'proc'
+
+    def __init__(self, root: str='/proc') -> None:
+        self.root = root
+
+    def _read(self, *path: str) -> Union[str, None]:
+        """
+        Return the contents of a file under the /proc root, or None if it can't be read.
+        """
+        try:
+            with open(os.path.join(self.root, *path), 'r') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _meminfo(self) -> Dict[str, int]:
+        """
+        Parse /proc/meminfo into a dict of field -> bytes.
+        """
+        values: Dict[str, int] = {}
+        for line in (self._read('meminfo') or '').splitlines():
+            match = re.match(r'^(\S+):\s+(\d+)(?:\s+kB)?$', line)
+            if match:
+                values[match.group(1)] = int(match.group(2)) * (1024 if line.endswith('kB') else 1)
+        return values
+
+    def sysctls(self, keys: List[str]=None) -> Dict[str, Union[int, str, None]]:
+        values: Dict[str, Union[int, str, None]] = {}
+        for key in keys:
+            # The macOS keys the plugins ask for have equivalents elsewhere in /proc
+            if key == 'hw.memsize':
+                values[key] = self._meminfo().get('MemTotal')
+            elif key == 'hw.ncpu':
+                values[key] = len(self.cpu_times()) or None
+            elif key == 'machdep.cpu.brand_string':
+                match = re.search(r'^model name\s*:\s*(.*)$', self._read('cpuinfo') or '', re.MULTILINE)
+                values[key] = match.group(1).strip() if match else None
+            else:
+                value = self._read('sys', *key.split('.'))
+                values[key] = util.coerce_sysctl_value(value.strip()) if value is not None else None
+        return values
+
+    def virtual_memory(self) -> Union[SystemMemory, None]:
+        meminfo = self._meminfo()
+        if 'MemTotal' not in meminfo:
+            return None
+        total = meminfo['MemTotal']
+        free = meminfo.get('MemFree', 0)
+        cached = meminfo.get('Cached', 0) + meminfo.get('SReclaimable', 0)
+        available = meminfo.get('MemAvailable', free + cached)
+        # Same definitions as psutil on Linux; there is no speculative memory and "wired" is the unevictable pages
+        used = total - free - meminfo.get('Buffers', 0) - cached
+        if used < 0:
+            used = total - free
+        return SystemMemory(
+            total=total,
+            available=available,
+            percent=round((total - available) / total * 100, 1) if total else 0.0,
+            used=used,
+            free=free,
+            active=meminfo.get('Active', 0),
+            inactive=meminfo.get('Inactive', 0),
+            wired=meminfo.get('Unevictable', 0),
+            speculative=0,
+        )
+
+    def swap_usage(self) -> Union[SwapUsage, None]:
+        output = self._read('swaps')
+        if output is None:
+            return None
+        total, used = 0, 0
+        for line in output.splitlines()[1:]:
+            bits = line.split()
+            if len(bits) >= 4:
+                total += int(bits[2]) * 1024
+                used += int(bits[3]) * 1024
+        return SwapUsage(total=total, free=total - used, used=used)
+
+    def net_io_counters(self, interface: str=None) -> Dict[str, IoCounters]:
+        counters: Dict[str, IoCounters] = {}
+        for line in (self._read('net', 'dev') or '').splitlines()[2:]:
+            name, _, data = line.partition(':')
+            name = name.strip()
+            bits = data.split()
+            if len(bits) < 16 or (interface and name != interface):
+                continue
+            counters[name] = IoCounters(
+                interface    = name,
+                bytes_sent   = int(bits[8]),
+                bytes_recv   = int(bits[0]),
+                packets_sent = int(bits[9]),
+                packets_recv = int(bits[1]),
+                errin        = int(bits[2]),
+                errout       = int(bits[10]),
+                collisions   = int(bits[13]),
+            )
+        return counters
+
+    def partitions(self) -> List[Mountpoint]:
+        partitions: List[Mountpoint] = []
+        seen = set()
+        for line in (self._read('self', 'mountinfo') or '').splitlines():
+            # id parent major:minor root mountpoint options [optional fields...] - fstype source super-options
+            fields, _, tail = line.partition(' - ')
+            fields, tail = fields.split(), tail.split()
+            if len(fields) < 6 or len(tail) < 2 or not tail[1].startswith('/dev/'):
+                continue
+            # Spaces and other odd characters in paths are octal escaped
+            mountpoint = re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), fields[4])
+            if mountpoint in seen:
+                continue
+            seen.add(mountpoint)
+            partitions.append(Mountpoint(device=tail[1], mountpoint=mountpoint, fstype=tail[0], opts=fields[5].split(',')))
+        return partitions
+
+    def boot_time(self) -> Union[int, None]:
+        output = self._read('uptime')
+        if not output:
+            return None
+        return int(time.time() - float(output.split()[0]))
+
+    def cpu_times(self) -> List[CpuTimes]:
+        ticks = os.sysconf('SC_CLK_TCK')
+        times: List[CpuTimes] = []
+        for line in (self._read('stat') or '').splitlines():
+            match = re.match(r'^cpu(\d+)\s+(.*)$', line)
+            if not match:
+                continue
+            # user nice system idle iowait irq softirq steal ...
+            values = [int(value) / ticks for value in match.group(2).split()] + [0.0] * 8
+            times.append(CpuTimes(
+                cpu=int(match.group(1)),
+                user=values[0],
+                nice=values[1],
+                system=values[2] + values[5] + values[6] + values[7],
+                idle=values[3] + values[4],
+            ))
+        return times
+
+class NativeBackend(MetricsBackend):
+    """
+    Ask the macOS kernel directly through ctypes, without forking anything. Raises OSError from
+    the constructor on other platforms.
+    """
+    name = 'native'
+
+    # sys/sysctl.h
+    CTLTYPE = 0xf
+    CTLTYPE_INT = 2
+    CTLTYPE_STRING = 3
+    CTLTYPE_QUAD = 4
+    # mach/host_info.h, mach/processor_info.h
+    HOST_VM_INFO64 = 4
+    PROCESSOR_CPU_LOAD_INFO = 2
+    CPU_STATE_USER, CPU_STATE_SYSTEM, CPU_STATE_IDLE, CPU_STATE_NICE = 0, 1, 2, 3
+    # sys/socket.h
+    AF_LINK = 18
+    # sys/mount.h
+    MNT_NOWAIT = 2
+    MOUNT_FLAGS = [
+        (0x00000001, 'read-only'),
+        (0x00000002, 'synchronous'),
+        (0x00000004, 'noexec'),
+        (0x00000008, 'nosuid'),
+        (0x00000010, 'nodev'),
+        (0x00000020, 'union'),
+        (0x00000040, 'asynchronous'),
+        (0x00000080, 'protect'),
+        (0x00000100, 'NFS exported'),
+        (0x00000400, 'quarantine'),
+        (0x00001000, 'local'),
+        (0x00002000, 'with quotas'),
+        (0x00100000, 'nobrowse'),
+        (0x00200000, 'noowners'),
+        (0x00400000, 'automounted'),
+        (0x00800000, 'journaled'),
+        (0x02000000, 'defwrite'),
+        (0x10000000, 'noatime'),
+        (0x40000000, 'snapshot'),
+    ]
+
+    def __init__(self) -> None:
+        if sys.platform != 'darwin':
+            raise OSError('The native metrics backend only supports macOS')
+        # Deferred so the other backends don't pay for ctypes
+        import ctypes
+        import struct
+        self.ctypes = ctypes
+        self.struct = struct
+        self.libc = ctypes.CDLL('/usr/lib/libSystem.B.dylib', use_errno=True)
+        self.libc.sysctlbyname.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t), ctypes.c_void_p, ctypes.c_size_t]
+        self.libc.sysctlnametomib.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_size_t)]
+        self.libc.sysctl.argtypes = [ctypes.POINTER(ctypes.c_int), ctypes.c_uint, ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t), ctypes.c_void_p, ctypes.c_size_t]
+        self.libc.mach_host_self.restype = ctypes.c_uint32
+        self.libc.host_statistics64.argtypes = [ctypes.c_uint32, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+        self.libc.host_processor_info.argtypes = [ctypes.c_uint32, ctypes.c_int, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.POINTER(ctypes.c_uint32)), ctypes.POINTER(ctypes.c_uint32)]
+        self.libc.vm_deallocate.argtypes = [ctypes.c_uint32, ctypes.c_void_p, ctypes.c_size_t]
+        # mach_task_self() is a macro for this global
+        self.task = ctypes.c_uint32.in_dll(self.libc, 'mach_task_self_').value
+        # mach_host_self() hands out a new port reference each call, so hold on to one
+        self.host = self.libc.mach_host_self()
+        self._define_structs()
+
+    def _define_structs(self) -> None:
+        """
+        Declare the C structures we read from the kernel.
+        """
+        ctypes = self.ctypes
+
+        class VmStatistics64(ctypes.Structure):
+            # mach/vm_statistics.h
+            _fields_ = [
+                ('free_count', ctypes.c_uint32),
+                ('active_count', ctypes.c_uint32),
+                ('inactive_count', ctypes.c_uint32),
+                ('wire_count', ctypes.c_uint32),
+                ('zero_fill_count', ctypes.c_uint64),
+                ('reactivations', ctypes.c_uint64),
+                ('pageins', ctypes.c_uint64),
+                ('pageouts', ctypes.c_uint64),
+                ('faults', ctypes.c_uint64),
+                ('cow_faults', ctypes.c_uint64),
+                ('lookups', ctypes.c_uint64),
+                ('hits', ctypes.c_uint64),
+                ('purges', ctypes.c_uint64),
+                ('purgeable_count', ctypes.c_uint32),
+                ('speculative_count', ctypes.c_uint32),
+                ('decompressions', ctypes.c_uint64),
+                ('compressions', ctypes.c_uint64),
+                ('swapins', ctypes.c_uint64),
+                ('swapouts', ctypes.c_uint64),
+                ('compressor_page_count', ctypes.c_uint32),
+                ('throttled_count', ctypes.c_uint32),
+                ('external_page_count', ctypes.c_uint32),
+                ('internal_page_count', ctypes.c_uint32),
+                ('total_uncompressed_pages_in_compressor', ctypes.c_uint64),
+            ]
+
+        class XswUsage(ctypes.Structure):
+            # sys/sysctl.h
+            _fields_ = [
+                ('xsu_total', ctypes.c_uint64),
+                ('xsu_avail', ctypes.c_uint64),
+                ('xsu_used', ctypes.c_uint64),
+                ('xsu_pagesize', ctypes.c_uint32),
+                ('xsu_encrypted', ctypes.c_int32),  # boolean_t
+            ]
+
+        class Timeval(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_usec', ctypes.c_int32)]
+
+        class Sockaddr(ctypes.Structure):
+            _fields_ = [('sa_len', ctypes.c_uint8), ('sa_family', ctypes.c_uint8), ('sa_data', ctypes.c_char * 14)]
+
+        class IfData(ctypes.Structure):
+            # net/if_var.h; the counters are 32 bits wide and wrap
+            _fields_ = [
+                ('ifi_type', ctypes.c_uint8),
+                ('ifi_typelen', ctypes.c_uint8),
+                ('ifi_physical', ctypes.c_uint8),
+                ('ifi_addrlen', ctypes.c_uint8),
+                ('ifi_hdrlen', ctypes.c_uint8),
+                ('ifi_recvquota', ctypes.c_uint8),
+                ('ifi_xmitquota', ctypes.c_uint8),
+                ('ifi_unused1', ctypes.c_uint8),
+                ('ifi_mtu', ctypes.c_uint32),
+                ('ifi_metric', ctypes.c_uint32),
+                ('ifi_baudrate', ctypes.c_uint32),
+                ('ifi_ipackets', ctypes.c_uint32),
+                ('ifi_ierrors', ctypes.c_uint32),
+                ('ifi_opackets', ctypes.c_uint32),
+                ('ifi_oerrors', ctypes.c_uint32),
+                ('ifi_collisions', ctypes.c_uint32),
+                ('ifi_ibytes', ctypes.c_uint32),
+                ('ifi_obytes', ctypes.c_uint32),
+                ('ifi_imcasts', ctypes.c_uint32),
+                ('ifi_omcasts', ctypes.c_uint32),
+                ('ifi_iqdrops', ctypes.c_uint32),
+                ('ifi_noproto', ctypes.c_uint32),
+                ('ifi_recvtiming', ctypes.c_uint32),
+                ('ifi_xmittiming', ctypes.c_uint32),
+                ('ifi_lastchange', ctypes.c_int32 * 2),
+                ('ifi_unused2', ctypes.c_uint32),
+                ('ifi_hwassist', ctypes.c_uint32),
+                ('ifi_reserved1', ctypes.c_uint32),
+                ('ifi_reserved2', ctypes.c_uint32),
+            ]
+
+        class IfAddrs(ctypes.Structure):
+            pass
+        IfAddrs._fields_ = [
+            ('ifa_next', ctypes.POINTER(IfAddrs)),
+            ('ifa_name', ctypes.c_char_p),
+            ('ifa_flags', ctypes.c_uint),
+            ('ifa_addr', ctypes.POINTER(Sockaddr)),
+            ('ifa_netmask', ctypes.POINTER(Sockaddr)),
+            ('ifa_dstaddr', ctypes.POINTER(Sockaddr)),
+            ('ifa_data', ctypes.c_void_p),
+        ]
+
+        class Statfs(ctypes.Structure):
+            # sys/mount.h with 64-bit inodes
+            _fields_ = [
+                ('f_bsize', ctypes.c_uint32),
+                ('f_iosize', ctypes.c_int32),
+                ('f_blocks', ctypes.c_uint64),
+                ('f_bfree', ctypes.c_uint64),
+                ('f_bavail', ctypes.c_uint64),
+                ('f_files', ctypes.c_uint64),
+                ('f_ffree', ctypes.c_uint64),
+                ('f_fsid', ctypes.c_int32 * 2),
+                ('f_owner', ctypes.c_uint32),
+                ('f_type', ctypes.c_uint32),
+                ('f_flags', ctypes.c_uint32),
+                ('f_fssubtype', ctypes.c_uint32),
+                ('f_fstypename', ctypes.c_char * 16),
+                ('f_mntonname', ctypes.c_char * 1024),
+                ('f_mntfromname', ctypes.c_char * 1024),
+                ('f_flags_ext', ctypes.c_uint32),
+                ('f_reserved', ctypes.c_uint32 * 7),
+            ]
+
+        self.VmStatistics64 = VmStatistics64
+        self.XswUsage = XswUsage
+        self.Timeval = Timeval
+        self.IfData = IfData
+        self.IfAddrs = IfAddrs
+        self.Statfs = Statfs
+
+        self.libc.getifaddrs.argtypes = [ctypes.POINTER(ctypes.POINTER(IfAddrs))]
+        self.libc.freeifaddrs.argtypes = [ctypes.POINTER(IfAddrs)]
+        # x86_64 keeps the 32-bit inode getfsstat for compatibility; arm64 only has the 64-bit one
+        try:
+            self.getfsstat = getattr(self.libc, 'getfsstat$INODE64')
+        except AttributeError:
+            self.getfsstat = self.libc.getfsstat
+        self.getfsstat.argtypes = [ctypes.POINTER(Statfs), ctypes.c_int, ctypes.c_int]
+
+    def _sysctl_raw(self, key: str=None) -> Union[bytes, None]:
+        """
+        Read the raw bytes for a sysctl key.
+        """
+        ctypes = self.ctypes
+        name = key.encode('utf-8')
+        size = ctypes.c_size_t(0)
+        if self.libc.sysctlbyname(name, None, ctypes.byref(size), None, 0) != 0:
+            return None
+        buffer = ctypes.create_string_buffer(size.value)
+        if self.libc.sysctlbyname(name, buffer, ctypes.byref(size), None, 0) != 0:
+            return None
+        return buffer.raw[:size.value]
+
+    def _sysctl_struct(self, key: str=None, structure: Type=None) -> Union[object, None]:
+        """
+        Read a sysctl key straight into a ctypes structure.
+        """
+        ctypes = self.ctypes
+        value = structure()
+        size = ctypes.c_size_t(ctypes.sizeof(value))
+        if self.libc.sysctlbyname(key.encode('utf-8'), ctypes.byref(value), ctypes.byref(size), None, 0) != 0:
+            return None
+        return value
+
+    def _sysctl_format(self, key: str=None) -> Union[tuple, None]:
+        """
+        Ask the kernel for a key's type and format string, the way sysctl(8) does.
+        """
+        ctypes = self.ctypes
+        mib = (ctypes.c_int * 12)()
+        mib_len = ctypes.c_size_t(12)
+        if self.libc.sysctlnametomib(key.encode('utf-8'), mib, ctypes.byref(mib_len)) != 0:
+            return None
+        # {0, 4} is the undocumented "oidfmt" node
+        query = (ctypes.c_int * (mib_len.value + 2))(0, 4, *mib[:mib_len.value])
+        buffer = ctypes.create_string_buffer(256)
+        size = ctypes.c_size_t(256)
+        if self.libc.sysctl(query, mib_len.value + 2, buffer, ctypes.byref(size), None, 0) != 0:
+            return None
+        kind = self.struct.unpack('I', buffer.raw[:4])[0]
+        return kind & self.CTLTYPE, buffer.raw[4:size.value].split(b'\0')[0].decode('utf-8')
+
+    def sysctls(self, keys: List[str]=None) -> Dict[str, Union[int, str, None]]:
+        values: Dict[str, Union[int, str, None]] = {}
+        for key in keys:
+            values[key] = None
+            kind_format = self._sysctl_format(key)
+            raw = self._sysctl_raw(key)
+            if kind_format is None or raw is None:
+                continue
+            kind, fmt = kind_format
+            if kind == self.CTLTYPE_STRING:
+                values[key] = raw.split(b'\0')[0].decode('utf-8', errors='replace')
+            elif kind in (self.CTLTYPE_INT, self.CTLTYPE_QUAD):
+                width = {'I': 4, 'IU': 4, 'L': 8, 'LU': 8, 'Q': 8, 'QU': 8}.get(fmt, 4 if kind == self.CTLTYPE_INT else 8)
+                code = {4: 'i', 8: 'q'}[width]
+                if fmt.endswith('U'):
+                    code = code.upper()
+                numbers = [self.struct.unpack_from(code, raw, offset)[0] for offset in range(0, len(raw) - width + 1, width)]
+                if len(numbers) == 1:
+                    values[key] = numbers[0]
+                elif numbers:
+                    values[key] = ' '.join(str(number) for number in numbers)
+        return values
+
+    def virtual_memory(self) -> Union[SystemMemory, None]:
+        ctypes = self.ctypes
+        stats = self.VmStatistics64()
+        count = ctypes.c_uint32(ctypes.sizeof(stats) // 4)
+        if self.libc.host_statistics64(self.host, self.HOST_VM_INFO64, ctypes.byref(stats), ctypes.byref(count)) != 0:
+            return None
+        total = self.sysctls(['hw.memsize'])['hw.memsize']
+        pagesize = os.sysconf('SC_PAGE_SIZE')
+        return make_system_memory(
+            total=total,
+            free=stats.free_count * pagesize,
+            active=stats.active_count * pagesize,
+            inactive=stats.inactive_count * pagesize,
+            wired=stats.wire_count * pagesize,
+            speculative=stats.speculative_count * pagesize,
+        )
+
+    def swap_usage(self) -> Union[SwapUsage, None]:
+        usage = self._sysctl_struct('vm.swapusage', self.XswUsage)
+        if usage is None:
+            return None
+        return SwapUsage(total=usage.xsu_total, free=usage.xsu_avail, used=usage.xsu_used)
+
+    def net_io_counters(self, interface: str=None) -> Dict[str, IoCounters]:
+        ctypes = self.ctypes
+        head = ctypes.POINTER(self.IfAddrs)()
+        if self.libc.getifaddrs(ctypes.byref(head)) != 0:
+            return {}
+        counters: Dict[str, IoCounters] = {}
+        try:
+            entry = head
+            while entry:
+                ifaddr = entry.contents
+                entry = ifaddr.ifa_next
+                if not ifaddr.ifa_addr or not ifaddr.ifa_data or ifaddr.ifa_addr.contents.sa_family != self.AF_LINK:
+                    continue
+                name = ifaddr.ifa_name.decode('utf-8')
+                if interface and name != interface:
+                    continue
+                data = self.IfData.from_address(ifaddr.ifa_data)
+                counters[name] = IoCounters(
+                    interface    = name,
+                    bytes_sent   = data.ifi_obytes,
+                    bytes_recv   = data.ifi_ibytes,
+                    packets_sent = data.ifi_opackets,
+                    packets_recv = data.ifi_ipackets,
+                    errin        = data.ifi_ierrors,
+                    errout       = data.ifi_oerrors,
+                    collisions   = data.ifi_collisions,
+                )
+        finally:
+            self.libc.freeifaddrs(head)
+        return counters
+
+    def partitions(self) -> List[Mountpoint]:
+        ctypes = self.ctypes
+        count = self.getfsstat(None, 0, self.MNT_NOWAIT)
+        if count <= 0:
+            return []
+        buffer = (self.Statfs * count)()
+        count = self.getfsstat(buffer, ctypes.sizeof(buffer), self.MNT_NOWAIT)
+        partitions: List[Mountpoint] = []
+        for fs in buffer[:max(count, 0)]:
+            device = fs.f_mntfromname.decode('utf-8')
+            if not re.match(r'^/dev/disk[s0-9]+$', device):
+                continue
+            partitions.append(Mountpoint(
+                device=device,
+                mountpoint=fs.f_mntonname.decode('utf-8'),
+                fstype=fs.f_fstypename.decode('utf-8'),
+                opts=[name for flag, name in self.MOUNT_FLAGS if fs.f_flags & flag],
+            ))
+        return partitions
+
+    def boot_time(self) -> Union[int, None]:
+        boottime = self._sysctl_struct('kern.boottime', self.Timeval)
+        return int(boottime.tv_sec) if boottime is not None else None
+
+    def cpu_times(self) -> List[CpuTimes]:
+        ctypes = self.ctypes
+        cpu_count = ctypes.c_uint32(0)
+        info = ctypes.POINTER(ctypes.c_uint32)()
+        info_count = ctypes.c_uint32(0)
+        if self.libc.host_processor_info(self.host, self.PROCESSOR_CPU_LOAD_INFO, ctypes.byref(cpu_count), ctypes.byref(info), ctypes.byref(info_count)) != 0:
+            return []
+        ticks = os.sysconf('SC_CLK_TCK')
+        try:
+            # Each CPU gets an unsigned int per state: user, system, idle, nice
+            return [
+                CpuTimes(
+                    cpu=cpu,
+                    user=info[cpu * 4 + self.CPU_STATE_USER] / ticks,
+                    nice=info[cpu * 4 + self.CPU_STATE_NICE] / ticks,
+                    system=info[cpu * 4 + self.CPU_STATE_SYSTEM] / ticks,
+                    idle=info[cpu * 4 + self.CPU_STATE_IDLE] / ticks,
+                )
+                for cpu in range(cpu_count.value)
+            ]
+        finally:
+            self.libc.vm_deallocate(self.task, ctypes.cast(info, ctypes.c_void_p), info_count.value * ctypes.sizeof(ctypes.c_uint32))
+
+class StubBackend(MetricsBackend):
+    """
+    Return fixed values, so plugin logic can be exercised and benchmarked on machines that have
+    neither the macOS APIs nor the command line tools.
+    """
+    name = 'stub'
+
+    def __init__(self, sysctls: Dict[str, Union[int, str]]=None, virtual_memory: SystemMemory=None, swap_usage: SwapUsage=None, net_io_counters: Dict[str, IoCounters]=None, partitions: List[Mountpoint]=None, boot_time: int=None, cpu_count: int=4) -> None:
+        gigabyte = 1024 * 1024 * 1024
+        self._sysctls = sysctls if sysctls is not None else {
+            'hw.memsize': 16 * gigabyte,
+            'hw.cpufamily': 0x1b588bb3,
+            'machdep.cpu.brand_string': 'Apple M1 Pro',
+        }
+        self._virtual_memory = virtual_memory or make_system_memory(
+            total=16 * gigabyte,
+            free=2 * gigabyte,
+            active=6 * gigabyte,
+            inactive=5 * gigabyte,
+            wired=3 * gigabyte,
+            speculative=gigabyte // 2,
+        )
+        self._swap_usage = swap_usage or SwapUsage(total=2 * gigabyte, free=gigabyte, used=gigabyte)
+        self._net_io_counters = net_io_counters if net_io_counters is not None else {
+            'en0': IoCounters(interface='en0', bytes_sent=1024 ** 3, bytes_recv=4 * 1024 ** 3, packets_sent=900000, packets_recv=3000000, errin=0, errout=0, collisions=0),
+            'lo0': IoCounters(interface='lo0', bytes_sent=1024 ** 2, bytes_recv=1024 ** 2, packets_sent=5000, packets_recv=5000, errin=0, errout=0, collisions=0),
+        }
+        self._partitions = partitions if partitions is not None else [
+            Mountpoint(device='/dev/disk3s1s1', mountpoint='/', fstype='apfs', opts=['sealed', 'local', 'read-only', 'journaled']),
+            Mountpoint(device='/dev/disk3s5', mountpoint='/System/Volumes/Data', fstype='apfs', opts=['local', 'journaled', 'nobrowse']),
+        ]
+        self._boot_time = boot_time if boot_time is not None else 1700000000
+        self._cpu_count = cpu_count
+
+    def sysctls(self, keys: List[str]=None) -> Dict[str, Union[int, str, None]]:
+        return {key: self._sysctls.get(key) for key in keys}
+
+    def virtual_memory(self) -> Union[SystemMemory, None]:
+        return self._virtual_memory
+
+    def swap_usage(self) -> Union[SwapUsage, None]:
+        return self._swap_usage
+
+    def net_io_counters(self, interface: str=None) -> Dict[str, IoCounters]:
+        return {name: counters for name, counters in self._net_io_counters.items() if not interface or name == interface}
+
+    def partitions(self) -> List[Mountpoint]:
+        return list(self._partitions)
+
+    def boot_time(self) -> Union[int, None]:
+        return self._boot_time
+
+    def cpu_times(self) -> List[CpuTimes]:
+        # Advance with the clock at a steady 20% user, 10% system so percentages come out the same every time
+        elapsed = time.monotonic()
+        return [CpuTimes(cpu=cpu, user=elapsed * 0.2, nice=0.0, system=elapsed * 0.1, idle=elapsed * 0.7) for cpu in range(self._cpu_count)]
+
+_backends: Dict[str, Type[MetricsBackend]] = {
+    'native': NativeBackend,
+    'proc': ProcBackend,
+    'subprocess': SubprocessBackend,
+    'stub': StubBackend,
+}
+_backend = None
+
+def register_backend(name: str=None, backend: Type[MetricsBackend]=None) -> None:
+    """
+    Make a backend class available to get_backend() under the given name.
+    """
+    _backends[name] = backend
+
+def _create_backend(name: str=None) -> MetricsBackend:
+    """
+    Create the backend registered under the given name.
+    """
+    if name not in _backends:
+        raise ValueError(f'Unknown metrics backend "{name}". Choose one of: {", ".join(sorted(_backends))}')
+    return _backends[name]()
+
+def get_backend(name: str=None) -> MetricsBackend:
+    """
+    Return a metrics backend. With no name this honors $SWIFTBAR_METRICS_BACKEND, then picks one for the
+    platform: native on macOS (falling back to subprocess), proc on Linux, and subprocess anywhere else. The
+    default backend is created once per process.
+    """
+    global _backend
+    if name is not None:
+        return _create_backend(name)
+    if _backend is None:
+        requested = os.environ.get('SWIFTBAR_METRICS_BACKEND')
+        if requested:
+            _backend = _create_backend(requested)
+        elif sys.platform == 'darwin':
+            try:
+                _backend = NativeBackend()
+            except (OSError, AttributeError):
+                _backend = SubprocessBackend()
+        elif sys.platform.startswith('linux'):
+            _backend = ProcBackend()
+        else:
+            _backend = SubprocessBackend()
+    return _backend
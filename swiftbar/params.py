@@ -1,35 +1,95 @@
-from typing import get_args, get_origin, Any, Dict
-import re
+from types import MappingProxyType
+from typing import get_args, get_origin, Any, Callable, Dict, Mapping
+
+Validator = Callable[[Any], bool]
+
+def _compile_validator(expected_type: Any=None) -> Validator:
+    """
+    Build a function that determines if a value is the exact type we want. The typing
+    introspection is done once here instead of on every assignment.
+    """
+    origin = get_origin(expected_type) or expected_type  # Get the base type
+    expected_args = get_args(expected_type)  # Get expected type arguments
+
+    if not expected_args:
+        return lambda value: isinstance(value, origin)
+
+    if origin is list:
+        item_type = expected_args[0]
+        return lambda value: isinstance(value, list) and all(isinstance(item, item_type) for item in value)
+    elif origin is dict:
+        key_type, val_type = expected_args
+        return lambda value: isinstance(value, dict) and all(isinstance(k, key_type) and isinstance(v, val_type) for k, v in value.items())
+
+    return lambda value: isinstance(value, origin)
+
+def compile_schema(schema: Dict[str, Any]=None) -> Mapping[str, Validator]:
+    """
+    Compile a schema of key -> type into a read-only mapping of key -> validator.
+    """
+    return MappingProxyType({key: _compile_validator(expected_type) for key, expected_type in schema.items()})
+
+def _is_param_key(key: str=None) -> bool:
+    """
+    Determine if a key is one of the positional param1...n keys.
+    """
+    return key.startswith('param') and key[5:6].isdigit()
 
 class TypedDict:
+    _schema: Mapping[str, Any] = MappingProxyType({})
+    _validators: Mapping[str, Validator] = MappingProxyType({})
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, schema: Dict[str, Any]=None, **params) -> None:
         """
         Initialize with a schema where keys are the expected fields and
-        values are the expected types.
+        values are the expected types. Subclasses provide a precompiled schema.
         """
         self._enforce_schema = enforce_schema
         self._enforce_typing = enforce_typing
-        self._schema = schema
+        if schema is not None:
+            self._schema = MappingProxyType(dict(schema))
+            self._validators = compile_schema(schema)
         self._data = {}
         for k, v in params.items():
             self.__setitem__(k, v)
 
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]=None, enforce_typing: bool=True) -> 'TypedDict':
+        """
+        Build an instance from an arbitrary set of params, silently dropping any key that
+        is not part of the schema.
+        """
+        instance = cls.__new__(cls)
+        instance._enforce_schema = True
+        instance._enforce_typing = enforce_typing
+        validators = cls._validators
+        data = {}
+        for key, value in params.items():
+            validator = validators.get(key)
+            if validator is None:
+                if _is_param_key(key):
+                    data[key] = value
+                continue
+            if enforce_typing and not validator(value):
+                raise TypeError(f'Value for "{key}" must be of type {str(cls._schema[key])}')
+            data[key] = value
+        instance._data = data
+        return instance
+
     def __setitem__(self, key: str=None, value: Any=None) -> None:
         """
         Validate the key and value type when setting an item.
         If the key is param1...n, we will allow it.
         """
-        if re.match(r'^param[\d+]', key):
-            self._data[key] = value
-            return
-        if self._enforce_schema:
-            if key not in self._schema:
-                raise KeyError(f'Key "{key}" is not allowed.')
-        if self._enforce_typing:
-            expected_type = self._schema[key]
-            if not self._check_exact_type(value, expected_type):
-                raise TypeError(f'Value for "{key}" must be of type {str(expected_type)}')
-            self._data[key] = value
+        validator = self._validators.get(key)
+        if validator is None:
+            if _is_param_key(key) or not self._enforce_schema:
+                self._data[key] = value
+                return
+            raise KeyError(f'Key "{key}" is not allowed.')
+        if self._enforce_typing and not validator(value):
+            raise TypeError(f'Value for "{key}" must be of type {str(self._schema[key])}')
+        self._data[key] = value
 
     def __getitem__(self, key: str=None) -> Any:
         """
@@ -42,34 +102,13 @@ class TypedDict:
         String representation of the TypedDict.
         """
         return repr(self._data)
-    
+
     def __contains__(self, key: str=None) -> bool:
         """
         Check if a key exists in the TypedDict schema.
         """
         return key in self._data
 
-    def _check_exact_type(self, value, expected_type) -> bool:
-        """
-        Determine if the value sent is the exact type we want.
-        """
-        origin = get_origin(expected_type) or expected_type  # Get the base type
-        expected_args = get_args(expected_type)  # Get expected type arguments
-
-        # Ensure value is an instance of the base type (list, dict, etc.)
-        if not isinstance(value, origin):
-            return False
-        
-        # If there are expected type arguments, validate each element
-        if expected_args:
-            if isinstance(value, list):
-                return all(isinstance(item, expected_args[0]) for item in value)
-            elif isinstance(value, dict):
-                key_type, val_type = expected_args
-                return all(isinstance(k, key_type) and isinstance(v, val_type) for k, v in value.items())
-
-        return True  # If no generic arguments were provided, it's a match
-    
     def items(self):
         """
         Return a view object that displays a list of dictionary's key-value tuple pairs.
@@ -86,108 +125,114 @@ class TypedDict:
         return self._data.pop(key)
 
 class Params(TypedDict):
+    _schema = MappingProxyType({
+        'ansi': bool,
+        'color': str,
+        'emojize': bool,
+        'font': str,
+        'length': int,
+        'md': bool,
+        'sfcolor': str,
+        'sfsize': int,
+        'size': int,
+        'symbolize': bool,
+        'trim': bool,
+
+        'alternate': bool,
+        'checked': bool,
+        'dropdown': bool,
+        'image': str,
+        'sfimage': str,
+        'templateImage': str,
+        'tooltip': str,
+
+        'bash': str,
+        'cmd': list,
+        'disabled': bool,
+        'href': str,
+        'key': str,
+        'refresh': bool,
+        'shell': str,
+        'shortcut': str,
+        'terminal': bool,
+    })
+    _validators = compile_schema(_schema)
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
         super().__init__(
             enforce_schema = enforce_schema,
             enforce_typing = enforce_typing,
-            schema={
-                'ansi': bool,
-                'color': str,
-                'emojize': bool,
-                'font': str,
-                'length': int,
-                'md': bool,
-                'sfcolor': str,
-                'sfsize': int,
-                'size': int,
-                'symbolize': bool,
-                'trim': bool,
-
-                'alternate': bool,
-                'checked': bool,
-                'dropdown': bool,
-                'image': str,
-                'sfimage': str,
-                'templateImage': str,
-                'tooltip': str,
-
-                'bash': str,
-                'cmd': list,
-                'disabled': bool,
-                'href': str,
-                'key': str,
-                'refresh': bool,
-                'shell': str,
-                'shortcut': str,
-                'terminal': bool,
-            },
             **params,
         )
 
 class ParamsXbar(TypedDict):
+    _schema = MappingProxyType({
+        'ansi': bool,
+        'color': str,
+        'emojize': bool,
+        'font': str,
+        'length': int,
+        'size': int,
+        'trim': bool,
+
+        'alternate': bool,
+        'dropdown': bool,
+        'image': str,
+        'templateImage': str,
+
+        'bash': str,
+        'cmd': list,
+        'disabled': bool,
+        'href': str,
+        'key': str,
+        'refresh': bool,
+        'shell': str,
+        'terminal': bool,
+    })
+    _validators = compile_schema(_schema)
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
         super().__init__(
             enforce_schema = enforce_schema,
             enforce_typing = enforce_typing,
-            schema={
-                'ansi': bool,
-                'color': str,
-                'emojize': bool,
-                'font': str,
-                'length': int,
-                'size': int,
-                'trim': bool,
-
-                'alternate': bool,
-                'dropdown': bool,
-                'image': str,
-                'templateImage': str,
-
-                'bash': str,
-                'cmd': list,
-                'disabled': bool,
-                'href': str,
-                'key': str,
-                'refresh': bool,
-                'shell': str,
-                'terminal': bool,
-            },
             **params,
         )
 
 class ParamsSwiftBar(TypedDict):
+    _schema = MappingProxyType({
+        'ansi': bool,
+        'color': str,
+        'emojize': bool,
+        'font': str,
+        'length': int,
+        'md': bool,
+        'sfcolor': str,
+        'sfsize': int,
+        'size': int,
+        'symbolize': bool,
+        'trim': bool,
+
+        'alternate': bool,
+        'checked': bool,
+        'dropdown': bool,
+        'image': str,
+        'sfimage': str,
+        'templateImage': str,
+        'tooltip': str,
+
+        'bash': str,
+        'cmd': list,
+        'href': str,
+        'refresh': bool,
+        'shell': str,
+        'shortcut': str,
+        'terminal': bool,
+    })
+    _validators = compile_schema(_schema)
+
     def __init__(self, enforce_schema: bool=True, enforce_typing: bool=True, **params) -> None:
-       super().__init__(
-           enforce_schema = enforce_schema,
-           enforce_typing = enforce_typing,
-           schema = {
-            'ansi': bool,
-            'color': str,
-            'emojize': bool,
-            'font': str,
-            'length': int,
-            'md': bool,
-            'sfcolor': str,
-            'sfsize': int,
-            'size': int,
-            'symbolize': bool,
-            'trim': bool,
-
-            'alternate': bool,
-            'checked': bool,
-            'dropdown': bool,
-            'image': str,
-            'sfimage': str,
-            'templateImage': str,
-            'tooltip': str,
-
-            'bash': str,
-            'cmd': list,
-            'href': str,
-            'refresh': bool,
-            'shell': str,
-            'shortcut': str,
-            'terminal': bool,
-        },
-        **params,
-    )
+        super().__init__(
+            enforce_schema = enforce_schema,
+            enforce_typing = enforce_typing,
+            **params,
+        )
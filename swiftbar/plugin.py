@@ -1,11 +1,12 @@
 from collections import OrderedDict
 from pathlib import Path
-from swiftbar import images, util
+from swiftbar import history, images, metrics, request, util
 from swiftbar.params import Params, ParamsXbar, ParamsSwiftBar
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Union
 import argparse
 import json
 import os
+import re
 import shutil
 import sys
 import time
@@ -14,6 +15,62 @@ import typing
 class Writer(typing.Protocol):
     def write(self, _: str, /) -> int: ...
 
+# When a plugin runs inside the resident host (swiftbar.host), its parent is the host rather than
+# xbar/SwiftBar, so the host passes the real invoker pid along. Invoker lookups are cached per pid.
+_invoker_pid = None
+_invoker_cache: Dict[int, Union[str, None]] = {}
+
+def set_invoker_pid(pid: int=None) -> None:
+    """
+    Override the pid used to determine which application invoked the plugin.
+    """
+    global _invoker_pid
+    _invoker_pid = pid
+
+def get_invoker(pid: int=None) -> Union[str, None]:
+    """
+    Return the full command of the given pid via ps, caching the result.
+    """
+    if pid not in _invoker_cache:
+        returncode, stdout, _ = util.execute_command([['/bin/ps', '-o', 'command', '-p', str(pid)], ['tail', '-n+2']])
+        _invoker_cache[pid] = stdout if returncode == 0 and stdout else None
+    return _invoker_cache[pid]
+
+class Menu:
+    """
+    The menu for a single plugin run. Each item is formatted as it's printed and kept as a line, and the
+    lines are written out with a single write when the plugin renders its footer.
+    """
+    __slots__ = ('lines',)
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+
+    def add_item(self, text: str=None, params: Union[ParamsXbar, ParamsSwiftBar]=None) -> None:
+        self.lines.append(format_menu_item(text, params))
+
+    def add_separator(self) -> None:
+        self.lines.append('---')
+
+    def serialize(self) -> str:
+        """
+        Return the complete plugin output.
+        """
+        return '\n'.join(self.lines) + '\n' if self.lines else ''
+
+    def clear(self) -> None:
+        """
+        Discard all items so the menu can be reused.
+        """
+        self.lines = []
+
+def format_menu_item(text: str=None, params: Union[ParamsXbar, ParamsSwiftBar]=None) -> str:
+    """
+    Format a menu item as a line of plugin output.
+    """
+    params_str = ' '.join(f'{k}={v}' for k, v in params.items())
+    return f'{text} | {params_str}'
+
 class Plugin:
     def __init__(self, **kwargs) -> None:
         self.disable_brew = kwargs.get('disable_brew', False)
@@ -48,9 +105,11 @@ class Plugin:
         self.error_messages = []
 
         self.configuration = {}
+        self.menu = Menu()
         self.plugin_name = os.path.abspath(sys.argv[0])
         self.plugin_basename = os.path.basename(self.plugin_name)
         self.vars_file = os.path.join(self.config_dir, self.plugin_basename) + '.vars.json'
+        self.streamable = self._is_streamable()
 
     def _set_path(self):
         """
@@ -69,11 +128,9 @@ class Plugin:
         """
         Determine the location of the configuration directory based on self.invoked_by, gotten from the parent PID.
         """
-        ppid = os.getppid()
+        ppid = _invoker_pid or os.getppid()
         self.invoker_pid = ppid
-        returncode, stdout, stderr = util.execute_command(f'/bin/ps -o command -p {ppid} | tail -n+2')
-        if returncode != 0 or stderr:
-            pass
+        stdout = get_invoker(ppid)
         if stdout:
             self.invoked_by_full = stdout
             self.invoked_by = os.path.basename(self.invoked_by_full)
@@ -82,6 +139,23 @@ class Plugin:
             elif stdout == '/Applications/SwiftBar.app/Contents/MacOS/SwiftBar':
                 self.config_dir = os.path.join(Path.home(), '.config', 'SwiftBar')
 
+    def _is_streamable(self) -> bool:
+        """
+        Determine if the plugin should run as a SwiftBar streamable plugin. The flag is the same
+        <swiftbar.type>streamable</swiftbar.type> header SwiftBar reads, so the two can't disagree.
+        """
+        if self.invoked_by != 'SwiftBar':
+            return False
+        # Clicking a settings item runs the plugin with a flag. That run applies the change and exits;
+        # the stream that is already running picks the change up from the vars file.
+        if sys.argv[1:]:
+            return False
+        try:
+            with open(self.plugin_name, 'r') as fh:
+                return re.search(r'<swiftbar\.type>\s*streamable\s*</swiftbar\.type>', fh.read(), re.IGNORECASE) is not None
+        except OSError:
+            return False
+
     def _create_config_dir(self) -> None:
         """
         Create the configuration directory if it doesn't exist.
@@ -128,7 +202,7 @@ class Plugin:
                 for key, value in self.defaults_dict.items():
                     if key in contents:
                         if 'valid_values' in value:
-                            if contents[key] in value['valid_values']:
+                            if contents[key] in value['valid_values'] or ('validator' in value and value['validator'](contents[key])):
                                 self.configuration[key] = contents[key]
                             else:
                                 self.configuration[key] = self.defaults_dict[key]['default_value']
@@ -206,6 +280,60 @@ class Plugin:
                     else:
                         self._update_setting(action.help, getattr(self.args, action.dest))
 
+    def _state_file(self, key: str=None) -> str:
+        """
+        Return the path to the state file for the given key.
+        """
+        return os.path.join(self.config_dir, self.plugin_basename) + f'.{key}.state.json'
+
+    def read_state(self, key: str=None, max_age: float=None) -> Any:
+        """
+        Return a value saved by write_state() on an earlier run, or None if there isn't one, it can't be
+        read, or it was saved more than max_age seconds ago.
+        """
+        try:
+            with open(self._state_file(key), 'r') as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or 'saved' not in state:
+            return None
+        if max_age is not None and not 0 <= time.time() - state['saved'] <= max_age:
+            return None
+        return state.get('value')
+
+    def write_state(self, key: str=None, value: Any=None) -> None:
+        """
+        Save a JSON-serializable value for the next run. The file is replaced atomically so a run that
+        reads it at the same time never sees half of it.
+        """
+        path = self._state_file(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as fh:
+                json.dump({'saved': time.time(), 'value': value}, fh)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def open_history(self, key: str=None, width: int=1, capacity: int=512) -> history.RingBuffer:
+        """
+        Return a fixed-size history of records, each width floats long, kept in the config directory between runs.
+        """
+        return history.RingBuffer(os.path.join(self.config_dir, self.plugin_basename) + f'.{key}.history', width=width, capacity=capacity)
+
+    def enable_http_cache(self, max_size: int=10 * 1024 * 1024) -> Any:
+        """
+        Cache swiftbar.request GET responses in the shared http-cache directory under the config directory.
+        """
+        return request.enable_cache(os.path.join(self.config_dir, 'http-cache'), max_size=max_size)
+
+    def enable_circuit_breaker(self) -> Any:
+        """
+        Remember which hosts swiftbar.request has given up on between runs, so later runs fail fast or use cached responses.
+        """
+        return request.enable_circuit_breaker(os.path.join(self.config_dir, 'http-circuit-breaker.json'))
+
     def setup(self):
         """
         Set up the environment and update settings as needed.
@@ -226,37 +354,37 @@ class Plugin:
     def _sanitize_params(self, **params: Params) -> Union[ParamsXbar, ParamsSwiftBar]:
         """
         Create a new params object based on the value of self.invoked_by. Both xbar and SwiftBar have some unique
-        parameters and this will allow the work to be handled behind the scenes.
+        parameters and this will allow the work to be handled behind the scenes. Keys the invoker doesn't support
+        are dropped. Value types are only checked when debugging is enabled.
         """
-        sanitized = ParamsXbar() if self.invoked_by == 'xbar' else ParamsSwiftBar()
-        for k, v in params.items():
-            try:
-                sanitized[k] = v
-            except KeyError as e:
-                pass
-        return sanitized
+        params_class = ParamsXbar if self.invoked_by == 'xbar' else ParamsSwiftBar
+        return params_class.from_params(params, enforce_typing=self.debug)
 
-    def _print_update_time(self, *, out: Writer = sys.stdout) -> None:
+    def _print_update_time(self, *, out: Writer=None) -> None:
         """
-        Print the updated time in human format.
+        Print the updated time in human format. Streamable plugins only get the separator.
         """
-        self.print_menu_separator()
-        self.print_menu_item(f'Updated {util.get_timestamp(int(time.time()))}')
-        self.print_menu_separator()
+        self.print_menu_separator(out=out)
+        # A streamed frame would change every tick if it carried the time, so leave it out
+        if not self.streamable:
+            self.print_menu_item(f'Updated {util.get_timestamp(int(time.time()))}', out=out)
+            self.print_menu_separator(out=out)
 
-    def print_menu_title(self, text: str=None, display_update_time: bool=True, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_menu_title(self, text: str=None, display_update_time: bool=True, *, out: Writer=None, **params: Params) -> None:
         """
-        Print the plugin title in the menu bar.
+        Add the plugin title for the menu bar.
         """
         params = self._sanitize_params(**params)
-        params_str = ' '.join(f'{k}={v}' for k, v in params.items())
-        print(f'{text} | {params_str}', file=out)
+        if out is None:
+            self.menu.add_item(text, params)
+        else:
+            print(format_menu_item(text, params), file=out)
         if display_update_time:
-            self._print_update_time()
+            self._print_update_time(out=out)
         else:
-            self.print_menu_separator()
+            self.print_menu_separator(out=out)
 
-    def print_ordered_dict(self, data: OrderedDict, justify: str='right', delimiter: str = '', indent: int=0, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_ordered_dict(self, data: OrderedDict, justify: str='right', delimiter: str = '', indent: int=0, *, out: Writer=None, **params: Params) -> None:
         """
         Render an instance of collections.OrderedDict().
         """
@@ -265,15 +393,15 @@ class Plugin:
         params['trim'] = False
 
         for k, v in data.items():
-            params_str = ' '.join(f'{k}={v}' for k, v in params.items())
             if justify == 'left':
-                self.print_menu_item(f'{indent_str}{k.ljust(longest)} {delimiter} {v} | {params_str}', **params)
+                self.print_menu_item(f'{indent_str}{k.ljust(longest)} {delimiter} {v}', out=out, **params)
             elif justify == 'right':
-                self.print_menu_item(f'{indent_str}{k.rjust(longest)} {delimiter} {v} | {params_str}', **params)
+                self.print_menu_item(f'{indent_str}{k.rjust(longest)} {delimiter} {v}', out=out, **params)
 
-    def print_menu_item(self, text: str=None, *, out: Writer=sys.stdout, **params: Params) -> None:
+    def print_menu_item(self, text: str=None, *, out: Writer=None, **params: Params) -> None:
         """
-        Generic wrapper to print all non-title menu items.
+        Generic wrapper to add all non-title menu items. Given out, the item is written to it straight away
+        instead of being added to the menu.
         """
         # https://github.com/tmzane/swiftbar-plugins
         params = self._sanitize_params(**params)
@@ -293,14 +421,19 @@ class Plugin:
             if 'cmd' in params:
                 params.pop('cmd')
 
-        params_str = ' '.join(f'{k}={v}' for k, v in params.items())
-        print(f'{text} | {params_str}', file=out)
+        if out is None:
+            self.menu.add_item(text, params)
+        else:
+            print(format_menu_item(text, params), file=out)
 
-    def print_menu_separator(self, *, out: Writer = sys.stdout) -> None:
+    def print_menu_separator(self, *, out: Writer=None) -> None:
         """
-        Print a menu separator.
+        Add a menu separator.
         """
-        print('---', file=out)
+        if out is None:
+            self.menu.add_separator()
+        else:
+            print('---', file=out)
 
     def _render_settings_menu(self):
         """
@@ -357,14 +490,14 @@ class Plugin:
         """
         pv = sys.version_info
         os_version = util.get_macos_version()
-        total_mem = util.get_sysctl('hw.memsize')
+        total_mem = metrics.get_backend().sysctls(['hw.memsize'])['hw.memsize']
 
         self.print_menu_item('Debugging')
         debug_data = OrderedDict()
         if os_version:
             debug_data['OS version'] = os_version
         if total_mem:
-            debug_data['Memory'] = util.format_number(int(total_mem))
+            debug_data['Memory'] = util.format_number(total_mem)
         debug_data['Debug flag'] = 'Enabled' if self.debug else 'Disabled'
         debug_data['Brew enabled'] = False if self.disable_brew else True
         debug_data['Python'] = shutil.which('python3')
@@ -380,6 +513,15 @@ class Plugin:
         debug_data['Default font size'] = self.font_size
         debug_data['Configuration directory'] = self.config_dir
         debug_data['Variables file'] = self.vars_file
+        # Only report on HTTP if the plugin made requests
+        if request.transfer_stats.requests:
+            stats = request.transfer_stats
+            debug_data['HTTP responses'] = stats.requests
+            debug_data['HTTP bytes received'] = util.format_number(stats.wire_bytes)
+            debug_data['HTTP bytes decoded'] = util.format_number(stats.decoded_bytes)
+            if request.default_cache:
+                cache = request.default_cache
+                debug_data['HTTP cache'] = f'{cache.hits} hits, {cache.revalidated} revalidated, {cache.misses} misses, {cache.stale} stale'
         self.print_ordered_dict(debug_data, justify='left', indent=2)
         self.print_menu_item('--Variables')
         variables = OrderedDict()
@@ -392,10 +534,73 @@ class Plugin:
             environment_variables[key] = os.environ.get(key)
         self.print_ordered_dict(environment_variables, justify='right', indent=4, delimiter = '=', length=125)
 
-    def render_footer(self):
+    def render_menu(self, *, out: Writer=None) -> None:
+        """
+        Write out the menu in one go.
+        """
+        out = out or sys.stdout
+        out.write(self.menu.serialize())
+        out.flush()
+        self.menu.clear()
+
+    def _add_footer(self) -> None:
+        """
+        Add the Settings, Debugging, and Refresh menus.
+        """
         self.print_menu_separator()
         if self.defaults_dict:
             self._render_settings_menu()
         if self.debug:
             self._render_debugging_menu()
         self.print_menu_item('Refresh', refresh=True)
+
+    def render_footer(self, *, out: Writer=None) -> None:
+        """
+        Add the Settings, Debugging, and Refresh menus, then write the whole menu.
+        """
+        self._add_footer()
+        self.render_menu(out=out)
+
+    def _get_vars_mtime(self) -> Union[float, None]:
+        try:
+            return os.stat(self.vars_file).st_mtime
+        except OSError:
+            return None
+
+    def run(self, sample: Callable[[Any], Any]=None, render: Callable[[Any], None]=None, interval: float=2.0, *, out: Writer=None) -> None:
+        """
+        Render the plugin. sample() is passed the previous sample, or None on the first call, and
+        returns the new one. render() adds the menu items for a sample.
+
+        Normally this samples and renders once. If the plugin is streamable it keeps going, writing
+        a "~~~" delimited frame every interval seconds, but only when the frame has changed.
+        """
+        out = out or sys.stdout
+        if not self.streamable:
+            render(sample(None))
+            self.render_footer(out=out)
+            return
+
+        previous_frame = None
+        current = None
+        vars_mtime = self._get_vars_mtime()
+        try:
+            while True:
+                started = time.monotonic()
+                mtime = self._get_vars_mtime()
+                if mtime != vars_mtime:
+                    self._read_config()
+                    vars_mtime = mtime
+                current = sample(current)
+                render(current)
+                self._add_footer()
+                frame = self.menu.serialize()
+                self.menu.clear()
+                if frame != previous_frame:
+                    out.write('~~~\n' + frame)
+                    out.flush()
+                    previous_frame = frame
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except (BrokenPipeError, KeyboardInterrupt):
+            # SwiftBar closed the pipe or stopped the plugin
+            pass
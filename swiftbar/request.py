@@ -1,6 +1,229 @@
-from typing import Any, Dict, Optional, Union
+from swiftbar import httpcache
+from typing import Any, Dict, List, Optional, Tuple, Union
 import json
 import http.client
+import os
+import random
+import ssl
+import threading
+import time
+import weakref
+import zlib
+
+# Seconds to wait for a connection, and then for each read from it
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+# Servers drop idle keep-alive connections on their own schedule; don't hand out ones older than this
+IDLE_TIMEOUT = 15
+MAX_IDLE_PER_HOST = 4
+# Offered to every server unless the caller asks for something else; _read_body() undoes both
+ACCEPT_ENCODING = 'gzip, deflate'
+# Responses are read and decompressed this many bytes at a time
+READ_CHUNK_SIZE = 65536
+# Idempotent requests are retried this many times, backing off exponentially from BACKOFF seconds
+RETRIES = 2
+BACKOFF = 0.5
+MAX_BACKOFF = 8
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# Overall time allowed for a request, retries included
+DEADLINE = 45
+# After this many failed requests in a row a host is left alone for BREAKER_COOLDOWN seconds, doubling while it keeps failing
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 60
+BREAKER_MAX_COOLDOWN = 900
+# Concurrent requests to any one host from swiftbar_request_async() and gather()
+LIMIT_PER_HOST = 4
+
+class ConnectionPool:
+    """
+    Keep-alive HTTPS connections, kept per host and sharing one SSL context so a run that makes
+    several calls to the same host only pays for DNS, TCP and TLS once.
+    """
+    def __init__(self, idle_timeout: float=IDLE_TIMEOUT, max_idle_per_host: int=MAX_IDLE_PER_HOST) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.ssl_context = None
+        self.idle: Dict[str, List[Tuple[http.client.HTTPSConnection, float]]] = {}
+        self.lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        # Loading the trust store is the expensive part of a context, so it's done once
+        if self.ssl_context is None:
+            self.ssl_context = ssl.create_default_context()
+        return self.ssl_context
+
+    def get(self, host: str=None, connect_timeout: float=None, read_timeout: float=None) -> Tuple[http.client.HTTPSConnection, bool]:
+        """
+        Return an idle connection to the host, or a new one, and whether it was reused.
+        """
+        now = time.monotonic()
+        with self.lock:
+            idle = self.idle.get(host, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout and conn.sock is not None:
+                    self.connections_reused += 1
+                    conn.sock.settimeout(read_timeout)
+                    return conn, True
+                conn.close()
+            self.connections_opened += 1
+        conn = http.client.HTTPSConnection(host, timeout=connect_timeout, context=self._get_ssl_context())
+        conn.connect()
+        conn.sock.settimeout(read_timeout)
+        return conn, False
+
+    def put(self, host: str=None, conn: http.client.HTTPSConnection=None) -> None:
+        """
+        Return a connection whose response has been read in full so it can be reused.
+        """
+        with self.lock:
+            idle = self.idle.setdefault(host, [])
+            if conn.sock is None or len(idle) >= self.max_idle_per_host:
+                conn.close()
+                return
+            idle.append((conn, time.monotonic()))
+
+    def clear(self) -> None:
+        """
+        Close every idle connection.
+        """
+        with self.lock:
+            for idle in self.idle.values():
+                for conn, _ in idle:
+                    conn.close()
+            self.idle.clear()
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of making a request to a host that has been failing.
+    """
+
+class CircuitBreaker:
+    """
+    Tracks failing hosts so later requests, and later runs if the state is saved to a file, fail fast
+    instead of waiting on a host that is down. Once a host's cooldown passes, one request is let through
+    to see whether it has recovered, and the others keep failing fast until it reports back.
+    """
+    def __init__(self, path: str=None, threshold: int=BREAKER_THRESHOLD, cooldown: float=BREAKER_COOLDOWN, max_cooldown: float=BREAKER_MAX_COOLDOWN) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.lock = threading.Lock()
+        self.hosts: Dict[str, Dict[str, float]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """
+        Pick up the state saved by this and every other plugin sharing the file.
+        """
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r') as fh:
+                hosts = json.load(fh)
+            if isinstance(hosts, dict):
+                self.hosts = hosts
+        except (OSError, ValueError):
+            pass
+
+    def _update(self, host: str=None, state: Union[Dict[str, float], None]=None) -> None:
+        """
+        Set or, given None, drop one host's state and save it. The file is shared, so it is read again
+        first and only this host's entry is replaced, keeping whatever other runs recorded in the meantime.
+        """
+        self._load()
+        if state is None:
+            if self.hosts.pop(host, None) is None:
+                return
+        else:
+            self.hosts[host] = state
+        if not self.path:
+            return
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as fh:
+                json.dump(self.hosts, fh)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def open_until(self, host: str=None) -> Union[float, None]:
+        """
+        Return when the host's circuit closes again, or None if requests to it may go ahead. The first caller
+        after the cooldown gets None and is the probe: the circuit stays open for everyone else for another
+        cooldown, or until the probe's record_success() or record_failure().
+        """
+        with self.lock:
+            state = self.hosts.get(host)
+            if not state or state['failures'] < self.threshold:
+                return None
+            # Another run may have seen the host recover, or already be probing it
+            self._load()
+            state = self.hosts.get(host)
+            if not state or state['failures'] < self.threshold:
+                return None
+            now = time.time()
+            if now < state['open_until']:
+                return state['open_until']
+            self._update(host, dict(state, open_until=now + state['cooldown']))
+        return None
+
+    def record_success(self, host: str=None) -> None:
+        with self.lock:
+            self._update(host, None)
+
+    def record_failure(self, host: str=None) -> None:
+        with self.lock:
+            self._load()
+            state = dict(self.hosts.get(host) or {'failures': 0, 'cooldown': 0, 'open_until': 0})
+            state['failures'] += 1
+            if state['failures'] >= self.threshold:
+                state['cooldown'] = min(state['cooldown'] * 2 or self.cooldown, self.max_cooldown)
+                state['open_until'] = time.time() + state['cooldown']
+            self._update(host, state)
+
+class TransferStats:
+    """
+    Running totals of the response bodies this process received, as sent and after decompression.
+    """
+    def __init__(self) -> None:
+        self.requests = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, wire_bytes: int=0, decoded_bytes: int=0) -> None:
+        with self.lock:
+            self.requests += 1
+            self.wire_bytes += wire_bytes
+            self.decoded_bytes += decoded_bytes
+
+pool = ConnectionPool()
+transfer_stats = TransferStats()
+# Kept in memory unless a plugin calls enable_circuit_breaker()
+breaker = CircuitBreaker()
+# Plugins opt in to HTTP caching with enable_cache()
+default_cache = None
+
+def enable_circuit_breaker(path: str=None) -> CircuitBreaker:
+    """
+    Keep the circuit breaker's state in the given file so it carries over to later runs.
+    """
+    global breaker
+    breaker = CircuitBreaker(path)
+    return breaker
+
+def enable_cache(path: str=None, max_size: int=10 * 1024 * 1024) -> httpcache.HttpCache:
+    """
+    Cache GET responses in the given directory for every later swiftbar_request() call that doesn't pass cache=False.
+    """
+    global default_cache
+    default_cache = httpcache.HttpCache(path, max_size=max_size)
+    return default_cache
 
 def get_useragent() -> str:
     return 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'
@@ -31,9 +254,117 @@ def encode_query_string(query: Dict[str, str]=None) -> str:
         encoded_pairs.append(f"{encoded_key}={encoded_value}")
     return '&'.join(encoded_pairs)
 
-def swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET', headers: Optional[Dict[str, Any]]=None, query: Optional[Dict[str, Any]]=None, encode_query: bool=False, data: Optional[Dict[str, Any]]=None, return_type: str='text') -> Union[int, str, bytes, Dict, Any, None]:
+def _read_body(response: http.client.HTTPResponse=None) -> Tuple[bytearray, int]:
+    """
+    Read a response body a chunk at a time, undoing any gzip or deflate content encoding as it arrives.
+    Returns the decoded body and the number of bytes actually received.
+    """
+    encoding = (response.getheader('Content-Encoding') or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    else:
+        decompressor = None
+
+    body = bytearray()
+    wire_bytes = 0
+    while True:
+        chunk = response.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        wire_bytes += len(chunk)
+        if decompressor is None:
+            body += chunk
+            continue
+        try:
+            body += decompressor.decompress(chunk)
+        except zlib.error:
+            # "deflate" is supposed to be zlib-wrapped, but some servers send a raw deflate stream
+            if encoding != 'deflate' or wire_bytes != len(chunk):
+                raise
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            body += decompressor.decompress(chunk)
+    if decompressor is not None:
+        body += decompressor.flush()
+    transfer_stats.add(wire_bytes, len(body))
+    return body, wire_bytes
+
+def _send(host: str=None, method: str=None, path: str=None, headers: Dict[str, Any]=None, connect_timeout: float=None, timeout: float=None) -> Tuple[http.client.HTTPResponse, bytearray]:
+    """
+    Send a request over a pooled connection and read the whole response.
+    """
+    # A pooled connection may have been closed by the server while it sat idle. That only shows up
+    # once we use it, so try again on a fresh connection. Nothing has been processed by then.
+    while True:
+        conn, reused = pool.get(host, connect_timeout=connect_timeout, read_timeout=timeout)
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            content, _ = _read_body(response)
+        except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError, ssl.SSLError):
+            conn.close()
+            if reused:
+                continue
+            raise
+        except:
+            conn.close()
+            raise
+        break
+    if response.will_close:
+        conn.close()
+    else:
+        pool.put(host, conn)
+    return response, content
+
+def _backoff(attempt: int=0, response: Any=None) -> float:
+    # Jittered so plugins that failed together don't all come back at the same moment
+    wait = min(BACKOFF * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+    retry_after = response.getheader('Retry-After') if response is not None else None
+    if retry_after and retry_after.strip().isdigit():
+        wait = max(wait, min(float(retry_after), MAX_BACKOFF))
+    return wait
+
+def _send_with_retries(host: str=None, method: str=None, path: str=None, headers: Dict[str, Any]=None, connect_timeout: float=None, timeout: float=None, retries: int=RETRIES, deadline: float=None) -> Tuple[http.client.HTTPResponse, bytearray]:
+    """
+    Send a request, retrying idempotent ones after connection errors and temporary failures, without
+    going past the deadline (a time.monotonic() value). Raises the last error or returns the last response.
     """
-    Handle HTTP basic requests.
+    if method not in IDEMPOTENT_METHODS:
+        retries = 0
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f'{host}: no time left for the request')
+        try:
+            response, content = _send(
+                host, method, path, headers,
+                connect_timeout if remaining is None else min(connect_timeout, remaining),
+                timeout if remaining is None else min(timeout, remaining),
+            )
+        except (OSError, http.client.HTTPException):
+            if attempt >= retries:
+                raise
+            wait = _backoff(attempt)
+            if deadline is not None and time.monotonic() + wait >= deadline:
+                raise
+        else:
+            if response.status not in RETRY_STATUSES or attempt >= retries:
+                return response, content
+            wait = _backoff(attempt, response)
+            if deadline is not None and time.monotonic() + wait >= deadline:
+                return response, content
+        time.sleep(wait)
+        attempt += 1
+
+def swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET', headers: Optional[Dict[str, Any]]=None, query: Optional[Dict[str, Any]]=None, encode_query: bool=False, data: Optional[Dict[str, Any]]=None, return_type: str='text', timeout: Optional[float]=None, connect_timeout: Optional[float]=None, cache: Union[httpcache.HttpCache, bool, None]=None, retries: int=RETRIES, deadline: Optional[float]=DEADLINE) -> Union[int, str, bytes, Dict, Any, None]:
+    """
+    Handle HTTP basic requests. Connections are kept alive and reused through the module's pool. timeout
+    applies to each read, connect_timeout to establishing the connection, and deadline to the whole call,
+    including up to retries retries of an idempotent request. GET responses go through cache, or the cache
+    set up by enable_cache() unless cache is False. Requests to a host the circuit breaker has given up on
+    are answered from the cache, however stale, or raise CircuitOpenError.
     """
     # Add support for other methods
     response = None
@@ -45,23 +376,125 @@ def swiftbar_request(host: str=None, path: str='/', method: Optional[str]='GET',
             params_str = '&'.join([f'{k}={v}' for k, v in query.items()])
         path = '?'.join([path, params_str])
 
-    conn = http.client.HTTPSConnection(host)
-    if headers:
-        conn.request(method, path, headers=headers)
+    if connect_timeout is None:
+        connect_timeout = min(timeout, CONNECT_TIMEOUT) if timeout is not None else CONNECT_TIMEOUT
+    if timeout is None:
+        timeout = READ_TIMEOUT
+
+    if cache is None:
+        cache = default_cache
+    if method != 'GET':
+        cache = None
+    url = f'https://{host}{path}'
+    entry = cache.get(url, headers) if cache else None
+
+    if entry is not None and entry.is_fresh():
+        cache.hits += 1
+        response, content = httpcache.CachedResponse(entry), entry.body
     else:
-        conn.request(method, path)
-    response = conn.getresponse()
-    content = response.read()
-    
+        open_until = breaker.open_until(host)
+        if open_until is not None:
+            if entry is not None:
+                cache.stale += 1
+                return _decode(httpcache.CachedResponse(entry), entry.body, return_type)
+            raise CircuitOpenError(f'{host} has been failing, not trying again until {time.strftime("%H:%M:%S", time.localtime(open_until))}')
+
+        request_headers = dict(headers or {})
+        if not any(name.lower() == 'accept-encoding' for name in request_headers):
+            request_headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if entry is not None:
+            request_headers.update(cache.conditional_headers(entry))
+        try:
+            response, content = _send_with_retries(
+                host, method, path, request_headers, connect_timeout, timeout,
+                retries=retries,
+                deadline=time.monotonic() + deadline if deadline is not None else None,
+            )
+        except (OSError, http.client.HTTPException):
+            breaker.record_failure(host)
+            # Better an old answer than none
+            if entry is not None:
+                cache.stale += 1
+                return _decode(httpcache.CachedResponse(entry), entry.body, return_type)
+            raise
+        if response.status >= 500:
+            breaker.record_failure(host)
+            if entry is not None:
+                cache.stale += 1
+                return _decode(httpcache.CachedResponse(entry), entry.body, return_type)
+        else:
+            breaker.record_success(host)
+        if cache:
+            if response.status == 304 and entry is not None:
+                cache.revalidated += 1
+                entry = cache.update(entry, response)
+                response, content = httpcache.CachedResponse(entry), entry.body
+            else:
+                cache.misses += 1
+                cache.store(url, headers, response, content)
+
+    return _decode(response, content, return_type)
+
+def _decode(response: Any=None, content: Union[bytes, bytearray]=None, return_type: str='text') -> Tuple[Any, Any, Union[Exception, None]]:
     if return_type == 'text':
         return response, content.decode(), None
     elif return_type == 'binary':
-        return response, content, None
+        return response, bytes(content), None
     elif return_type == 'json':
         try:
-            json_body = json.loads(content.decode())
+            # json.loads() works out the encoding from the bytes itself, so there's no need for our own str copy
+            json_body = json.loads(content)
             return response, json_body, None
         except Exception as e:
             return response, None, e
     else:
         raise ValueError('Invalid return_type. Choose "json", "text", or "binary".')
+
+# One semaphore per host for each event loop that makes requests
+_host_semaphores: 'weakref.WeakKeyDictionary[Any, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+
+def _get_host_semaphore(host: str=None, limit: int=LIMIT_PER_HOST) -> Any:
+    import asyncio
+    semaphores = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(limit)
+    return semaphores[host]
+
+async def swiftbar_request_async(host: str=None, request_timeout: Optional[float]=None, limit_per_host: int=LIMIT_PER_HOST, **kwargs) -> Tuple[Any, Any, Union[Exception, None]]:
+    """
+    The asyncio counterpart of swiftbar_request(), taking the same arguments. At most limit_per_host
+    requests to a host run at once, and request_timeout bounds the whole request, waiting for a slot included.
+    The blocking request runs in a worker thread so it shares the connection pool and cache.
+    """
+    # asyncio takes longer to import than most plugins take to run, so only pay for it here
+    import asyncio
+    if request_timeout is not None:
+        # Let the socket and the retries give up too, so the worker thread doesn't outlive the request
+        kwargs['timeout'] = min(kwargs.get('timeout') or request_timeout, request_timeout)
+        kwargs['deadline'] = min(kwargs.get('deadline') or DEADLINE, request_timeout)
+
+    async def run() -> Tuple[Any, Any, Union[Exception, None]]:
+        async with _get_host_semaphore(host, limit_per_host):
+            return await asyncio.to_thread(swiftbar_request, host=host, **kwargs)
+
+    return await asyncio.wait_for(run(), request_timeout)
+
+def gather(requests: Dict[str, Dict[str, Any]]=None, request_timeout: Optional[float]=None, limit_per_host: int=LIMIT_PER_HOST) -> Dict[str, Tuple[Any, Any, Union[Exception, None]]]:
+    """
+    Run several swiftbar_request() calls at once and return their results by name. requests maps a name
+    to the call's keyword arguments. A request that raises or times out gets (None, None, exception).
+    """
+    import asyncio
+
+    async def run_all() -> List[Any]:
+        return await asyncio.gather(
+            *(swiftbar_request_async(request_timeout=request_timeout, limit_per_host=limit_per_host, **kwargs) for kwargs in requests.values()),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run_all())
+    return {
+        name: (None, None, result) if isinstance(result, BaseException) else result
+        for name, result in zip(requests, results)
+    }
+
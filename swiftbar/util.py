@@ -1,15 +1,22 @@
 from collections import namedtuple
 from pprint import pprint as pp
 from swiftbar import request
-from typing import Any, Dict, List, NamedTuple, Optional, Union
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 import datetime
 import dateutil
 import getpass
+import http.client
+import json
+import os
 import platform
 import re
+import shlex
 import shutil
 import signal
+import socket
 import subprocess
+import tempfile
+import threading
 import time
 
 class GeoData(NamedTuple):
@@ -107,44 +114,245 @@ def pprint(input: Any=None):
     pp(input)
     print()
 
-def execute_command(command: str=None, input: Optional[Any]=None):
+def parse_pipeline(command: str=None) -> List[List[str]]:
     """
-    Execute a system command, returning exit code, stdout, and stderr.
+    Split a command string into a list of argv lists, one per pipeline stage. Quoted pipes are left alone.
     """
-    for command in re.split(r'\s*\|\s*', command):
-        p = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate(input=input.encode('utf-8') if input else None)
-        stdout = stdout.decode('utf-8').strip()
-        stderr = stderr.decode('utf-8').strip()
-        if stdout:
-            input = stdout
-    return p.returncode, stdout, stderr
+    lexer = shlex.shlex(command, posix=True, punctuation_chars='|')
+    lexer.whitespace_split = True
+    stages: List[List[str]] = [[]]
+    for token in lexer:
+        if token == '|':
+            stages.append([])
+        else:
+            stages[-1].append(token)
+    return [stage for stage in stages if stage]
+
+def _get_line_filter(argv: List[str]=None) -> Union[Callable[[List[str]], List[str]], None]:
+    """
+    Return an in-process replacement for trivial head/tail stages, or None if the stage needs a real process.
+    """
+    if len(argv) not in (2, 3) or argv[0] not in ('head', 'tail'):
+        return None
+    match = re.match(r'^-n\s*(\+?)(\d+)$', ' '.join(argv[1:]))
+    if not match:
+        return None
+    from_start = match.group(1) == '+'
+    count = int(match.group(2))
+    if argv[0] == 'head':
+        return None if from_start else lambda lines: lines[:count]
+    elif from_start:
+        return lambda lines: lines[max(count - 1, 0):]
+    return lambda lines: lines[-count:] if count > 0 else []
+
+def execute_command(command: Union[str, List[str], List[List[str]]]=None, input: Optional[Any]=None, timeout: Optional[float]=None) -> Tuple[int, str, str]:
+    """
+    Execute a system command, returning exit code, stdout, and stderr. The command can be a string, an argv list,
+    or a list of argv lists for a pipeline. No shell is involved. Pipeline stages run at the same time, connected
+    by OS pipes, and trailing "head -n N"/"tail -n +N" stages are applied in-process. If timeout is exceeded,
+    every stage is killed.
+    """
+    if isinstance(command, str):
+        stages = parse_pipeline(command)
+    elif command and isinstance(command[0], str):
+        stages = [command]
+    else:
+        stages = command
+
+    line_filters = []
+    while len(stages) > 1 and _get_line_filter(stages[-1]):
+        line_filters.insert(0, _get_line_filter(stages[-1]))
+        stages = stages[:-1]
+
+    processes: List[subprocess.Popen] = []
+    stderr_files = []
+    try:
+        for i, argv in enumerate(stages):
+            last = i == len(stages) - 1
+            if i > 0:
+                stdin = processes[-1].stdout
+            else:
+                stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+            stderr = subprocess.PIPE if last else tempfile.TemporaryFile()
+            if not last:
+                stderr_files.append(stderr)
+            processes.append(subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr))
+            if i > 0:
+                # Only the next stage should hold the read end, so SIGPIPE works
+                processes[-2].stdout.close()
+    except OSError as e:
+        for process in processes:
+            process.kill()
+            process.wait()
+        for stderr_file in stderr_files:
+            stderr_file.close()
+        return 127, '', f'{argv[0]}: {e.strerror}'
+
+    first, last = processes[0], processes[-1]
+    input_bytes = input.encode('utf-8') if isinstance(input, str) else input
+    if input is not None and first is not last:
+        def feed() -> None:
+            try:
+                first.stdin.write(input_bytes)
+                first.stdin.close()
+            except BrokenPipeError:
+                pass
+        threading.Thread(target=feed, daemon=True).start()
+        input_bytes = None
+
+    # One deadline covers every stage; an earlier stage can outlive the last one, as in "sleep 5 | true"
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    remaining = lambda: None if deadline is None else max(deadline - time.monotonic(), 0)
+    timed_out = False
+    stdout = stderr = None
+    try:
+        stdout, stderr = last.communicate(input=input_bytes, timeout=remaining())
+        for process in processes[:-1]:
+            process.wait(timeout=remaining())
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        for process in processes:
+            process.kill()
+        if stdout is None:
+            stdout, stderr = last.communicate()
+        for process in processes:
+            process.wait()
+
+    stderr_parts = []
+    for stderr_file in stderr_files:
+        stderr_file.seek(0)
+        stderr_parts.append(stderr_file.read().decode('utf-8').strip())
+        stderr_file.close()
+    stderr_parts.append(stderr.decode('utf-8').strip())
+    if timed_out:
+        stderr_parts.append(f'Timed out after {timeout} seconds')
+
+    stdout = stdout.decode('utf-8')
+    if line_filters:
+        lines = stdout.splitlines()
+        for line_filter in line_filters:
+            lines = line_filter(lines)
+        stdout = '\n'.join(lines)
+    returncode = -signal.SIGKILL if timed_out else last.returncode
+    return returncode, stdout.strip(), '\n'.join(part for part in stderr_parts if part)
+
+def execute_commands(commands: Dict[str, Union[str, List[str], List[List[str]]]]=None, max_workers: int=4, timeout: Optional[float]=None) -> Dict[str, Tuple[int, str, str]]:
+    """
+    Execute a set of independent, named commands concurrently on at most max_workers threads, returning
+    the execute_command() results keyed by name. timeout is a deadline for the whole batch; anything still
+    running when it passes is killed and anything not yet started is skipped.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    pending = list(commands.items())
+    results: Dict[str, Tuple[int, str, str]] = {}
+    lock = threading.Lock()
+
+    # concurrent.futures would pull in logging, which costs more to import than these commands take to run
+    def worker() -> None:
+        while True:
+            with lock:
+                if not pending:
+                    return
+                name, command = pending.pop(0)
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                result = (-signal.SIGKILL, '', f'Timed out after {timeout} seconds')
+            else:
+                result = execute_command(command, timeout=remaining)
+            with lock:
+                results[name] = result
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(max_workers, len(pending)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: results[name] for name in commands}
 
 def brew_package_installed(package: str=None) -> bool:
     """
     Check if thes upplied homebrew package is installed.
     """
-    returncode, stdout, stderr = execute_command(f'brew list {package}')
+    returncode, stdout, stderr = execute_command(['brew', 'list', package])
     return True if returncode == 0 else False
 
-def geolocate_me() -> Union[Dict, None]:
+def get_public_ip(timeout: float=None) -> Union[str, None]:
     """
-    Attempt to geolocate you based on your public IP address.
+    Look up our public IP address, returning None if the lookup fails.
     """
+    # ifconfig.io only answers with plain text when it thinks it's talking to curl
     headers = {'User-Agent': 'curl/8.7.1'}
-    response, data, error = request.swiftbar_request(host='ifconfig.io', headers=headers)
-    if response.status == 200 and data:
-        address = data.strip()
-    else:
+    try:
+        # Callers fall back to a cached address, so a quick failure beats retrying
+        response, data, _ = request.swiftbar_request(host='ifconfig.io', headers=headers, timeout=timeout, retries=0, deadline=timeout)
+    except (OSError, http.client.HTTPException, UnicodeDecodeError):
         return None
-    
-    response, geodata, _ = request.swiftbar_request(host='ipinfo.io', path=f'/{address}/json', return_type='json')
-    if response.status != 200:
-        return None, {}, 'Failed to geolocate'
-    
+    if response.status == 200 and data and data.strip():
+        return data.strip()
+    return None
+
+def get_default_route_address() -> Union[str, None]:
+    """
+    Return the local address the default route would use, without sending anything.
+    """
+    # Connecting a UDP socket only picks a route, so this works offline and doesn't need netstat
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('8.8.8.8', 53))
+            return sock.getsockname()[0]
+    except OSError:
+        return None
+
+def _read_geolocation_cache(path: str=None) -> Union[Dict[str, Any], None]:
+    try:
+        with open(path, 'r') as fh:
+            cached = json.load(fh)
+        cached['geodata'] = GeoData(**cached['geodata'])
+        cached['checked'] = float(cached['checked'])
+        return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _write_geolocation_cache(path: str=None, geodata: GeoData=None, route: Union[str, None]=None) -> None:
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as fh:
+            json.dump({'geodata': geodata._asdict(), 'route': route, 'checked': time.time()}, fh)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+def geolocate_me(cache_dir: str=None, max_age: float=3600, timeout: float=5) -> Union[GeoData, None]:
+    """
+    Attempt to geolocate you based on your public IP address. With a cache_dir, the result is shared
+    with other plugins through geolocation.json and trusted for max_age seconds, or until the default
+    route changes. After that the public IP is checked again and ipinfo.io is only asked if it changed.
+    If the lookup fails, the cached location is returned.
+    """
+    cache_path = os.path.join(cache_dir, 'geolocation.json') if cache_dir else None
+    cached = _read_geolocation_cache(cache_path) if cache_path else None
+    route = get_default_route_address()
+    if cached and cached['route'] == route and 0 <= time.time() - cached['checked'] <= max_age:
+        return cached['geodata']
+
+    cached_geodata = cached['geodata'] if cached else None
+    address = get_public_ip(timeout=timeout)
+    if not address:
+        return cached_geodata
+    if cached_geodata and cached_geodata.IP == address:
+        _write_geolocation_cache(cache_path, cached_geodata, route)
+        return cached_geodata
+
+    try:
+        response, geodata, _ = request.swiftbar_request(host='ipinfo.io', path=f'/{address}/json', return_type='json', timeout=timeout)
+    except (OSError, http.client.HTTPException, UnicodeDecodeError):
+        return cached_geodata
+    if response.status != 200 or not isinstance(geodata, dict):
+        return cached_geodata
+
     try:
         lat, lon = re.split(r'\s*,\s*', geodata['loc'])
-        return GeoData(
+        geodata = GeoData(
             City=geodata['city'],
             Country=geodata['country'],
             IP=geodata['ip'],
@@ -154,8 +362,11 @@ def geolocate_me() -> Union[Dict, None]:
             Region=geodata['region'],
             Timezone=geodata['timezone']
         )
-    except:
-        return None
+    except (KeyError, TypeError, ValueError):
+        return cached_geodata
+    if cache_path:
+        _write_geolocation_cache(cache_path, geodata, route)
+    return geodata
 
 def binary_exists(binary: str=None) -> bool:
     return shutil.which(binary) is not None
@@ -241,13 +452,49 @@ def get_process_icon(process_owner: str=None, click_to_kill: bool=False) -> str:
     else:
         return ''
 
+def parse_sysctl_output(output: str=None, keys: List[str]=None) -> Dict[str, Union[str, None]]:
+    """
+    Parse the output of "sysctl key1 key2 ..." into a dict of key -> raw value. macOS separates the key and
+    value with ": ", Linux with " = ". Lines that don't look like "key: value" are treated as continuations of
+    the previous value. Keys sysctl didn't know about map to None.
+    """
+    values: Dict[str, Union[str, None]] = {key: None for key in keys}
+    current = None
+    for line in output.splitlines():
+        match = re.match(r'^([A-Za-z0-9_.\-]+)(?::| =)(?:\s|$)(.*)$', line)
+        if match:
+            current = match.group(1) if match.group(1) in values else None
+            if current is not None:
+                values[current] = match.group(2).strip()
+        elif current is not None and line.strip():
+            values[current] = f'{values[current]}\n{line.strip()}'
+    return values
+
+def coerce_sysctl_value(value: Union[str, None]=None) -> Union[int, str, None]:
+    """
+    Convert a raw sysctl value to an int if it is one, otherwise leave it as a string.
+    """
+    if value is not None and re.match(r'^-?\d+$', value):
+        return int(value)
+    return value
+
+def get_sysctls(keys: List[str]=None, typed: bool=True) -> Dict[str, Union[int, str, None]]:
+    """
+    Fetch any number of sysctl keys with a single sysctl invocation. Integer values are returned as ints
+    unless typed is False. Unknown keys map to None.
+    """
+    if not keys:
+        return {}
+    # sysctl exits non-zero if any key is unknown but still prints the ones it found
+    _, stdout, _ = execute_command(['sysctl'] + list(keys))
+    values = parse_sysctl_output(stdout, keys)
+    return {key: coerce_sysctl_value(value) for key, value in values.items()} if typed else values
+
 def get_sysctl(metric: str=None) -> Union[str, None]:
     """
-    Execute sysctl via execute_command() and return the results or None.
+    Fetch a single sysctl key via get_sysctls() and return its raw value or None.
     """
-    command = f'sysctl -n {metric}'
-    returncode, stdout, _ = execute_command(command)
-    return stdout if returncode == 0 else None
+    return get_sysctls([metric], typed=False)[metric]
 
 def byte_converter(bytes: int=0, unit: str=None) -> str:
     """
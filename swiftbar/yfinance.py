@@ -1,9 +1,44 @@
-from swiftbar import util, request
-from typing import Any, Dict, List, Union
+from datetime import datetime, timedelta, timezone
+from swiftbar import history, util, request
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import http.client
+import json
+import os
+import re
 import time
 
 # https://financeapi.net/
 
+# How long a cookie and crumb are reused before asking Yahoo! for new ones
+SESSION_MAX_AGE = 86400
+
+# The most symbols asked for in one /v7/finance/quote request
+QUOTE_BATCH_SIZE = 50
+
+# The most symbols asked for in one /v7/finance/spark request
+SPARK_BATCH_SIZE = 20
+
+# Company profiles and key statistics change slowly, so cached quote summaries are trusted for this long
+QUOTE_SUMMARY_MAX_AGE = 6 * 3600
+
+# Quotes can lag the exchange, so a session is treated as running this much longer than its
+# published hours, and a session we looked at this long after it opened without seeing a trade was a holiday
+MARKET_DATA_DELAY = 20 * 60
+
+# With no fetch in this long, MarketCalendar stops projecting sessions and just asks for a refresh
+MAX_PROJECTION = 14 * 86400
+
+# Intraday bars kept by the price stores: their size, how far back an empty store is filled from, and
+# the gap between bars that marks the start of a new trading day
+PRICE_BAR_INTERVAL = '5m'
+PRICE_BAR_SECONDS = 300
+PRICE_BACKFILL = 5 * 86400
+SESSION_GAP = 4 * 3600
+
+# Where get_cookie_and_crumb() keeps them, once it has been given a cache_dir
+_session_path = None
+
 def _get_valid_ranges() -> List[str]:
     return ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max']
 
@@ -16,28 +51,119 @@ def _get_valid_regions() -> List[str]:
 def _get_valid_quote_summary_modules() -> List[str]:
     return ['assetProfile', 'balanceSheetHistory', 'balanceSheetHistory', 'balanceSheetHistoryQuarterly', 'calendarEvents', 'cashflowStatementHistory', 'cashflowStatementHistory', 'cashflowStatementHistoryQuarterly', 'defaultKeyStatistics', 'earnings', 'earningsHistory', 'earningsTrend', 'esgScores', 'financialData', 'fundOwnership', 'fundProfile', 'incomeStatementHistory', 'incomeStatementHistoryQuarterly', 'indexTrend', 'insiderHolders', 'insiderTransactions', 'institutionOwnership', 'majorDirectHolders', 'majorHoldersBreakdown', 'netSharePurchaseActivity', 'price', 'quoteType', 'recommendationTrend', 'secFilings', 'sectorTrend', 'summaryDetail', 'upgradeDowngradeHistory']
 
-def get_cookie_and_crumb():
-    response, _, _ = request.swiftbar_request(
-        host='fc.yahoo.com',
-    )
-    cookie = next((h[1] for h in response.headers.items() if h[0] == 'Set-Cookie'), None)
-    if not cookie:
-        return None, None
+def _fetch_cookie_and_crumb() -> Tuple[Union[str, None], Union[str, None]]:
+    # Neither response is cached, so there's no stale copy to fall back on when Yahoo! is unreachable
+    # or the circuit breaker has given up on it (CircuitOpenError is an OSError)
+    try:
+        # We're after the Set-Cookie header, which is never cached, so don't bother looking
+        response, _, _ = request.swiftbar_request(
+            host='fc.yahoo.com',
+            cache=False,
+        )
+        cookie = next((h[1] for h in response.headers.items() if h[0] == 'Set-Cookie'), None)
+        if not cookie:
+            return None, None
 
-    response, crumb, err = request.swiftbar_request(
-        host='query2.finance.yahoo.com',
-        path='/v1/test/getcrumb',
-        headers={'Cookie': cookie, 'User-Agent': request.get_useragent()},
-        return_type='text',
-    )
+        response, crumb, err = request.swiftbar_request(
+            host='query2.finance.yahoo.com',
+            path='/v1/test/getcrumb',
+            headers={'Cookie': cookie, 'User-Agent': request.get_useragent()},
+            return_type='text',
+            cache=False,
+        )
+    except (OSError, http.client.HTTPException):
+        return None, None
     if response.status == 200 and crumb:
         return cookie, crumb
     else:
         return None, None
 
+def _read_json(path: str=None) -> Any:
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path: str=None, value: Any=None) -> None:
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as fh:
+            json.dump(value, fh)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+def _read_session(path: str=None) -> Union[Dict[str, Any], None]:
+    session = _read_json(path)
+    try:
+        if session['cookie'] and session['crumb'] and time.time() < float(session['expires']):
+            return session
+    except (KeyError, TypeError, ValueError):
+        pass
+    return None
+
+def _write_session(path: str=None, cookie: str=None, crumb: str=None, max_age: float=SESSION_MAX_AGE) -> None:
+    # Don't outlive the cookie itself
+    match = re.search(r'max-age=(\d+)', cookie, re.IGNORECASE)
+    if match:
+        max_age = min(max_age, int(match.group(1)))
+    _write_json(path, {'cookie': cookie, 'crumb': crumb, 'expires': time.time() + max_age})
+
+def get_cookie_and_crumb(cache_dir: str=None, max_age: float=SESSION_MAX_AGE, refresh: bool=False) -> Tuple[Union[str, None], Union[str, None]]:
+    """
+    Return a Yahoo! Finance cookie and crumb. With a cache_dir, they are shared with other plugins through
+    yahoo-finance-session.json and reused for up to max_age seconds, or until a data request is refused
+    with a 401 or 403, when they are fetched again and the request is retried once.
+    """
+    global _session_path
+    if cache_dir:
+        _session_path = os.path.join(cache_dir, 'yahoo-finance-session.json')
+    if _session_path and not refresh:
+        session = _read_session(_session_path)
+        if session:
+            return session['cookie'], session['crumb']
+
+    cookie, crumb = _fetch_cookie_and_crumb()
+    if cookie and crumb and _session_path:
+        _write_session(_session_path, cookie, crumb, max_age)
+    return cookie, crumb
+
+def _with_credentials(kwargs: Dict[str, Any]=None, cookie: str=None, crumb: str=None) -> Dict[str, Any]:
+    kwargs = dict(kwargs)
+    kwargs['headers'] = {**kwargs.get('headers', {}), 'Cookie': cookie}
+    kwargs['query'] = {**kwargs.get('query', {}), 'crumb': crumb}
+    return kwargs
+
+def _is_rejected(response: Any=None) -> bool:
+    return response is not None and response.status in (401, 403)
+
+def _request(**kwargs) -> Tuple[Any, Any, Union[Exception, None]]:
+    """
+    Make a data request, getting a new cookie and crumb and trying once more if Yahoo! rejects the old ones.
+    """
+    response, output, err = request.swiftbar_request(**kwargs)
+    if _is_rejected(response):
+        cookie, crumb = get_cookie_and_crumb(refresh=True)
+        if cookie and crumb:
+            response, output, err = request.swiftbar_request(**_with_credentials(kwargs, cookie, crumb))
+    return response, output, err
+
+def _gather(requests: Dict[str, Dict[str, Any]]=None) -> Dict[str, Tuple[Any, Any, Union[Exception, None]]]:
+    """
+    The request.gather() counterpart of _request(). The cookie and crumb are only fetched again once, however many requests were rejected.
+    """
+    results = request.gather(requests)
+    rejected = [name for name, (response, _, _) in results.items() if _is_rejected(response)]
+    if rejected:
+        cookie, crumb = get_cookie_and_crumb(refresh=True)
+        if cookie and crumb:
+            results.update(request.gather({name: _with_credentials(requests[name], cookie, crumb) for name in rejected}))
+    return results
+
 def get_options(crumb: str=None, cookie: str=None, symbol: str=None, date:int =int(time.time())):
     headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output, _ = _request(
         host='query2.finance.yahoo.com',
         path=f'/v7/finance/options/{symbol}',
         query={
@@ -52,31 +178,57 @@ def get_options(crumb: str=None, cookie: str=None, symbol: str=None, date:int =i
     else:
         return None
 
-def get_spark_data(crumb: str=None, cookie: str=None, symbols: List[str]=None, interval:str = '1d', range: str='1d'):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
-        host='query1.finance.yahoo.com',
-        path=f'/v7/finance/spark',
-        query={
+def _batches(items: List[str]=None, size: int=None) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _spark_request(crumb: str=None, cookie: str=None, symbols: List[str]=None, interval: str='1d', range: str='1d') -> Dict[str, Any]:
+    return {
+        'host': 'query1.finance.yahoo.com',
+        'path': '/v7/finance/spark',
+        'query': {
             'crumb': crumb,
             'interval': interval,
             'range': range,
             'symbols': ','.join(symbols),
         },
-        headers=headers,
-        return_type='json',
-    )
+        'headers': {'Cookie': cookie, 'User-Agent': request.get_useragent()},
+        'return_type': 'json',
+    }
+
+def get_spark_data(crumb: str=None, cookie: str=None, symbols: List[str]=None, interval:str = '1d', range: str='1d'):
+    response, output, _ = _request(**_spark_request(crumb=crumb, cookie=cookie, symbols=symbols, interval=interval, range=range))
     if response.status == 200 and output:
         return output
     else:
         return None
 
-def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
-        host='query2.finance.yahoo.com',
-        path=f'/v10/finance/quoteSummary/{symbol}',
-        query={
+def get_sparks(crumb: str=None, cookie: str=None, symbols: List[str]=None, interval: str='1d', range: str='1d', batch_size: int=SPARK_BATCH_SIZE) -> Dict[str, Union[Dict[str, Any], None]]:
+    """
+    Fetch the spark data for many symbols, batch_size symbols to a request, with the batches made at once.
+    Each symbol maps to its chart, with the same meta, timestamp, and indicators as get_chart() returns,
+    or None if Yahoo! had nothing for it.
+    """
+    batches = _batches(symbols, batch_size)
+    results = _gather({
+        f'batch{i}': _spark_request(crumb=crumb, cookie=cookie, symbols=batch, interval=interval, range=range)
+        for i, batch in enumerate(batches)
+    })
+    sparks = {symbol: None for symbol in symbols}
+    by_upper = {symbol.upper(): symbol for symbol in symbols}
+    for response, output, _ in results.values():
+        if response is None or response.status != 200 or not output:
+            continue
+        for result in (output.get('spark') or {}).get('result') or []:
+            symbol = by_upper.get(str(result.get('symbol', '')).upper())
+            if symbol is not None and result.get('response'):
+                sparks[symbol] = result['response'][0]
+    return sparks
+
+def _quote_summary_request(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None) -> Dict[str, Any]:
+    return {
+        'host': 'query2.finance.yahoo.com',
+        'path': f'/v10/finance/quoteSummary/{symbol}',
+        'query': {
             'corsDomain': 'finance.yahoo.com',
             'crumb': crumb,
             'formatted': False,
@@ -85,47 +237,158 @@ def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang:
             'region': region,
             'symbol': symbol,
         },
-        headers=headers,
-        return_type='json',
-    )                
-    if response.status == 200 and output:
+        'headers': {'Cookie': cookie, 'User-Agent': request.get_useragent()},
+        'return_type': 'json',
+    }
+
+def _parse_quote_summary(response: Any=None, output: Any=None, modules: List[str]=None) -> Union[Dict[str, Any], None]:
+    if response is not None and response.status == 200 and output:
         info = output['quoteSummary']['result'][0]
         company_data = {}
         for module in modules:
-            for k, v in info[module].items():
+            for k, v in info.get(module, {}).items():
                 company_data[k] = v
         return company_data
     else:
         return None
 
-def get_chart(crumb: str=None, cookie: str=None, ticker: str=None, interval:str = '1d', range: str='1d', lang: str='en', region: str='US', comparisons: List[str]=[]):
-    headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
-        host='query2.finance.yahoo.com',
-        path=f'/v8/finance/chart/{ticker}',
-        query={
-            'comparisons': ','.join(comparisons),
+def get_quote_summary(crumb: str=None, cookie: str=None, symbol: str=None, lang: str='en', region: str='US', modules: List[str]=None):
+    response, output, _ = _request(**_quote_summary_request(crumb=crumb, cookie=cookie, symbol=symbol, lang=lang, region=region, modules=modules))
+    return _parse_quote_summary(response, output, modules)
+
+def _quote_summary_cache_path(cache_dir: str=None) -> Union[str, None]:
+    return os.path.join(cache_dir, 'yahoo-finance-quote-summaries.json') if cache_dir else None
+
+def _quote_summary_key(symbol: str=None, modules: List[str]=None) -> str:
+    return f'{symbol}:{",".join(sorted(modules))}'
+
+def _is_current(entry: Any=None, now: float=None, max_age: float=None) -> bool:
+    return isinstance(entry, dict) and 0 <= now - entry.get('saved', 0) <= max_age
+
+def get_cached_quote_summaries(symbols: List[str]=None, modules: List[str]=None, cache_dir: str=None, max_age: float=QUOTE_SUMMARY_MAX_AGE) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the quote summaries get_quote_summaries() cached in cache_dir that are at most max_age seconds old,
+    without making any requests. Symbols with no such summary are left out.
+    """
+    cached = _read_json(_quote_summary_cache_path(cache_dir)) if cache_dir else None
+    if not isinstance(cached, dict):
+        return {}
+    now = time.time()
+    summaries = {}
+    for symbol in symbols:
+        entry = cached.get(_quote_summary_key(symbol, modules))
+        if _is_current(entry, now, max_age):
+            summaries[symbol] = entry['data']
+    return summaries
+
+def get_quote_summaries(crumb: str=None, cookie: str=None, symbols: List[str]=None, lang: str='en', region: str='US', modules: List[str]=None, cache_dir: str=None, max_age: float=QUOTE_SUMMARY_MAX_AGE) -> Dict[str, Union[Dict[str, Any], None]]:
+    """
+    Fetch the quote summaries for several symbols at once. With a cache_dir, summaries are kept in
+    yahoo-finance-quote-summaries.json and only fetched again once they are max_age seconds old.
+    """
+    summaries = get_cached_quote_summaries(symbols=symbols, modules=modules, cache_dir=cache_dir, max_age=max_age)
+    missing = [symbol for symbol in symbols if symbol not in summaries]
+    if missing:
+        cache_path = _quote_summary_cache_path(cache_dir)
+        cached = (_read_json(cache_path) if cache_path else None) or {}
+        now = time.time()
+        results = _gather({
+            symbol: _quote_summary_request(crumb=crumb, cookie=cookie, symbol=symbol, lang=lang, region=region, modules=modules)
+            for symbol in missing
+        })
+        for symbol, (response, output, _) in results.items():
+            summaries[symbol] = _parse_quote_summary(response, output, modules)
+            if summaries[symbol] is not None:
+                cached[_quote_summary_key(symbol, modules)] = {'saved': now, 'data': summaries[symbol]}
+        if cache_path:
+            _write_json(cache_path, {key: entry for key, entry in cached.items() if _is_current(entry, now, max_age)})
+    return {symbol: summaries[symbol] for symbol in symbols}
+
+def _quote_request(crumb: str=None, cookie: str=None, symbols: List[str]=None, lang: str='en', region: str='US') -> Dict[str, Any]:
+    return {
+        'host': 'query2.finance.yahoo.com',
+        'path': '/v7/finance/quote',
+        'query': {
             'crumb': crumb,
-            'events': 'div,splits,capitalGains',
-            'includePrePost': False,
-            'interval': interval,
             'lang': lang,
-            'range': range,
             'region': region,
+            'symbols': ','.join(symbols),
         },
-        headers=headers,
-        return_type='json',
-    )                
+        'headers': {'Cookie': cookie, 'User-Agent': request.get_useragent()},
+        'return_type': 'json',
+    }
+
+def get_quotes(crumb: str=None, cookie: str=None, symbols: List[str]=None, lang: str='en', region: str='US', batch_size: int=QUOTE_BATCH_SIZE) -> Dict[str, Union[Dict[str, Any], None]]:
+    """
+    Fetch the price quotes for many symbols, batch_size symbols to a request, with the batches made at once.
+    Symbols Yahoo! has no quote for map to None.
+    """
+    batches = _batches(symbols, batch_size)
+    results = _gather({
+        f'batch{i}': _quote_request(crumb=crumb, cookie=cookie, symbols=batch, lang=lang, region=region)
+        for i, batch in enumerate(batches)
+    })
+    quotes = {symbol: None for symbol in symbols}
+    # Yahoo! answers with the canonical, upper case symbol
+    by_upper = {symbol.upper(): symbol for symbol in symbols}
+    for response, output, _ in results.values():
+        if response is None or response.status != 200 or not output:
+            continue
+        for quote in (output.get('quoteResponse') or {}).get('result') or []:
+            symbol = by_upper.get(str(quote.get('symbol', '')).upper())
+            if symbol is not None:
+                quotes[symbol] = quote
+    return quotes
+
+def _chart_request(crumb: str=None, cookie: str=None, ticker: str=None, interval:str = '1d', range: str='1d', lang: str='en', region: str='US', comparisons: List[str]=[], start: int=None, end: int=None) -> Dict[str, Any]:
+    query = {
+        'comparisons': ','.join(comparisons),
+        'crumb': crumb,
+        'events': 'div,splits,capitalGains',
+        'includePrePost': False,
+        'interval': interval,
+        'lang': lang,
+        'range': range,
+        'region': region,
+    }
+    # An explicit period replaces the range
+    if start is not None:
+        del query['range']
+        query['period1'] = int(start)
+        query['period2'] = int(end or time.time())
+    return {
+        'host': 'query2.finance.yahoo.com',
+        'path': f'/v8/finance/chart/{ticker}',
+        'query': query,
+        'headers': {'Cookie': cookie, 'User-Agent': request.get_useragent()},
+        'return_type': 'json',
+    }
+
+def get_chart(crumb: str=None, cookie: str=None, ticker: str=None, interval:str = '1d', range: str='1d', lang: str='en', region: str='US', comparisons: List[str]=[]):
+    response, output, _ = _request(**_chart_request(crumb=crumb, cookie=cookie, ticker=ticker, interval=interval, range=range, lang=lang, region=region, comparisons=comparisons))
     if response.status == 200 and output:
         return output
     else:
         return None
+
+def get_charts(crumb: str=None, cookie: str=None, tickers: List[str]=None, interval:str = '1d', range: str='1d', lang: str='en', region: str='US') -> Dict[str, Any]:
+    """
+    Fetch the charts for several tickers at once.
+    """
+    results = _gather({
+        ticker: _chart_request(crumb=crumb, cookie=cookie, ticker=ticker, interval=interval, range=range, lang=lang, region=region)
+        for ticker in tickers
+    })
+    return {
+        ticker: output if response is not None and response.status == 200 and output else None
+        for ticker, (response, output, _) in results.items()
+    }
     
 # /v6/finance/recommendationsbysymbol/{symbol}
 
 def get_market_summary(crumb: str=None, cookie: str=None, lang: str='en', region: str='US'):
     headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output, _ = _request(
         host='query2.finance.yahoo.com',
         path=f'/v6/finance/quote/marketSummary',
         query={
@@ -143,7 +406,7 @@ def get_market_summary(crumb: str=None, cookie: str=None, lang: str='en', region
 
 def get_trending(crumb: str=None, cookie: str=None, region: str='US'):
     headers = {'Cookie': cookie, 'User-Agent': request.get_useragent()}
-    response, output, _ = request.swiftbar_request(
+    response, output, _ = _request(
         host='query1.finance.yahoo.com',
         path=f'/v1/finance/trending/{region}',
         query={
@@ -156,3 +419,197 @@ def get_trending(crumb: str=None, cookie: str=None, region: str='US'):
         return output
     else:
         return None
+
+class PriceStats(NamedTuple):
+    day_low: float
+    day_high: float
+    vwap: Union[float, None]
+    moving_averages: Dict[int, float]
+    high: float
+    from_high: float
+
+def open_price_store(plugin: Any=None, symbol: str=None, capacity: int=1024) -> history.RingBuffer:
+    """
+    Return the intraday bars kept for a symbol in the plugin's config directory, each a record of
+    timestamp, open, high, low, close, and volume.
+    """
+    return plugin.open_history('prices-' + re.sub(r'[^A-Za-z0-9.-]', '_', symbol), width=6, capacity=capacity)
+
+def merge_chart(store: history.RingBuffer=None, chart: Dict[str, Any]=None, interval_seconds: int=PRICE_BAR_SECONDS, now: float=None) -> int:
+    """
+    Append the complete bars in a chart response that are newer than the newest one in the store,
+    and return how many there were. The bar still being traded is left for the next update.
+    """
+    now = now or time.time()
+    result = chart['chart']['result'][0]
+    quote = result['indicators']['quote'][0]
+    newest = store.last()[0] if len(store) else 0
+    bars = []
+    for i, timestamp in enumerate(result.get('timestamp') or []):
+        if timestamp <= newest or timestamp + interval_seconds > now:
+            continue
+        bar = [quote['open'][i], quote['high'][i], quote['low'][i], quote['close'][i]]
+        if None in bar:
+            continue
+        bars.append([timestamp] + bar + [quote['volume'][i] or 0])
+        newest = timestamp
+    store.extend(bars)
+    return len(bars)
+
+def update_price_stores(crumb: str=None, cookie: str=None, stores: Dict[str, history.RingBuffer]=None, interval: str=PRICE_BAR_INTERVAL, backfill: float=PRICE_BACKFILL) -> Dict[str, int]:
+    """
+    Bring each symbol's store up to date with one chart request per symbol, made at once. Each request only
+    asks for the bars after the newest one stored, and never for more than the last backfill seconds.
+    Returns how many bars each store gained.
+    """
+    now = time.time()
+    requests = {}
+    for symbol, store in stores.items():
+        # A store left unused for longer than backfill only asks for the backfill window. Yahoo! serves 5m bars
+        # for about the last 60 days and refuses ranges that start earlier
+        start = max(store.last()[0] + 1, now - backfill) if len(store) else now - backfill
+        requests[symbol] = _chart_request(crumb=crumb, cookie=cookie, ticker=symbol, interval=interval, start=start, end=now)
+    added = {}
+    for symbol, (response, output, _) in _gather(requests).items():
+        added[symbol] = 0
+        if response is not None and response.status == 200 and output:
+            try:
+                added[symbol] = merge_chart(stores[symbol], output, now=now)
+            except (KeyError, IndexError, TypeError):
+                pass
+    return added
+
+def get_price_stats(store: history.RingBuffer=None, windows: Tuple[int, ...]=(20, 50)) -> Union[PriceStats, None]:
+    """
+    Work out the day's range and VWAP, moving averages of the closes over each window (in bars), and how far
+    the last close is below the highest high in the store. The day starts after the last gap of SESSION_GAP.
+    """
+    if len(store) == 0:
+        return None
+    timestamps, _, highs, lows, closes, volumes = store.columns()
+    day_start = next((i for i in range(len(timestamps) - 1, 0, -1) if timestamps[i] - timestamps[i - 1] >= SESSION_GAP), 0)
+    day_highs, day_lows, day_closes, day_volumes = highs[day_start:], lows[day_start:], closes[day_start:], volumes[day_start:]
+    traded = sum(day_volumes)
+    vwap = sum(map(lambda high, low, close, volume: (high + low + close) / 3 * volume, day_highs, day_lows, day_closes, day_volumes)) / traded if traded else None
+    moving_averages = {}
+    for window in windows:
+        averages = history.moving_average(closes, window)
+        if averages:
+            moving_averages[window] = averages[-1]
+    high = max(highs)
+    return PriceStats(
+        day_low = min(day_lows),
+        day_high = max(day_highs),
+        vwap = vwap,
+        moving_averages = moving_averages,
+        high = high,
+        from_high = (closes[-1] - high) / high * 100 if high else 0.0,
+    )
+
+class MarketCalendar:
+    """
+    When each exchange trades, learned from the currentTradingPeriod of chart and spark responses and
+    kept in a file the finance plugins share. An exchange's regular session is assumed to repeat at the
+    same local time every weekday. A weekday the quotes show no trades on is taken to be a holiday.
+    """
+    def __init__(self, path: str=None) -> None:
+        self.path = path
+        self.markets: Dict[str, Dict[str, Any]] = {}
+        markets = _read_json(path) if path else None
+        if isinstance(markets, dict):
+            self.markets = markets
+
+    def save(self) -> None:
+        if self.path:
+            _write_json(self.path, self.markets)
+
+    def learn_chart(self, meta: Dict[str, Any]=None) -> None:
+        """
+        Record an exchange's session hours and latest trade from the meta of a chart or spark response.
+        """
+        exchange = meta.get('exchangeName')
+        if not exchange:
+            return
+        market = self._learn_trade(exchange, meta.get('exchangeTimezoneName'), meta.get('gmtoffset'), meta.get('regularMarketTime'))
+        regular = (meta.get('currentTradingPeriod') or {}).get('regular') or {}
+        if regular.get('start') and regular.get('end'):
+            market['start'] = regular['start']
+            market['end'] = regular['end']
+
+    def learn_quote(self, quote: Dict[str, Any]=None) -> None:
+        """
+        Record an exchange's latest trade from a /v7/finance/quote result, which has no session hours.
+        """
+        exchange = quote.get('exchange')
+        if exchange:
+            offset = quote.get('gmtOffSetMilliseconds')
+            self._learn_trade(exchange, quote.get('exchangeTimezoneName'), offset // 1000 if offset is not None else None, quote.get('regularMarketTime'))
+
+    def _learn_trade(self, exchange: str=None, timezone_name: str=None, gmtoffset: int=None, last_trade: float=None) -> Dict[str, Any]:
+        market = self.markets.setdefault(exchange, {'timezone': None, 'gmtoffset': 0, 'start': None, 'end': None, 'last_trade': 0})
+        if timezone_name:
+            market['timezone'] = timezone_name
+        if gmtoffset is not None:
+            market['gmtoffset'] = gmtoffset
+        if last_trade:
+            market['last_trade'] = max(market['last_trade'], last_trade)
+        return market
+
+    def has_session(self, exchange: str=None) -> bool:
+        market = self.markets.get(exchange)
+        return bool(market and market['start'] and market['end'])
+
+    def _sessions(self, market: Dict[str, Any]=None, since: float=None, until: float=None) -> Iterator[Tuple[float, float]]:
+        """
+        Yield the start and end of each weekday session from the day before since through the day of until.
+        """
+        try:
+            tz = ZoneInfo(market['timezone'])
+        except (ZoneInfoNotFoundError, TypeError, ValueError):
+            tz = timezone(timedelta(seconds=market['gmtoffset']))
+        opens = datetime.fromtimestamp(market['start'], tz).time()
+        duration = market['end'] - market['start']
+        day = datetime.fromtimestamp(since, tz).date() - timedelta(days=1)
+        last_day = datetime.fromtimestamp(until, tz).date()
+        while day <= last_day:
+            if day.weekday() < 5:
+                start = datetime.combine(day, opens, tz).timestamp()
+                yield start, start + duration
+            day += timedelta(days=1)
+
+    def is_open(self, exchange: str=None, now: float=None) -> bool:
+        """
+        Whether the exchange's prices may be moving now, as far as the calendar knows.
+        """
+        now = now or time.time()
+        market = self.markets.get(exchange)
+        if not self.has_session(exchange):
+            return True
+        return any(start <= now < end + MARKET_DATA_DELAY for start, end in self._sessions(market, now, now))
+
+    def needs_refresh(self, exchanges: List[str]=None, since: float=None, now: float=None) -> bool:
+        """
+        Whether any of the exchanges may have traded between since, when prices were last fetched, and now.
+        An exchange the calendar knows nothing about always needs a refresh.
+        """
+        now = now or time.time()
+        if not since or not 0 <= now - since <= MAX_PROJECTION:
+            return True
+        for exchange in exchanges:
+            if not self.has_session(exchange):
+                return True
+            market = self.markets[exchange]
+            for start, end in self._sessions(market, since, now):
+                if start >= now or end + MARKET_DATA_DELAY <= since:
+                    continue
+                # We already looked well into this session and nothing had traded, so it's a holiday
+                if since >= start + MARKET_DATA_DELAY and market['last_trade'] < start:
+                    continue
+                return True
+        return False
+
+def open_market_calendar(cache_dir: str=None) -> MarketCalendar:
+    """
+    Return the market calendar shared through yahoo-finance-markets.json in cache_dir, or one kept in memory without a cache_dir.
+    """
+    return MarketCalendar(os.path.join(cache_dir, 'yahoo-finance-markets.json') if cache_dir else None)
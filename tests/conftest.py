@@ -0,0 +1,102 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import collections
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+
+import pytest
+
+# The plugins import swiftbar from the directory they sit in; the tests do the same from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swiftbar import request
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers each path with a canned set of caching headers, counting the requests that reach it.
+    """
+    protocol_version = 'HTTP/1.1'
+    last_modified = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.path.split('?')[0]
+        self.server.hits[path] += 1
+        body = f'{path} #{self.server.hits[path]}'.encode('utf-8')
+        if path == '/etag':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.server.hits['304'] += 1
+                return self.reply(304, b'', {'ETag': '"v1"', 'Cache-Control': 'no-cache'})
+            return self.reply(200, body, {'ETag': '"v1"', 'Cache-Control': 'no-cache'})
+        if path == '/last-modified':
+            if self.headers.get('If-Modified-Since') == self.last_modified:
+                self.server.hits['304'] += 1
+                return self.reply(304, b'', {'Cache-Control': 'max-age=0'})
+            return self.reply(200, body, {'Last-Modified': self.last_modified, 'Cache-Control': 'max-age=0'})
+        if path == '/no-store':
+            return self.reply(200, body, {'Cache-Control': 'no-store'})
+        if path == '/vary':
+            body = f'{body.decode()} {self.headers.get("Accept-Language")}'.encode('utf-8')
+            return self.reply(200, body, {'Cache-Control': 'max-age=60', 'Vary': 'Accept-Language'})
+        if path.startswith('/big'):
+            body = body.ljust(4096, b'.')
+        return self.reply(200, body, {'Cache-Control': 'max-age=60'})
+
+    def reply(self, status: int=None, body: bytes=None, headers: dict=None) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+@pytest.fixture(scope='session')
+def certificate(tmp_path_factory):
+    """
+    A throwaway self-signed certificate for localhost, made with the openssl command line tool.
+    """
+    if not shutil.which('openssl'):
+        pytest.skip('openssl is needed to make a certificate for the local HTTPS server')
+    directory = tmp_path_factory.mktemp('tls')
+    cert, key = str(directory / 'cert.pem'), str(directory / 'key.pem')
+    result = subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+         '-addext', 'subjectAltName=DNS:localhost', '-keyout', key, '-out', cert],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        pytest.skip(f'openssl could not make a certificate: {result.stderr.decode().strip()}')
+    return cert, key
+
+@pytest.fixture
+def standin(certificate, monkeypatch):
+    """
+    Serve StandInHandler over HTTPS on a free localhost port and point swiftbar.request at it. Yields the
+    server, whose host attribute is what to pass to swiftbar_request() and whose hits count the requests it saw.
+    """
+    cert, key = certificate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.hits = collections.Counter()
+    server.host = f'localhost:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(request, 'pool', request.ConnectionPool())
+    monkeypatch.setattr(request, 'breaker', request.CircuitBreaker())
+    monkeypatch.setattr(request, 'default_cache', None)
+    request.pool.ssl_context = ssl.create_default_context(cafile=cert)
+    yield server
+    request.pool.clear()
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,70 @@
+from swiftbar import httpcache, request
+import os
+import time
+
+def get(server, cache, path='/', headers=None):
+    response, body, _ = request.swiftbar_request(host=server.host, path=path, headers=headers, cache=cache)
+    return response, body
+
+def test_fresh_response_is_served_from_cache(standin, tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path))
+    _, first = get(standin, cache, '/fresh')
+    response, second = get(standin, cache, '/fresh')
+    assert second == first
+    assert getattr(response, 'from_cache', False)
+    assert standin.hits['/fresh'] == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+def test_stale_response_is_revalidated_with_etag(standin, tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path))
+    _, first = get(standin, cache, '/etag')
+    response, second = get(standin, cache, '/etag')
+    assert response.status == 200
+    assert second == first
+    assert standin.hits['/etag'] == 2
+    assert standin.hits['304'] == 1
+    assert cache.revalidated == 1
+
+def test_stale_response_is_revalidated_with_last_modified(standin, tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path))
+    _, first = get(standin, cache, '/last-modified')
+    _, second = get(standin, cache, '/last-modified')
+    assert second == first
+    assert standin.hits['304'] == 1
+    assert cache.revalidated == 1
+
+def test_no_store_response_is_not_kept(standin, tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path))
+    _, first = get(standin, cache, '/no-store')
+    _, second = get(standin, cache, '/no-store')
+    assert first != second
+    assert standin.hits['/no-store'] == 2
+    assert os.listdir(tmp_path) == []
+
+def test_vary_mismatch_goes_to_the_network(standin, tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path))
+    _, english = get(standin, cache, '/vary', headers={'Accept-Language': 'en'})
+    _, french = get(standin, cache, '/vary', headers={'Accept-Language': 'fr'})
+    assert english.endswith(' en') and french.endswith(' fr')
+    assert standin.hits['/vary'] == 2
+    # The cache keeps one response per URL, now the French one
+    response, again = get(standin, cache, '/vary', headers={'Accept-Language': 'fr'})
+    assert again == french
+    assert getattr(response, 'from_cache', False)
+    assert standin.hits['/vary'] == 2
+
+def test_least_recently_used_entries_are_evicted(standin, tmp_path):
+    # Room for two of the stand-in's 4 KB bodies and their metadata, but not three
+    cache = httpcache.HttpCache(str(tmp_path), max_size=10000)
+    get(standin, cache, '/big/1')
+    time.sleep(0.01)
+    get(standin, cache, '/big/2')
+    time.sleep(0.01)
+    # Reading /big/1 again makes /big/2 the least recently used
+    get(standin, cache, '/big/1')
+    time.sleep(0.01)
+    get(standin, cache, '/big/3')
+    assert len(os.listdir(tmp_path)) == 2
+    assert cache.get(f'https://{standin.host}/big/1') is not None
+    assert cache.get(f'https://{standin.host}/big/2') is None
+    assert cache.get(f'https://{standin.host}/big/3') is not None